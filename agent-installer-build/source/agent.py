@@ -1,27 +1,34 @@
+import os
 import socket
+import threading
 import time
 import json
+import multiprocessing
 import requests
 import configparser
+from requests.adapters import HTTPAdapter
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from coalescer import EventCoalescer
+from work_queue import PersistentQueue, UploadWorkerPool, DELETE, UPSERT
+from manifest import Confirmations, Manifest, resync
+from extractors import EXTRACTORS, ExtractionPool
+from transfer import COMPRESSIBLE_EXTENSIONS, IDENTITY, choose_encoding, compress_bytes, compress_file, file_sha256
+from rate_control import OVERLOAD_STATUS_CODES, AdaptiveLimiter, parse_retry_after
 
-def extract_text_from_docx(file_path):
-    return "This is placeholder text from a Word document."
-def extract_text_from_pdf(file_path):
-    return "This is placeholder text from a PDF document."
-def extract_text_from_xlsx(file_path):
-    return "This is placeholder text from an Excel document."
-def extract_text_from_txt(file_path):
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        return f.read()
-
-EXTRACTORS = {
-    '.docx': extract_text_from_docx,
-    '.pdf': extract_text_from_pdf,
-    '.xlsx': extract_text_from_xlsx,
-    '.txt': extract_text_from_txt,
-}
+# Responses worth retrying later: the server is overloaded or unavailable.
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+# Responses that may be transient but may also mean the server fails on this
+# particular document every time: retried only a few times.
+SERVER_ERROR_STATUS_CODES = (500,)
+
+class RetryableUploadError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ServerError(RetryableUploadError):
+    pass
 
 class DocumentHandler(FileSystemEventHandler):
     def __init__(self, config):
@@ -29,44 +36,278 @@ class DocumentHandler(FileSystemEventHandler):
         self.api_key = config.get('Corpus', 'api_key')
         self.monitor_root = config.get('Corpus', 'monitor_directory')
         self.allowed_extensions = [ext.strip() for ext in config.get('Corpus', 'allowed_extensions').split(',')]
+        self.hostname = socket.gethostname()
+        workers = config.getint('Corpus', 'upload_workers', fallback=4)
+        # One keep-alive connection per upload worker, shared by all uploads.
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self.session.headers['X-API-Key'] = self.api_key
+        self.request_timeout = config.getfloat('Corpus', 'request_timeout', fallback=120.0)
+        retry_backoff_max = config.getfloat('Corpus', 'retry_backoff_max', fallback=300.0)
+        # upload_workers is the most requests in flight; the limiter starts at
+        # one and finds how many the server can take.
+        self.limiter = AdaptiveLimiter(workers, max_pause=retry_backoff_max)
+        self.queue = PersistentQueue(config.get('Corpus', 'queue_path', fallback='agent_queue.db'))
+        self.manifest = Manifest(config.get('Corpus', 'manifest_path', fallback='agent_manifest.db'))
+        self.resync_workers = config.getint('Corpus', 'resync_workers', fallback=8)
+        self.confirmations = Confirmations(
+            self.manifest,
+            self.fetch_statuses,
+            lambda path, previous_path, action: self.queue.put(path, previous_path, action=action),
+            poll_interval=config.getfloat('Corpus', 'confirm_interval', fallback=2.0),
+            timeout=config.getfloat('Corpus', 'confirm_timeout', fallback=600.0),
+        )
+        self.compression = config.getboolean('Corpus', 'compress_uploads', fallback=True)
+        self._capabilities = None
+        self._capabilities_lock = threading.Lock()
+        self._bandwidth_lock = threading.Lock()
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+        self.extraction = ExtractionPool(
+            workers=workers,
+            max_chars=config.getint('Corpus', 'extract_max_chars', fallback=1000000),
+            timeout=config.getfloat('Corpus', 'extract_timeout', fallback=120.0),
+        )
+        self.uploader = UploadWorkerPool(
+            self.queue,
+            self.upload,
+            workers=workers,
+            backoff_max=retry_backoff_max,
+            limited_errors=(ServerError,),
+            max_failures=config.getint('Corpus', 'max_server_errors', fallback=5),
+        )
+        self.coalescer = EventCoalescer(
+            self.queue.put,
+            self.is_tracked,
+            delete=lambda path: self.queue.put(path, action=DELETE),
+            quiet_period=config.getfloat('Corpus', 'debounce_seconds', fallback=2.0),
+        )
 
     def on_created(self, event):
-        if not event.is_directory: self.process_file(event.src_path)
+        if not event.is_directory: self.coalescer.touch(event.src_path)
     def on_modified(self, event):
-        if not event.is_directory: self.process_file(event.src_path)
+        if not event.is_directory: self.coalescer.touch(event.src_path)
+    def on_moved(self, event):
+        if not event.is_directory: self.coalescer.move(event.src_path, event.dest_path)
+    def on_deleted(self, event):
+        if not event.is_directory: self.coalescer.remove(event.src_path)
+
+    def is_tracked(self, file_path):
+        return os.path.splitext(file_path)[1].lower() in self.allowed_extensions
 
     def get_client_project_name(self, file_path):
         relative_path = os.path.relpath(file_path, self.monitor_root)
         parts = relative_path.split(os.sep)
         return parts[0] if parts else "Uncategorized"
 
-    def process_file(self, file_path):
+    def resync(self):
+        """
+        Queues what changed under the monitored directory while the agent
+        was not running.
+        """
+        try:
+            resync(self.monitor_root, self.manifest, self.queue, self.is_tracked, workers=self.resync_workers)
+        except Exception as e:
+            print(f"An error occurred during resync: {e}")
+
+    def upload(self, job):
+        if job.action == DELETE:
+            return self.delete_file(job.path)
+        return self.process_file(job.path, job.previous_path)
+
+    def delete_file(self, file_path):
+        """
+        Removes a deleted file's document from the server. Files that were
+        never sent, or that exist again, are left alone.
+        """
+        if os.path.exists(file_path):
+            self.queue.put(file_path, action=UPSERT)
+            return 0
+        if self.manifest.get(file_path) is None:
+            return 0
+        body = json.dumps({'source_hostname': self.hostname, 'filename_full_path': file_path})
+        response = self.request('POST', self.api_url + '/delete', data=body, headers={'Content-Type': 'application/json'})
+        if response.status_code in (200, 202):
+            print(f"Removed deleted file {file_path} from Corpus server.")
+            self.confirm(response.json(), file_path, action=DELETE)
+        else:
+            print(f"Error removing file: {response.status_code} - {response.text}")
+            self.manifest.forget(file_path)
+        return len(body)
+
+    def process_file(self, file_path, previous_path=None):
+        """
+        Extracts and sends one file and returns the number of bytes sent.
+        Raises on failures worth retrying (network errors, overloaded server);
+        anything else is logged and dropped.
+        """
         filename, extension = os.path.splitext(file_path)
-        if extension.lower() not in self.allowed_extensions: return
+        if extension.lower() not in self.allowed_extensions or extension.lower() not in EXTRACTORS:
+            return 0
 
-        print(f"Detected change: {file_path}")
+        if previous_path:
+            print(f"Sending moved file: {previous_path} -> {file_path}")
+        else:
+            print(f"Sending changed file: {file_path}")
         try:
             stat = os.stat(file_path)
-            metadata = {
-                'filename_full_path': file_path,
-                'client_project_name': self.get_client_project_name(file_path),
-                'created_date': stat.st_ctime,
-                'modified_date': stat.st_mtime,
-                'source_hostname': socket.gethostname(),
-                'creator': 'N/A', 'modifier': 'N/A',
-            }
-            extractor_func = EXTRACTORS.get(extension.lower())
-            if not extractor_func: return
-            content = extractor_func(file_path)
-            payload = {'metadata': metadata, 'content': content}
-            files = {'original_file': (os.path.basename(file_path), open(file_path, 'rb'))}
-            headers = {'X-API-Key': self.api_key}
-            response = requests.post(self.api_url, headers=headers, data={'json_payload': json.dumps(payload)}, files=files)
-            if response.status_code == 201: print(f"Successfully sent {file_path} to Corpus server.")
-            else: print(f"Error sending file: {response.status_code} - {response.text}")
-        except Exception as e: print(f"An error occurred while processing {file_path}: {e}")
+        except FileNotFoundError:
+            print(f"Skipping {file_path}: it no longer exists.")
+            return 0
+        if not previous_path and self.manifest.is_current(file_path, stat.st_size, stat.st_mtime):
+            return 0
+        metadata = {
+            'filename_full_path': file_path,
+            'client_project_name': self.get_client_project_name(file_path),
+            'created_date': stat.st_ctime,
+            'modified_date': stat.st_mtime,
+            'source_hostname': self.hostname,
+            'creator': 'N/A', 'modifier': 'N/A',
+        }
+        if previous_path:
+            metadata['previous_full_path'] = previous_path
+        try:
+            content = self.extraction.extract(file_path)
+        except Exception as e:
+            print(f"An error occurred while extracting {file_path}: {e}")
+            return 0
+        metadata['content_sha256'] = file_sha256(file_path)
+        encoding, skip_stored = self.capabilities()
+        payload = json.dumps({'metadata': metadata, 'content': content}).encode('utf-8')
+        send_original = not (skip_stored and self.server_has_original(metadata['content_sha256']))
+        response, sent_bytes = self.send(file_path, payload, encoding, send_original)
+        if response.status_code == 409 and not send_original:
+            # The server lost the original since we checked; send it after all.
+            response, sent_bytes = self.send(file_path, payload, encoding, True)
+        if response.status_code in (200, 201, 202):
+            accepted = response.json()
+            record = (stat.st_size, stat.st_mtime, accepted.get('content_sha256'), accepted.get('document_id'))
+            self.confirm(accepted, file_path, previous_path, record=record)
+            raw_bytes = len(payload) + stat.st_size
+            with self._bandwidth_lock:
+                self.bytes_raw += raw_bytes
+                self.bytes_sent += sent_bytes
+                total_saved = 1 - self.bytes_sent / self.bytes_raw if self.bytes_raw else 0
+            print(
+                f"Successfully sent {file_path} to Corpus server: {sent_bytes / 1024:.1f} KB on the wire "
+                f"for {raw_bytes / 1024:.1f} KB ({1 - sent_bytes / raw_bytes:.0%} saved, {total_saved:.0%} overall)."
+            )
+            return sent_bytes
+        print(f"Error sending file: {response.status_code} - {response.text}")
+        return 0
+
+    def confirm(self, accepted, file_path, previous_path=None, action=UPSERT, record=None):
+        """
+        Updates the manifest for an accepted upload or delete: right away
+        when the server has already written it, once it confirms the write
+        when it was only queued.
+        """
+        if accepted.get('status') == 'queued' and accepted.get('tracking_id'):
+            self.confirmations.add(accepted['tracking_id'], file_path, previous_path, action, record)
+        elif action == DELETE:
+            self.manifest.forget(file_path)
+        else:
+            self.manifest.record(file_path, *record)
+            if previous_path:
+                self.manifest.forget(previous_path)
+
+    def fetch_statuses(self, tracking_ids):
+        """
+        Returns the server's status for each of the tracking ids it still knows.
+        """
+        response = self.request('POST', self.api_url + '/status', json={'tracking_ids': tracking_ids})
+        if response.status_code != 200:
+            raise RuntimeError(f"Server responded {response.status_code}: {response.text[:200]}")
+        return {entry['tracking_id']: entry['status'] for entry in response.json()['statuses']}
+
+    def send(self, file_path, payload, encoding, send_original):
+        """
+        Posts one document and returns (response, bytes sent). The payload
+        is compressed with the negotiated encoding, and so is the original
+        when it is a format that compresses well. A server that predates
+        capabilities (encoding None) gets the original plain form.
+        """
+        files = {}
+        if encoding is None:
+            data = {'json_payload': payload.decode('utf-8')}
+            sent_bytes = len(payload)
+        else:
+            body = compress_bytes(payload, encoding)
+            data = {'payload_encoding': encoding}
+            files['payload'] = ('payload.json', body, 'application/octet-stream')
+            sent_bytes = len(body)
+        original = None
+        try:
+            if send_original:
+                extension = os.path.splitext(file_path)[1].lower()
+                if encoding not in (None, IDENTITY) and extension in COMPRESSIBLE_EXTENSIONS:
+                    original = compress_file(file_path, encoding)
+                    data['original_encoding'] = encoding
+                    sent_bytes += original.seek(0, os.SEEK_END)
+                    original.seek(0)
+                else:
+                    original = open(file_path, 'rb')
+                    sent_bytes += os.fstat(original.fileno()).st_size
+                files['original_file'] = (os.path.basename(file_path), original)
+            response = self.request('POST', self.api_url, data=data, files=files)
+        finally:
+            if original is not None:
+                original.close()
+        return response, sent_bytes
+
+    def capabilities(self):
+        """
+        Negotiates the upload format with the server once: returns the
+        payload encoding to use (None for a server without the capabilities
+        endpoint) and whether originals it already stores may be skipped.
+        """
+        with self._capabilities_lock:
+            if self._capabilities is None:
+                response = self.request('GET', self.api_url + '/capabilities')
+                if response.status_code == 200:
+                    offered = response.json()
+                    encoding = choose_encoding(offered.get('encodings', [])) if self.compression else IDENTITY
+                    self._capabilities = (encoding, bool(offered.get('skip_stored_originals')))
+                else:
+                    self._capabilities = (None, False)
+                print(f"Upload encoding: {self._capabilities[0] or 'form field'}; skip stored originals: {self._capabilities[1]}.")
+            return self._capabilities
+
+    def server_has_original(self, sha256):
+        response = self.request('HEAD', f"{self.api_url}/blobs/{sha256}")
+        return response.status_code == 200
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends one request to the server once the adaptive limiter allows it
+        and reports its latency and outcome back to the limiter. Raises
+        RetryableUploadError, carrying the server's Retry-After, when the
+        server is overloaded or unavailable, and ServerError when it fails.
+        """
+        started = self.limiter.acquire()
+        try:
+            response = self.session.request(method, url, timeout=self.request_timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            self.limiter.release(started, overloaded=True)
+            raise
+        except BaseException:
+            self.limiter.release(started)
+            raise
+        retry_after = None
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        self.limiter.release(started, overloaded=response.status_code in OVERLOAD_STATUS_CODES, retry_after=retry_after)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableUploadError(f"Server responded {response.status_code}", retry_after)
+        if response.status_code in SERVER_ERROR_STATUS_CODES:
+            raise ServerError(f"Server responded {response.status_code}: {response.text[:200]}")
+        return response
 
 if __name__ == "__main__":
+    # Extraction runs in child processes, which a frozen Windows build
+    # can only start with freeze_support.
+    multiprocessing.freeze_support()
     print("Starting Corpus Agent...")
     config = configparser.ConfigParser()
     config.read('config.ini')
@@ -77,10 +318,22 @@ if __name__ == "__main__":
     event_handler = DocumentHandler(config)
     observer = Observer()
     observer.schedule(event_handler, path_to_watch, recursive=True)
+    event_handler.extraction.start()
+    event_handler.uploader.start()
+    event_handler.confirmations.start()
+    event_handler.coalescer.start()
     observer.start()
     print(f"Watching for file changes in: {path_to_watch}")
+    threading.Thread(target=event_handler.resync, name="resync", daemon=True).start()
     try:
         while True: time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
-    observer.join()
\ No newline at end of file
+    observer.join()
+    event_handler.coalescer.stop()
+    event_handler.confirmations.stop()
+    event_handler.limiter.close()
+    event_handler.uploader.stop()
+    event_handler.extraction.stop()
+    event_handler.queue.close()
+    event_handler.manifest.close()
\ No newline at end of file
@@ -0,0 +1,308 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from work_queue import BACKLOG, DELETE, UPSERT
+
+# Paths compared against the manifest per query; SQLite allows 999 parameters.
+LOOKUP_BATCH_SIZE = 500
+
+
+class Manifest:
+    """
+    What the agent last sent for every file: size, mtime, content hash and
+    the id the server filed it under, stored in SQLite next to the agent.
+
+    Each startup resync is a new scan generation. Every file seen by the
+    walk is stamped with it, so once the walk is complete the files stamped
+    with an older generation are the ones deleted while the agent was not
+    running.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT,
+                document_id TEXT,
+                scan_gen INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+            """
+        )
+        self.scan_gen = self._db.execute("SELECT COALESCE(MAX(scan_gen), 0) FROM files").fetchone()[0]
+
+    def record(self, path, size, mtime, sha256=None, document_id=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, sha256, document_id, scan_gen) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, size, mtime, sha256, document_id, self.scan_gen),
+            )
+
+    def forget(self, path):
+        with self._lock:
+            self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def get(self, path):
+        """
+        Returns (size, mtime, sha256, document_id) for a file, or None.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT size, mtime, sha256, document_id FROM files WHERE path = ?", (path,)
+            ).fetchone()
+
+    def is_current(self, path, size, mtime):
+        entry = self.get(path)
+        return entry is not None and entry[0] == size and entry[1] == mtime
+
+    def begin_scan(self):
+        with self._lock:
+            self.scan_gen += 1
+        return self.scan_gen
+
+    def reconcile(self, files):
+        """
+        Stamps the given (path, size, mtime) files with the current scan
+        generation and returns the ones that are new or changed.
+        """
+        paths = [path for path, _, _ in files]
+        with self._lock:
+            known = {}
+            for start in range(0, len(paths), LOOKUP_BATCH_SIZE):
+                chunk = paths[start:start + LOOKUP_BATCH_SIZE]
+                known.update(
+                    (path, (size, mtime)) for path, size, mtime in self._db.execute(
+                        f"SELECT path, size, mtime FROM files WHERE path IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                )
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE files SET scan_gen = ? WHERE path = ?",
+                ((self.scan_gen, path) for path in paths if path in known),
+            )
+            self._db.execute("COMMIT")
+        return [(path, size, mtime) for path, size, mtime in files if known.get(path) != (size, mtime)]
+
+    def unseen(self, batch_size=LOOKUP_BATCH_SIZE):
+        """
+        Yields batches of paths that the current scan did not see.
+        """
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT path FROM files WHERE scan_gen < ? AND path > ? ORDER BY path LIMIT ?",
+                    (self.scan_gen, last, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [row[0] for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Confirmations:
+    """
+    Uploads and deletes the server accepted into its ingest queue but has
+    not yet written to the index. The server answers "queued" as soon as a
+    document is accepted and may still fail to index it, so the manifest is
+    only updated once the server reports the document indexed (or deleted);
+    until then a restart resends the file.
+
+    A thread polls the server for the statuses of everything pending. What
+    failed, is no longer known to the server (it restarted or forgot the
+    id), or stays queued for longer than `timeout` is queued to be sent
+    again.
+    """
+
+    def __init__(self, manifest, fetch_statuses, requeue, poll_interval=2.0, timeout=600.0, batch_size=500,
+                 clock=time.monotonic):
+        self.manifest = manifest
+        self.fetch_statuses = fetch_statuses
+        self.requeue = requeue
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.clock = clock
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, tracking_id, path, previous_path=None, action=UPSERT, record=None):
+        """
+        Waits for the server to confirm `tracking_id`. For an upload,
+        `record` is the (size, mtime, sha256, document_id) to put in the
+        manifest then.
+        """
+        with self._lock:
+            self._pending[tracking_id] = (path, previous_path, action, record, self.clock())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="confirmations", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Could not check ingest statuses: {e}")
+
+    def check(self):
+        """
+        Polls the server once for every pending id and settles the ones it
+        has finished with. Returns the number still pending.
+        """
+        with self._lock:
+            tracking_ids = list(self._pending)
+        for start in range(0, len(tracking_ids), self.batch_size):
+            chunk = tracking_ids[start:start + self.batch_size]
+            statuses = self.fetch_statuses(chunk)
+            now = self.clock()
+            for tracking_id in chunk:
+                with self._lock:
+                    pending = self._pending.get(tracking_id)
+                    if pending is None:
+                        continue
+                    path, previous_path, action, record, added = pending
+                    state = statuses.get(tracking_id)
+                    if state == "queued" and now - added < self.timeout:
+                        continue
+                    del self._pending[tracking_id]
+                if action == UPSERT and state in ("indexed", "stale"):
+                    self.manifest.record(path, *record)
+                    if previous_path:
+                        self.manifest.forget(previous_path)
+                elif action == DELETE and state == "deleted":
+                    self.manifest.forget(path)
+                else:
+                    print(f"The server did not index {path} ({state or 'unknown'}); sending it again.")
+                    self.requeue(path, previous_path, action)
+        return len(self)
+
+
+def _scan_directory(path, is_tracked):
+    """
+    Lists one directory. Returns (files, subdirectories, error).
+    """
+    files = []
+    directories = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and is_tracked(entry.path):
+                        # On Windows scandir already has the stat result, so
+                        # this does not touch the file server again.
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+                except OSError:
+                    continue
+    except OSError as e:
+        return files, directories, e
+    return files, directories, None
+
+
+def walk_tree(root, is_tracked, workers=8, batch_size=1000):
+    """
+    Walks the tree with `workers` concurrent os.scandir calls and yields
+    batches of (path, size, mtime) for tracked files. Only the directories
+    still to be listed and one batch of files are held in memory. Returns
+    the number of directories that could not be read.
+    """
+    pending = deque([root])
+    batch = []
+    errors = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resync-scan") as executor:
+        running = set()
+        while pending or running:
+            while pending and len(running) < workers * 2:
+                running.add(executor.submit(_scan_directory, pending.popleft(), is_tracked))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories, error = future.result()
+                if error is not None:
+                    print(f"Resync could not read {error.filename}: {error}")
+                    errors += 1
+                pending.extend(directories)
+                batch.extend(files)
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+    if batch:
+        yield batch
+    return errors
+
+
+def resync(root, manifest, queue, is_tracked, workers=8, batch_size=1000):
+    """
+    Brings the server up to date with changes made while the agent was not
+    running: queues uploads for new and changed files, newest first, and
+    deletions for files that are gone, all behind live changes. Deletions
+    are only queued after a complete walk, so an unreadable directory never
+    causes its files to be deleted.
+    """
+    start = time.monotonic()
+    manifest.begin_scan()
+    scanned = 0
+    changed = 0
+    walk = walk_tree(root, is_tracked, workers=workers, batch_size=batch_size)
+    while True:
+        try:
+            files = next(walk)
+        except StopIteration as stop:
+            errors = stop.value
+            break
+        scanned += len(files)
+        updates = manifest.reconcile(files)
+        if updates:
+            queue.put_many([(path, None, UPSERT, mtime) for path, _, mtime in updates], priority=BACKLOG)
+            changed += len(updates)
+
+    deleted = 0
+    if errors:
+        print(f"Resync skipped deletions: {errors} directories could not be read.")
+    elif scanned == 0 and manifest.count():
+        # An empty tree is far more likely an unmounted share than a purge.
+        print(f"Resync skipped deletions: no files found under {root}.")
+    else:
+        # Deletions are cheap to send, so they go ahead of the backlog of uploads.
+        now = time.time()
+        for paths in manifest.unseen(batch_size):
+            queue.put_many([(path, None, DELETE, now) for path in paths], priority=BACKLOG)
+            deleted += len(paths)
+    print(
+        f"Resync of {root} finished in {time.monotonic() - start:.1f}s: {scanned} files scanned, "
+        f"{changed} new or changed, {deleted} deleted."
+    )
+    return scanned, changed, deleted
@@ -0,0 +1,126 @@
+import email.utils
+import threading
+import time
+
+# Responses that mean the server is overloaded rather than that the request
+# was wrong.
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+class LimiterClosed(Exception):
+    pass
+
+
+def parse_retry_after(value, now=None):
+    """
+    Returns the seconds to wait from a Retry-After header (delay-seconds or
+    an HTTP date), or None when it is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class AdaptiveLimiter:
+    """
+    Caps the number of requests in flight to the server and adapts the cap
+    with AIMD (additive increase, multiplicative decrease).
+
+    Every completed request adds 1/limit to the limit, so it grows by about
+    one per round of requests while the server keeps up. The limit is
+    multiplied by `decrease_factor` when the server answers 429 or 503, when
+    a request fails to connect or times out, or when recent latency rises
+    above `latency_tolerance` times the long-run average; it is cut at most
+    once per round trip, so one burst of slow responses counts once. A
+    Retry-After from the server stops new requests until it has passed.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None, decrease_factor=0.5,
+                 latency_tolerance=2.0, max_pause=300.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(initial_limit if initial_limit is not None else self.min_limit)
+        self.limit = min(max(self.limit, self.min_limit), self.max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_pause = max_pause
+        self.in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        # Short- and long-run exponentially weighted latency averages.
+        self._recent_latency = None
+        self._baseline_latency = None
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent and returns its start time.
+        Raises LimiterClosed once the limiter has been closed.
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise LimiterClosed("The agent is stopping.")
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return time.monotonic()
+                self._condition.wait(min(wait, 1.0) if wait > 0 else 1.0)
+
+    def release(self, started, overloaded=False, retry_after=None):
+        """
+        Records the outcome of a request started with `acquire`.
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._condition:
+            self.in_flight -= 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + min(retry_after, self.max_pause))
+            if not overloaded:
+                overloaded = self._observe_latency(latency)
+            if overloaded:
+                # One cut per round trip: the requests already in flight
+                # were sent under the old limit.
+                if now - self._last_decrease >= (self._recent_latency or latency):
+                    self._last_decrease = now
+                    previous = self.limit
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    if int(self.limit) < int(previous):
+                        print(f"Server is under load; upload concurrency lowered to {int(self.limit)}.")
+            elif self.limit < self.max_limit:
+                previous = self.limit
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                if int(self.limit) > int(previous):
+                    print(f"Upload concurrency raised to {int(self.limit)}.")
+            self._condition.notify_all()
+
+    def _observe_latency(self, latency):
+        if self._baseline_latency is None:
+            self._recent_latency = self._baseline_latency = latency
+            return False
+        self._recent_latency += 0.3 * (latency - self._recent_latency)
+        overloaded = self._recent_latency > self.latency_tolerance * self._baseline_latency
+        if not overloaded or self.limit <= self.min_limit:
+            # Only healthy samples move the baseline, so a slow spell cannot
+            # become the new normal unless it persists at the lowest limit.
+            self._baseline_latency += 0.02 * (latency - self._baseline_latency)
+        return overloaded
+
+    def close(self):
+        """
+        Wakes up and fails every caller still waiting in `acquire`.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
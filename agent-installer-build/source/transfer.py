@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import shutil
+import tempfile
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available.
+    zstandard = None
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+
+CHUNK_SIZE = 1024 * 1024
+
+# Originals worth compressing; Office files and PDFs are compressed already.
+COMPRESSIBLE_EXTENSIONS = {'.txt', '.eml', '.wpd'}
+
+# Compressed originals are kept in memory up to this size, then spill to disk.
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def local_encodings():
+    encodings = [GZIP, IDENTITY]
+    if zstandard is not None:
+        encodings.insert(0, ZSTD)
+    return encodings
+
+
+def choose_encoding(server_encodings):
+    """
+    Returns the first encoding we prefer that the server also accepts.
+    """
+    for encoding in local_encodings():
+        if encoding in server_encodings:
+            return encoding
+    return IDENTITY
+
+
+def compress_bytes(data, encoding):
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == GZIP:
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+
+def compress_file(path, encoding):
+    """
+    Compresses a file in chunks into a spooled temporary file, rewound and
+    ready to upload.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with open(path, 'rb') as source:
+        if encoding == ZSTD:
+            with zstandard.ZstdCompressor(level=3).stream_writer(spool, closefd=False) as writer:
+                shutil.copyfileobj(source, writer, CHUNK_SIZE)
+        else:
+            with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=6) as writer:
+                shutil.copyfileobj(source, writer, CHUNK_SIZE)
+    spool.seek(0)
+    return spool
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return hasher.hexdigest()
+            hasher.update(chunk)
@@ -0,0 +1,136 @@
+"""
+Benchmark: text extraction throughput per format.
+
+Generates one sample file per format, extracts it in-process and through
+the ExtractionPool, and reports MB/s of input and characters per second.
+The pool run includes starting the child process for the first file.
+
+Run from the agent directory:
+
+    python benchmarks/bench_extractors.py [paragraphs]
+"""
+import os
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import ExtractionPool, extract_text  # noqa: E402
+
+PARAGRAPH = (
+    "The supplier shall deliver the goods to the address stated in the order within thirty days "
+    "of receiving payment, and either party may terminate this agreement by written notice."
+)
+
+
+def write_txt(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(paragraphs):
+            f.write(PARAGRAPH + "\n")
+
+
+def write_docx(path, paragraphs):
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = "".join(f"<w:p><w:r><w:t>{PARAGRAPH}</w:t></w:r></w:p>" for _ in range(paragraphs))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        package.writestr("word/document.xml", f'<w:document xmlns:w="{namespace}"><w:body>{body}</w:body></w:document>')
+
+
+def write_xlsx(path, paragraphs):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Ledger")
+    words = PARAGRAPH.split()
+    for row in range(paragraphs):
+        sheet.append([row, words[row % len(words)], row * 1.5, " ".join(words[:8])])
+    workbook.save(path)
+
+
+def write_pdf(path, paragraphs, lines_per_page=40):
+    pages = [list(range(start, min(start + lines_per_page, paragraphs))) for start in range(0, paragraphs, lines_per_page)]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        text = "".join(f"({PARAGRAPH[:90]}) Tj T* " for _ in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def write_eml(path, paragraphs):
+    message = EmailMessage()
+    message["From"] = "counsel@example.com"
+    message["To"] = "client@example.com"
+    message["Subject"] = "Supply agreement"
+    message.set_content("\n".join(PARAGRAPH for _ in range(paragraphs)))
+    with open(path, "wb") as f:
+        f.write(bytes(message))
+
+
+def write_wpd(path, paragraphs):
+    # A WordPerfect 5.1 header pointing at the document area, then text with
+    # hard returns and a variable-length function code in every paragraph.
+    header = b"\xffWPC" + struct.pack("<I", 16) + b"\x01\x0a\x00\x00" + b"\x00" * 4
+    code = b"\xd0\x01" + struct.pack("<H", 4) + b"\x00\x00\x00\x00"
+    with open(path, "wb") as f:
+        f.write(header)
+        for _ in range(paragraphs):
+            f.write(code + PARAGRAPH.encode("ascii") + b"\xcc")
+
+
+WRITERS = {
+    ".txt": write_txt,
+    ".docx": write_docx,
+    ".xlsx": write_xlsx,
+    ".pdf": write_pdf,
+    ".eml": write_eml,
+    ".wpd": write_wpd,
+}
+
+
+def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    max_chars = 50000000
+    pool = ExtractionPool(workers=1, max_chars=max_chars, timeout=600)
+    pool.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'format':<6} {'size':>9} {'chars':>11} {'in-process':>20} {'pool':>10}")
+        for extension, write in WRITERS.items():
+            path = os.path.join(workdir, "sample" + extension)
+            write(path, paragraphs)
+            size = os.path.getsize(path)
+
+            start = time.perf_counter()
+            text = extract_text(path, max_chars)
+            elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pool.extract(path)
+            pooled = time.perf_counter() - start
+            print(
+                f"{extension:<6} {size / 1e6:7.2f}MB {len(text):11,d} "
+                f"{size / 1e6 / elapsed:7.1f} MB/s {len(text) / elapsed / 1e6:5.1f} Mc/s {pooled:9.2f}s"
+            )
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
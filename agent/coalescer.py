@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+
+class PendingFile:
+    def __init__(self, path, previous_path=None):
+        self.path = path
+        self.previous_path = previous_path
+        self.last_event = time.monotonic()
+        self.signature = file_signature(path)
+        self.deleted = False
+
+
+def file_signature(path):
+    """
+    Returns (size, mtime) for a file, or None if it cannot be stat'ed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime)
+
+
+class EventCoalescer:
+    """
+    Collapses bursts of file system events into one call per file.
+
+    Saving a document in Word or Excel produces several created, modified
+    and moved events within a second or two. Events are recorded by path and
+    a file is only handed to `process(path, previous_path)` once no event has
+    arrived for it for `quiet_period` seconds and its size and mtime are the
+    same as when the last event was seen. A file whose size and mtime match
+    what was last sent successfully is skipped. A file that is still missing
+    once its events have settled is handed to `delete(path)`. Processing runs
+    on the coalescer's own thread so the watchdog observer is never blocked
+    by an upload.
+    """
+
+    def __init__(self, process, is_tracked, delete=None, quiet_period=2.0, poll_interval=0.5):
+        self.process = process
+        self.is_tracked = is_tracked
+        self.delete = delete
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self._pending = {}
+        self._processed = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-coalescer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def touch(self, path):
+        """
+        Records a created or modified event.
+        """
+        if not self.is_tracked(path):
+            return
+        with self._lock:
+            entry = self._pending.get(path)
+            previous_path = entry.previous_path if entry else None
+            self._pending[path] = PendingFile(path, previous_path)
+
+    def remove(self, path):
+        """
+        Records a deleted event. Editors often delete and recreate a file
+        while saving, so it is only reported as deleted if it stays gone.
+        """
+        self.touch(path)
+
+    def move(self, src_path, dest_path):
+        """
+        Records a move or rename. Moving one tracked file to another tracked
+        name becomes a single update of the destination that remembers the
+        old path; editors that save through a temporary file and rename it
+        over the original end up as a plain modification of the original.
+        """
+        with self._lock:
+            source = self._pending.pop(src_path, None)
+            if not self.is_tracked(dest_path):
+                # Renamed to a temporary or untracked name. Unless a new file
+                # takes its place within the quiet period, it was deleted.
+                if self.is_tracked(src_path):
+                    self._pending[src_path] = PendingFile(src_path, source.previous_path if source else None)
+                return
+            previous_path = None
+            if self.is_tracked(src_path):
+                previous_path = source.previous_path if source and source.previous_path else src_path
+                self._processed.pop(src_path, None)
+            entry = self._pending.get(dest_path)
+            if entry and entry.previous_path and not previous_path:
+                previous_path = entry.previous_path
+            self._pending[dest_path] = PendingFile(dest_path, previous_path)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            for entry in self._take_ready():
+                try:
+                    if entry.deleted:
+                        sent = self.delete(entry.path)
+                        if entry.previous_path:
+                            self.delete(entry.previous_path)
+                    else:
+                        sent = self.process(entry.path, entry.previous_path)
+                except Exception as e:
+                    print(f"An error occurred while processing {entry.path}: {e}")
+                    sent = False
+                if sent and not entry.deleted:
+                    with self._lock:
+                        self._processed[entry.path] = entry.signature
+
+    def _take_ready(self):
+        """
+        Removes and returns the pending files that have been quiet for the
+        quiet period and whose size and mtime have settled.
+        """
+        ready = []
+        now = time.monotonic()
+        with self._lock:
+            for path, entry in list(self._pending.items()):
+                if now - entry.last_event < self.quiet_period:
+                    continue
+                signature = file_signature(path)
+                if signature is None:
+                    del self._pending[path]
+                    self._processed.pop(path, None)
+                    if self.delete is not None:
+                        entry.deleted = True
+                        ready.append(entry)
+                elif signature != entry.signature:
+                    # Still being written: wait for another quiet period.
+                    entry.signature = signature
+                    entry.last_event = now
+                elif signature == self._processed.get(path) and not entry.previous_path:
+                    del self._pending[path]
+                else:
+                    del self._pending[path]
+                    ready.append(entry)
+        return ready
@@ -0,0 +1,361 @@
+import codecs
+import multiprocessing
+import os
+import queue
+import re
+import struct
+import zipfile
+from email import policy
+from email.feedparser import BytesFeedParser
+from xml.etree.ElementTree import iterparse
+
+TEXT_CHUNK_SIZE = 1024 * 1024
+# Bytes of an email read per character of text wanted: room for base64 or
+# quoted-printable encoding, multi-byte characters and HTML markup. The body
+# comes before the attachments, which are not read past the cap.
+EML_BYTES_PER_CHAR = 4
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+HTML_TAGS = re.compile(r"<[^>]+>")
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class TextCollector:
+    """
+    Accumulates extracted text up to a character cap. `add` returns False
+    once the cap is reached so extractors can stop reading the file.
+    """
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+
+    def add(self, text):
+        if not text:
+            return self.length < self.max_chars
+        remaining = self.max_chars - self.length
+        if remaining <= 0:
+            return False
+        if len(text) > remaining:
+            text = text[:remaining]
+        self.parts.append(text)
+        self.length += len(text)
+        return self.length < self.max_chars
+
+    def text(self):
+        return "".join(self.parts)
+
+
+def extract_text_from_txt(file_path, max_chars):
+    collector = TextCollector(max_chars)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(TEXT_CHUNK_SIZE)
+            if not collector.add(decoder.decode(chunk, final=not chunk)) or not chunk:
+                break
+    return collector.text()
+
+
+def extract_text_from_pdf(file_path, max_chars):
+    """
+    Extracts one page at a time; pages are separated by form feeds. Scanned
+    pages without a text layer contribute nothing.
+    """
+    from PyPDF2 import PdfReader
+
+    collector = TextCollector(max_chars)
+    with open(file_path, "rb") as f:
+        reader = PdfReader(f)
+        for number, page in enumerate(reader.pages):
+            if number and not collector.add("\f"):
+                break
+            if not collector.add(page.extract_text() or ""):
+                break
+    return collector.text()
+
+
+def extract_text_from_docx(file_path, max_chars):
+    """
+    Streams word/document.xml out of the package with iterparse, clearing
+    each paragraph once read, so the document tree is never built.
+    """
+    collector = TextCollector(max_chars)
+    with zipfile.ZipFile(file_path) as package:
+        with package.open("word/document.xml") as document:
+            paragraph = []
+            for _, element in iterparse(document, events=("end",)):
+                tag = element.tag
+                if tag == WORD_NAMESPACE + "t":
+                    paragraph.append(element.text or "")
+                elif tag == WORD_NAMESPACE + "tab":
+                    paragraph.append("\t")
+                elif tag in (WORD_NAMESPACE + "br", WORD_NAMESPACE + "cr"):
+                    paragraph.append("\n")
+                elif tag == WORD_NAMESPACE + "p":
+                    paragraph.append("\n")
+                    if not collector.add("".join(paragraph)):
+                        break
+                    paragraph = []
+                    element.clear()
+    return collector.text()
+
+
+def extract_text_from_xlsx(file_path, max_chars):
+    """
+    Reads one row at a time with openpyxl's read-only mode. Cells are
+    separated by tabs, rows by newlines and sheets by form feeds.
+    """
+    from openpyxl import load_workbook
+
+    collector = TextCollector(max_chars)
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for number, sheet in enumerate(workbook.worksheets):
+            if not collector.add(("\f" if number else "") + f"{sheet.title}\n"):
+                break
+            for row in sheet.iter_rows(values_only=True):
+                cells = ["" if value is None else str(value) for value in row]
+                if any(cells) and not collector.add("\t".join(cells).rstrip("\t") + "\n"):
+                    return collector.text()
+    finally:
+        workbook.close()
+    return collector.text()
+
+
+def extract_text_from_eml(file_path, max_chars):
+    """
+    The main headers followed by the text parts of the message. HTML parts
+    are only used, with their tags stripped, when there is no plain text.
+    At most EML_BYTES_PER_CHAR bytes per character of text wanted are parsed,
+    so a large attachment is cut off rather than loaded; a part that is cut
+    off yields what was read of it.
+    """
+    collector = TextCollector(max_chars)
+    parser = BytesFeedParser(policy=policy.default)
+    remaining = max_chars * EML_BYTES_PER_CHAR
+    with open(file_path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(TEXT_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            parser.feed(chunk)
+            remaining -= len(chunk)
+    message = parser.close()
+    for header in ("From", "To", "Cc", "Date", "Subject"):
+        if message[header]:
+            collector.add(f"{header}: {message[header]}\n")
+    collector.add("\n")
+    body = message.get_body(preferencelist=("plain", "html"))
+    parts = [body] if body is not None else []
+    parts += [part for part in message.walk() if part.get_content_type() == "text/plain" and part is not body and not part.is_attachment()]
+    for part in parts:
+        try:
+            content = part.get_content()
+        except (LookupError, UnicodeError, ValueError):
+            content = (part.get_payload(decode=True) or b"").decode("utf-8", errors="ignore")
+        if part.get_content_type() == "text/html":
+            content = HTML_TAGS.sub(" ", content)
+        if not collector.add(content + "\n"):
+            break
+    return collector.text()
+
+
+WPD_PRINTABLE = re.compile(rb"[\x20-\x7e]+")
+# WordPerfect 5.x single-byte codes that stand for white space.
+WPD_NEWLINES = {0x0A, 0x0D, 0xCC, 0xCF}
+WPD_SPACES = {0x80, 0x81, 0xA9}
+# Fixed-length WordPerfect 5.x function codes and their total size in bytes.
+WPD_FIXED_LENGTHS = {0xC0: 4, 0xC1: 9, 0xC2: 11, 0xC3: 3, 0xC4: 3, 0xC5: 5, 0xC6: 6, 0xC7: 7}
+
+
+def extract_text_from_wpd(file_path, max_chars):
+    """
+    A heuristic WordPerfect 5.x/6.x reader: skips the prefix area named in
+    the file header, keeps printable ASCII, turns return and space codes
+    into white space and jumps over fixed- and variable-length function
+    codes. Formatting and non-ASCII characters are lost.
+    """
+    collector = TextCollector(max_chars)
+    with open(file_path, "rb") as f:
+        header = f.read(16)
+        if len(header) < 16 or header[1:4] != b"WPC":
+            raise ExtractionError("Not a WordPerfect document.")
+        f.seek(struct.unpack("<I", header[4:8])[0])
+        data = f.read(TEXT_CHUNK_SIZE)
+        carry = b""
+        while data:
+            data = carry + data
+            text = []
+            position = 0
+            end = len(data)
+            while position < end:
+                run = WPD_PRINTABLE.match(data, position)
+                if run:
+                    text.append(run.group().decode("ascii"))
+                    position = run.end()
+                    continue
+                code = data[position]
+                if code in WPD_NEWLINES:
+                    text.append("\n")
+                    size = 1
+                elif code in WPD_SPACES:
+                    text.append(" ")
+                    size = 1
+                elif code in WPD_FIXED_LENGTHS:
+                    size = WPD_FIXED_LENGTHS[code]
+                elif code >= 0xD0:
+                    if position + 4 > end:
+                        break
+                    size = 4 + struct.unpack("<H", data[position + 2:position + 4])[0]
+                else:
+                    size = 1
+                if position + size > end:
+                    break
+                position += size
+            carry = data[position:]
+            if not collector.add("".join(text)):
+                break
+            data = f.read(TEXT_CHUNK_SIZE)
+            if not data and carry:
+                # A truncated function code at the end of the file.
+                break
+    return collector.text()
+
+
+EXTRACTORS = {
+    '.docx': extract_text_from_docx,
+    '.pdf': extract_text_from_pdf,
+    '.xlsx': extract_text_from_xlsx,
+    '.txt': extract_text_from_txt,
+    '.eml': extract_text_from_eml,
+    '.wpd': extract_text_from_wpd,
+}
+
+
+def extract_text(file_path, max_chars):
+    extractor = EXTRACTORS.get(os.path.splitext(file_path)[1].lower())
+    if extractor is None:
+        raise ExtractionError(f"No extractor for {file_path}.")
+    return extractor(file_path, max_chars)
+
+
+def _extraction_worker(connection):
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        file_path, max_chars = request
+        try:
+            connection.send((True, extract_text(file_path, max_chars)))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ExtractorProcess:
+    """
+    One child process that extracts files sent to it over a pipe.
+    """
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_extraction_worker, args=(child,), daemon=True)
+        try:
+            self.process.start()
+        except BaseException:
+            self.connection.close()
+            raise
+        finally:
+            child.close()
+        self.tasks = 0
+
+    def extract(self, file_path, max_chars, timeout):
+        self.tasks += 1
+        self.connection.send((file_path, max_chars))
+        if not self.connection.poll(timeout):
+            raise ExtractionTimeout(f"Extraction of {file_path} took longer than {timeout}s.")
+        ok, result = self.connection.recv()
+        if not ok:
+            raise ExtractionError(result)
+        return result
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class ExtractionPool:
+    """
+    Runs extractors in child processes so that a pathological file cannot
+    stall or crash the agent. Each extraction gets a whole process to
+    itself: on timeout that process is killed and replaced without
+    affecting extractions running in the others. Processes are also
+    replaced after `max_tasks_per_process` files to return memory that
+    parsers leave behind.
+    """
+
+    def __init__(self, workers=4, max_chars=1000000, timeout=120.0, max_tasks_per_process=200):
+        self.workers = workers
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.max_tasks_per_process = max_tasks_per_process
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._started = False
+
+    def start(self):
+        for _ in range(self.workers):
+            self._idle.put(None)
+        self._started = True
+
+    def extract(self, file_path):
+        if not self._started:
+            return extract_text(file_path, self.max_chars)
+        worker = self._idle.get()
+        try:
+            if worker is None or not worker.alive() or worker.tasks >= self.max_tasks_per_process:
+                if worker is not None:
+                    worker.close()
+                    worker = None
+                # Started on first use, so an idle agent keeps no children.
+                worker = ExtractorProcess(self._context)
+            return worker.extract(file_path, self.max_chars, self.timeout)
+        except (ExtractionTimeout, EOFError, OSError):
+            # The process may not have started at all.
+            if worker is not None:
+                worker.kill()
+                worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def stop(self):
+        self._started = False
+        for _ in range(self.workers):
+            worker = self._idle.get()
+            if worker is not None:
+                worker.close()
@@ -0,0 +1,260 @@
+import os
+
+import pytest
+
+import coalescer
+from coalescer import EventCoalescer
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class StopAfterOnePass:
+    """
+    Stands in for the coalescer's stop event so `_run` makes a single pass.
+    """
+
+    def __init__(self):
+        self.passes = 0
+
+    def wait(self, timeout):
+        self.passes += 1
+        return self.passes > 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(coalescer, "time", fake)
+    return fake
+
+
+class Recorder:
+    def __init__(self, succeed=True):
+        self.processed = []
+        self.deleted = []
+        self.succeed = succeed
+
+    def process(self, path, previous_path):
+        self.processed.append((path, previous_path))
+        return self.succeed
+
+    def delete(self, path):
+        self.deleted.append(path)
+        return True
+
+
+def make_coalescer(recorder, with_delete=True, quiet_period=2.0):
+    return EventCoalescer(
+        recorder.process,
+        lambda path: path.endswith(".docx"),
+        delete=recorder.delete if with_delete else None,
+        quiet_period=quiet_period,
+    )
+
+
+def settle(events, clock, seconds=2.0):
+    clock.now += seconds
+    events._stopped = StopAfterOnePass()
+    events._run()
+
+
+def write(path, data, mtime=None):
+    path.write_bytes(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_a_burst_of_modifies_is_processed_once(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"draft", mtime=1)
+    for _ in range(5):
+        events.touch(path)
+        clock.now += 1
+    assert events.pending_count() == 1
+    settle(events, clock, seconds=0.5)
+    assert recorder.processed == []
+    settle(events, clock, seconds=1.0)
+    assert recorder.processed == [(path, None)]
+    assert events.pending_count() == 0
+
+
+def test_a_file_still_being_written_waits_another_quiet_period(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"part", mtime=1)
+    events.touch(path)
+    write(tmp_path / "a.docx", b"part and the rest", mtime=2)
+    settle(events, clock)
+    assert recorder.processed == []
+    settle(events, clock)
+    assert recorder.processed == [(path, None)]
+
+
+def test_an_unchanged_file_is_not_sent_twice(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"text", mtime=1)
+    events.touch(path)
+    settle(events, clock)
+    events.touch(path)
+    settle(events, clock)
+    assert recorder.processed == [(path, None)]
+    write(tmp_path / "a.docx", b"new text", mtime=2)
+    events.touch(path)
+    settle(events, clock)
+    assert len(recorder.processed) == 2
+
+
+def test_a_failed_send_is_retried_on_the_next_event(tmp_path, clock):
+    recorder = Recorder(succeed=False)
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"text", mtime=1)
+    events.touch(path)
+    settle(events, clock)
+    events.touch(path)
+    settle(events, clock)
+    assert recorder.processed == [(path, None), (path, None)]
+
+
+def test_untracked_files_are_ignored(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    events.touch(write(tmp_path / "~$a.tmp", b"lock"))
+    assert events.pending_count() == 0
+
+
+def test_created_then_deleted_is_a_delete(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"text")
+    events.touch(path)
+    os.remove(path)
+    events.remove(path)
+    settle(events, clock)
+    assert recorder.processed == []
+    assert recorder.deleted == [path]
+
+
+def test_without_a_delete_callback_missing_files_are_dropped(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder, with_delete=False)
+    path = str(tmp_path / "a.docx")
+    events.remove(path)
+    settle(events, clock)
+    assert recorder.processed == [] and recorder.deleted == []
+    assert events.pending_count() == 0
+
+
+def test_deleted_and_recreated_within_the_quiet_period_is_an_update(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"old", mtime=1)
+    os.remove(path)
+    events.remove(path)
+    clock.now += 1
+    write(tmp_path / "a.docx", b"new", mtime=2)
+    events.touch(path)
+    settle(events, clock)
+    assert recorder.processed == [(path, None)]
+    assert recorder.deleted == []
+
+
+def test_a_rename_remembers_the_old_path(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    old = str(tmp_path / "a.docx")
+    new = write(tmp_path / "b.docx", b"text")
+    events.move(old, new)
+    settle(events, clock)
+    assert recorder.processed == [(new, old)]
+
+
+def test_a_chain_of_renames_keeps_the_first_path(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    first, second = str(tmp_path / "a.docx"), str(tmp_path / "b.docx")
+    last = write(tmp_path / "c.docx", b"text")
+    events.move(first, second)
+    clock.now += 1
+    events.move(second, last)
+    assert events.pending_count() == 1
+    settle(events, clock)
+    assert recorder.processed == [(last, first)]
+
+
+def test_a_renamed_file_is_sent_even_if_its_content_was_already_sent(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"text", mtime=1)
+    events.touch(path)
+    settle(events, clock)
+    new = str(tmp_path / "b.docx")
+    os.rename(path, new)
+    events.move(path, new)
+    settle(events, clock)
+    assert recorder.processed == [(path, None), (new, path)]
+
+
+def test_saving_through_a_temporary_file_is_a_plain_update(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"old", mtime=1)
+    backup, temporary = str(tmp_path / "~wrl0001.tmp"), str(tmp_path / "~wrd0002.tmp")
+    write(tmp_path / "~wrd0002.tmp", b"new", mtime=2)
+    # Word moves the original out of the way, then the new copy over it.
+    os.rename(path, backup)
+    events.move(path, backup)
+    os.rename(temporary, path)
+    events.move(temporary, path)
+    os.remove(backup)
+    events.remove(backup)
+    settle(events, clock)
+    assert recorder.processed == [(path, None)]
+    assert recorder.deleted == []
+
+
+def test_renamed_to_an_untracked_name_and_not_replaced_is_a_delete(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    path = write(tmp_path / "a.docx", b"text")
+    hidden = str(tmp_path / "a.bak")
+    os.rename(path, hidden)
+    events.move(path, hidden)
+    settle(events, clock)
+    assert recorder.deleted == [path]
+
+
+def test_renamed_then_deleted_deletes_both_paths(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    old, new = str(tmp_path / "a.docx"), str(tmp_path / "b.docx")
+    events.move(old, new)
+    events.remove(new)
+    settle(events, clock)
+    assert recorder.processed == []
+    assert recorder.deleted == [new, old]
+
+
+def test_an_error_while_processing_does_not_stop_the_others(tmp_path, clock):
+    recorder = Recorder()
+    events = make_coalescer(recorder)
+    broken, fine = write(tmp_path / "a.docx", b"a"), write(tmp_path / "b.docx", b"b")
+
+    def process(path, previous_path):
+        if path == broken:
+            raise RuntimeError("extraction failed")
+        return recorder.process(path, previous_path)
+
+    events.process = process
+    events.touch(broken)
+    events.touch(fine)
+    settle(events, clock)
+    assert recorder.processed == [(fine, None)]
@@ -0,0 +1,121 @@
+import pytest
+
+from manifest import Confirmations, Manifest
+from work_queue import DELETE, UPSERT
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Server:
+    """
+    Answers status lookups from a dict of tracking id -> status; ids it
+    does not hold are unknown, as after a restart.
+    """
+
+    def __init__(self):
+        self.statuses = {}
+        self.lookups = []
+
+    def __call__(self, tracking_ids):
+        self.lookups.append(list(tracking_ids))
+        return {tracking_id: self.statuses[tracking_id] for tracking_id in tracking_ids if tracking_id in self.statuses}
+
+
+def make(tmp_path, **kwargs):
+    manifest = Manifest(str(tmp_path / "manifest.db"))
+    server = Server()
+    requeued = []
+    clock = Clock()
+    confirmations = Confirmations(
+        manifest, server, lambda *job: requeued.append(job), clock=clock, **kwargs
+    )
+    return confirmations, manifest, server, requeued, clock
+
+
+def test_only_indexed_uploads_reach_the_manifest(tmp_path):
+    confirmations, manifest, server, requeued, _ = make(tmp_path)
+    confirmations.add("t1", "/a.txt", record=(10, 1.0, "sha-a", "doc-a"))
+    confirmations.add("t2", "/b.txt", record=(20, 2.0, "sha-b", "doc-b"))
+    server.statuses.update(t1="queued", t2="queued")
+    assert confirmations.check() == 2
+    assert manifest.get("/a.txt") is None
+
+    server.statuses.update(t1="indexed", t2="stale")
+    assert confirmations.check() == 0
+    assert manifest.get("/a.txt") == (10, 1.0, "sha-a", "doc-a")
+    assert manifest.get("/b.txt") == (20, 2.0, "sha-b", "doc-b")
+    assert requeued == []
+
+
+def test_a_failed_flush_is_sent_again_and_not_recorded(tmp_path):
+    confirmations, manifest, server, requeued, _ = make(tmp_path)
+    confirmations.add("t1", "/new.txt", previous_path="/old.txt", record=(10, 1.0, "sha", "doc"))
+    manifest.record("/old.txt", 10, 1.0, "sha", "old-doc")
+    server.statuses["t1"] = "failed"
+    assert confirmations.check() == 0
+    assert requeued == [("/new.txt", "/old.txt", UPSERT)]
+    assert manifest.get("/new.txt") is None
+    # The move is not settled, so the old path stays until the resend is confirmed.
+    assert manifest.get("/old.txt") is not None
+
+
+def test_ids_the_server_forgot_are_sent_again(tmp_path):
+    confirmations, manifest, server, requeued, _ = make(tmp_path)
+    confirmations.add("t1", "/a.txt", record=(10, 1.0, None, "doc"))
+    confirmations.check()
+    assert requeued == [("/a.txt", None, UPSERT)]
+    assert manifest.get("/a.txt") is None
+
+
+def test_uploads_queued_for_too_long_are_sent_again(tmp_path):
+    confirmations, manifest, server, requeued, clock = make(tmp_path, timeout=60)
+    confirmations.add("t1", "/a.txt", record=(10, 1.0, None, "doc"))
+    server.statuses["t1"] = "queued"
+    clock.now = 59
+    assert confirmations.check() == 1
+    clock.now = 60
+    assert confirmations.check() == 0
+    assert requeued == [("/a.txt", None, UPSERT)]
+
+
+def test_deletes_are_forgotten_once_confirmed(tmp_path):
+    confirmations, manifest, server, requeued, _ = make(tmp_path)
+    manifest.record("/gone.txt", 10, 1.0, None, "doc")
+    manifest.record("/kept.txt", 10, 1.0, None, "doc2")
+    confirmations.add("t1", "/gone.txt", action=DELETE)
+    confirmations.add("t2", "/kept.txt", action=DELETE)
+    server.statuses.update(t1="deleted", t2="failed")
+    confirmations.check()
+    assert manifest.get("/gone.txt") is None
+    # Still in the manifest, so the resent delete is not skipped as unknown.
+    assert manifest.get("/kept.txt") is not None
+    assert requeued == [("/kept.txt", None, DELETE)]
+
+
+def test_lookups_are_batched(tmp_path):
+    confirmations, _, server, _, _ = make(tmp_path, batch_size=2)
+    for n in range(5):
+        confirmations.add(f"t{n}", f"/{n}.txt", record=(1, 1.0, None, None))
+        server.statuses[f"t{n}"] = "queued"
+    confirmations.check()
+    assert [len(lookup) for lookup in server.lookups] == [2, 2, 1]
+
+
+def test_a_failed_lookup_keeps_everything_pending(tmp_path):
+    confirmations, manifest, _, requeued, _ = make(tmp_path)
+
+    def unreachable(tracking_ids):
+        raise ConnectionError("server down")
+
+    confirmations.fetch_statuses = unreachable
+    confirmations.add("t1", "/a.txt", record=(1, 1.0, None, None))
+    with pytest.raises(ConnectionError):
+        confirmations.check()
+    assert len(confirmations) == 1
+    assert requeued == []
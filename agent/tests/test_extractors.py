@@ -0,0 +1,99 @@
+import base64
+from email.feedparser import BytesFeedParser
+from email.message import EmailMessage
+
+import pytest
+
+import extractors
+from extractors import ExtractionPool, extract_text_from_eml, extract_text_from_txt
+
+
+def write_email(path, attachment_size=0, html=False):
+    message = EmailMessage()
+    message["From"] = "alice@example.com"
+    message["To"] = "bob@example.com"
+    message["Subject"] = "Quarterly report"
+    if html:
+        message.set_content("<p>See the <b>attached</b> report.</p>", subtype="html")
+    else:
+        message.set_content("See the attached report.\n")
+    if attachment_size:
+        message.add_attachment(b"\0" * attachment_size, maintype="application", subtype="octet-stream", filename="report.bin")
+    path.write_bytes(bytes(message))
+    return path
+
+
+def test_email_headers_and_body(tmp_path):
+    text = extract_text_from_eml(write_email(tmp_path / "a.eml"), 10000)
+    assert text.startswith("From: alice@example.com\nTo: bob@example.com\nSubject: Quarterly report\n\n")
+    assert "See the attached report." in text
+
+
+def test_html_bodies_lose_their_tags(tmp_path):
+    text = extract_text_from_eml(write_email(tmp_path / "a.eml", html=True), 10000)
+    assert "<" not in text and "attached" in text
+
+
+def test_large_attachments_are_not_read(tmp_path, monkeypatch):
+    fed = []
+    feed = BytesFeedParser.feed
+    monkeypatch.setattr(BytesFeedParser, "feed", lambda parser, data: fed.append(len(data)) or feed(parser, data))
+    path = write_email(tmp_path / "a.eml", attachment_size=8 * 1024 * 1024)
+    text = extract_text_from_eml(str(path), 1000)
+    assert "See the attached report." in text
+    assert sum(fed) <= 1000 * extractors.EML_BYTES_PER_CHAR
+
+
+def test_a_text_part_cut_off_by_the_cap_yields_what_was_read(tmp_path):
+    message = EmailMessage()
+    message["Subject"] = "Long"
+    message.set_content("word " * 20000, cte="base64")
+    path = tmp_path / "long.eml"
+    path.write_bytes(bytes(message))
+    text = extract_text_from_eml(str(path), 500)
+    assert len(text) <= 500
+    assert "word word" in text
+
+
+def test_malformed_base64_falls_back_to_lenient_decoding(tmp_path):
+    body = base64.b64encode(b"hello there").decode()[:-3]
+    path = tmp_path / "bad.eml"
+    path.write_bytes(
+        ("Subject: Bad\nContent-Type: text/plain; charset=utf-8\nContent-Transfer-Encoding: base64\n\n" + body + "\n").encode()
+    )
+    assert "Subject: Bad" in extract_text_from_eml(str(path), 1000)
+
+
+def test_text_is_capped(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("é" * 5000, encoding="utf-8")
+    assert extract_text_from_txt(str(path), 100) == "é" * 100
+
+
+def test_a_worker_that_fails_to_start_gives_its_slot_back(tmp_path, monkeypatch):
+    def cannot_start(context):
+        raise OSError("too many open files")
+
+    pool = ExtractionPool(workers=1)
+    pool.start()
+    monkeypatch.setattr(extractors, "ExtractorProcess", cannot_start)
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+    with pytest.raises(OSError):
+        pool.extract(str(path))
+    # The slot was given back, so the next extraction does not block.
+    assert pool._idle.qsize() == 1
+    with pytest.raises(OSError):
+        pool.extract(str(path))
+    pool.stop()
+
+
+def test_pool_extracts_in_a_child_process(tmp_path):
+    pool = ExtractionPool(workers=1, max_chars=100, timeout=60)
+    pool.start()
+    path = tmp_path / "a.txt"
+    path.write_text("hello from the child")
+    try:
+        assert pool.extract(str(path)) == "hello from the child"
+    finally:
+        pool.stop()
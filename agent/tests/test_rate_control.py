@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+import rate_control
+from rate_control import AdaptiveLimiter, LimiterClosed, parse_retry_after
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(rate_control, "time", fake)
+    return fake
+
+
+def request(limiter, clock, latency=0.1, **outcome):
+    started = limiter.acquire()
+    clock.now += latency
+    limiter.release(started, **outcome)
+
+
+def test_retry_after_seconds_and_dates():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(" 12 ") == 12.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412500.0) == 10.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412500.0) == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+
+def test_the_limit_grows_by_about_one_per_round(clock):
+    limiter = AdaptiveLimiter(max_limit=10)
+    assert limiter.limit == 1
+    request(limiter, clock)
+    assert limiter.limit == 2
+    request(limiter, clock)
+    request(limiter, clock)
+    assert limiter.limit == pytest.approx(2.5 + 1 / 2.5)
+
+
+def test_the_limit_stops_at_max(clock):
+    limiter = AdaptiveLimiter(max_limit=3)
+    for _ in range(50):
+        request(limiter, clock)
+    assert limiter.limit == 3
+
+
+def test_overload_halves_the_limit_once_per_round_trip(clock):
+    limiter = AdaptiveLimiter(max_limit=32, initial_limit=16)
+    request(limiter, clock, latency=0.1)
+    before = limiter.limit
+    request(limiter, clock, latency=0.1, overloaded=True)
+    assert limiter.limit == pytest.approx(before / 2)
+    # A second overload within the same round trip is the same burst.
+    request(limiter, clock, latency=0.01, overloaded=True)
+    assert limiter.limit == pytest.approx(before / 2)
+    clock.now += 1
+    request(limiter, clock, latency=0.1, overloaded=True)
+    assert limiter.limit == pytest.approx(before / 4)
+
+
+def test_the_limit_never_drops_below_min(clock):
+    limiter = AdaptiveLimiter(max_limit=8, min_limit=2, initial_limit=2)
+    for _ in range(5):
+        clock.now += 10
+        request(limiter, clock, overloaded=True)
+    assert limiter.limit == 2
+
+
+def test_rising_latency_counts_as_overload(clock):
+    limiter = AdaptiveLimiter(max_limit=32, initial_limit=16, latency_tolerance=2.0)
+    for _ in range(20):
+        request(limiter, clock, latency=0.1)
+    grown = limiter.limit
+    clock.now += 10
+    for _ in range(10):
+        request(limiter, clock, latency=1.0)
+    assert limiter.limit < grown / 2
+
+
+def test_retry_after_pauses_new_requests(clock):
+    limiter = AdaptiveLimiter(max_limit=4, initial_limit=4, max_pause=30)
+    request(limiter, clock, retry_after=60, overloaded=True)
+    assert limiter._paused_until == pytest.approx(clock.now + 30)
+
+
+def test_at_most_limit_requests_are_in_flight(clock):
+    limiter = AdaptiveLimiter(max_limit=2, initial_limit=2)
+    first = limiter.acquire()
+    limiter.acquire()
+    waiter = threading.Thread(target=lambda: limiter.release(limiter.acquire()))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    limiter.release(first)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert limiter.in_flight == 1
+
+
+def test_closing_wakes_waiters(clock):
+    limiter = AdaptiveLimiter(max_limit=1)
+    limiter.acquire()
+    errors = []
+
+    def wait():
+        try:
+            limiter.acquire()
+        except LimiterClosed as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    limiter.close()
+    waiter.join(5)
+    assert len(errors) == 1
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+import zstandard
+
+import transfer
+from transfer import GZIP, IDENTITY, ZSTD, choose_encoding, compress_bytes, compress_file, file_sha256
+
+DATA = os.urandom(64 * 1024) + b"The quick brown fox. " * 100000
+
+
+def decompress(data, encoding):
+    if encoding == ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if encoding == GZIP:
+        return gzip.decompress(data)
+    return data
+
+
+def test_the_preferred_shared_encoding_is_chosen():
+    assert choose_encoding(["gzip", "zstd", "identity"]) == ZSTD
+    assert choose_encoding(["gzip", "identity"]) == GZIP
+    assert choose_encoding(["br"]) == IDENTITY
+    assert choose_encoding([]) == IDENTITY
+
+
+def test_without_zstandard_gzip_is_chosen(monkeypatch):
+    monkeypatch.setattr(transfer, "zstandard", None)
+    assert choose_encoding(["zstd", "gzip", "identity"]) == GZIP
+
+
+@pytest.mark.parametrize("encoding", [ZSTD, GZIP, IDENTITY])
+def test_bytes_round_trip(encoding):
+    compressed = compress_bytes(DATA, encoding)
+    assert decompress(compressed, encoding) == DATA
+    if encoding != IDENTITY:
+        assert len(compressed) < len(DATA) // 4
+
+
+@pytest.mark.parametrize("encoding", [ZSTD, GZIP])
+def test_files_round_trip(tmp_path, encoding):
+    path = tmp_path / "a.txt"
+    path.write_bytes(DATA)
+    with compress_file(str(path), encoding) as spool:
+        assert spool.tell() == 0
+        assert decompress(spool.read(), encoding) == DATA
+
+
+@pytest.mark.parametrize("encoding", [ZSTD, GZIP])
+def test_large_compressed_files_spill_to_disk(tmp_path, monkeypatch, encoding):
+    monkeypatch.setattr(transfer, "SPOOL_MAX_SIZE", 1024)
+    path = tmp_path / "a.txt"
+    path.write_bytes(DATA)
+    with compress_file(str(path), encoding) as spool:
+        assert spool._rolled
+        assert decompress(spool.read(), encoding) == DATA
+
+
+def test_empty_files_round_trip(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    for encoding in (ZSTD, GZIP):
+        with compress_file(str(path), encoding) as spool:
+            assert decompress(spool.read(), encoding) == b""
+
+
+def test_file_sha256(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "CHUNK_SIZE", 1000)
+    path = tmp_path / "a.bin"
+    path.write_bytes(DATA)
+    assert file_sha256(str(path)) == hashlib.sha256(DATA).hexdigest()
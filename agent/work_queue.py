@@ -0,0 +1,310 @@
+import random
+import sqlite3
+import threading
+import time
+
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Job priorities: changes seen as they happen go before the backlog found by
+# a resync, so a file someone just saved is not stuck behind a catch-up.
+LIVE = 0
+BACKLOG = 1
+
+
+class Job:
+    def __init__(self, id, path, previous_path, action, attempts, generation, failures=0):
+        self.id = id
+        self.path = path
+        self.previous_path = previous_path
+        self.action = action
+        self.attempts = attempts
+        self.generation = generation
+        self.failures = failures
+
+
+class PersistentQueue:
+    """
+    A durable work queue of file paths backed by SQLite.
+
+    A job either uploads a file (UPSERT) or removes it from the index
+    (DELETE). There is at most one job per path: queueing a path that is
+    already queued updates the existing job instead of adding another, and
+    the latest action wins. A job is claimed by a
+    worker while it is being uploaded and removed only once it is done, so
+    jobs survive restarts and network outages. If the file changes again
+    while its job is in flight, the job's generation is bumped and it is run
+    again afterwards rather than being removed.
+
+    Jobs are claimed by priority (LIVE before BACKLOG) and, within a
+    priority, most recently modified first.
+
+    A job that keeps failing in a way retrying does not fix is moved to the
+    dead-letter state: it stays in the table with its last error but is no
+    longer claimed, until the file changes and is queued again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._available = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                previous_path TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0,
+                claimed INTEGER NOT NULL DEFAULT 0,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+        if "action" not in columns:
+            self._db.execute(f"ALTER TABLE jobs ADD COLUMN action TEXT NOT NULL DEFAULT '{UPSERT}'")
+        if "priority" not in columns:
+            self._db.execute(f"ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT {LIVE}")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN modified REAL NOT NULL DEFAULT 0")
+        if "dead" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN dead INTEGER NOT NULL DEFAULT 0")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN error TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_order ON jobs (priority, modified DESC)")
+        # Anything claimed when the agent last stopped was never finished.
+        self._db.execute("UPDATE jobs SET claimed = 0 WHERE claimed = 1")
+        if self.depth():
+            self._available.set()
+        dead = self.dead_count()
+        if dead:
+            print(f"{dead} uploads are dead-lettered (see the jobs table in {path}); they are retried when their files change.")
+
+    def put(self, path, previous_path=None, action=UPSERT):
+        self.put_many([(path, previous_path, action, time.time())])
+        return True
+
+    def put_many(self, jobs, priority=LIVE):
+        """
+        Queues (path, previous_path, action, modified) tuples in a single
+        transaction. A job queued again keeps the higher of its priorities; a
+        dead-lettered job is revived only when the file was modified since.
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    """
+                    INSERT INTO jobs (path, previous_path, action, modified, priority) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(path) DO UPDATE SET
+                        previous_path = COALESCE(excluded.previous_path, jobs.previous_path),
+                        action = excluded.action,
+                        modified = MAX(excluded.modified, jobs.modified),
+                        priority = MIN(excluded.priority, jobs.priority),
+                        attempts = 0,
+                        not_before = 0,
+                        failures = CASE WHEN excluded.modified > jobs.modified OR excluded.action != jobs.action THEN 0 ELSE jobs.failures END,
+                        dead = CASE WHEN excluded.modified > jobs.modified OR excluded.action != jobs.action THEN 0 ELSE jobs.dead END,
+                        generation = jobs.generation + 1
+                    """,
+                    (job + (priority,) for job in jobs),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        self._available.set()
+
+    def claim(self):
+        """
+        Returns the most urgent job that is due, marking it as in flight, or
+        None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, path, previous_path, action, attempts, generation, failures FROM jobs"
+                " WHERE claimed = 0 AND dead = 0 AND not_before <= ? ORDER BY priority, modified DESC LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if row is None:
+                self._available.clear()
+                return None
+            self._db.execute("UPDATE jobs SET claimed = 1 WHERE id = ?", (row[0],))
+        return Job(*row)
+
+    def complete(self, job):
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM jobs WHERE id = ? AND generation = ?", (job.id, job.generation))
+            if cursor.rowcount == 0:
+                # The file changed while it was being uploaded: run it again.
+                self._db.execute("UPDATE jobs SET claimed = 0 WHERE id = ?", (job.id,))
+                self._available.set()
+
+    def retry(self, job, delay, failed=False):
+        """
+        Releases a job to be run again after `delay` seconds. `failed` counts
+        the attempt towards the job's failures (see dead_letter).
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET claimed = 0, attempts = attempts + 1, failures = failures + ?, not_before = ?"
+                " WHERE id = ? AND generation = ?",
+                (int(failed), time.time() + delay, job.id, job.generation),
+            )
+            if cursor.rowcount == 0:
+                # Queued again meanwhile; the new version is due right away.
+                self._db.execute("UPDATE jobs SET claimed = 0 WHERE id = ?", (job.id,))
+                self._available.set()
+
+    def dead_letter(self, job, error):
+        """
+        Stops running a job, keeping it and its error for inspection. A job
+        queued again meanwhile is run again instead.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET claimed = 0, attempts = attempts + 1, failures = failures + 1, dead = 1, error = ?"
+                " WHERE id = ? AND generation = ?",
+                (error, job.id, job.generation),
+            )
+            if cursor.rowcount == 0:
+                self._db.execute("UPDATE jobs SET claimed = 0 WHERE id = ?", (job.id,))
+                self._available.set()
+
+    def dead_letters(self):
+        """
+        Returns (path, action, failures, error) for every dead-lettered job.
+        """
+        with self._lock:
+            return self._db.execute("SELECT path, action, failures, error FROM jobs WHERE dead = 1 ORDER BY path").fetchall()
+
+    def depth(self):
+        """
+        The number of jobs waiting to run, not counting dead letters.
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE dead = 0").fetchone()[0]
+
+    def dead_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE dead = 1").fetchone()[0]
+
+    def wait(self, timeout):
+        """
+        Blocks until a job may be available or the timeout passes.
+        """
+        return self._available.wait(timeout)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class UploadWorkerPool:
+    """
+    Worker threads that drain a PersistentQueue.
+
+    `handler(job)` uploads one job and returns the number of bytes sent. Any
+    exception it raises is treated as transient: the job is retried after an
+    exponential backoff (base * 2^attempts, capped at `backoff_max`) for as
+    long as it takes, so an outage only delays uploads. The backoff is
+    jittered so that agents which failed together do not retry together, and
+    an exception with a `retry_after` attribute (the server's Retry-After)
+    waits at least that long.
+
+    The exceptions in `limited_errors` are the exception: they may mean the
+    server can never process the job (e.g. it fails on the document), so a
+    job that raises them `max_failures` times is dead-lettered instead of
+    holding a worker forever. Queue depth, dead letters and throughput are
+    logged every `report_interval` seconds.
+    """
+
+    def __init__(self, queue, handler, workers=4, backoff_base=2.0, backoff_max=300.0, report_interval=60.0,
+                 limited_errors=(), max_failures=5):
+        self.queue = queue
+        self.handler = handler
+        self.worker_count = workers
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.report_interval = report_interval
+        self.limited_errors = tuple(limited_errors)
+        self.max_failures = max_failures
+        self._stopped = threading.Event()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self._sent = 0
+        self._failed = 0
+        self._bytes = 0
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._work, name=f"upload-worker-{i}", daemon=True)
+            for i in range(self.worker_count)
+        ]
+        self._threads.append(threading.Thread(target=self._report, name="upload-stats", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        print(f"Upload workers started: {self.worker_count} (queue depth {self.queue.depth()}).")
+
+    def stop(self):
+        """
+        Stops the workers after their current upload. Unfinished jobs stay in
+        the queue for the next run.
+        """
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _work(self):
+        while not self._stopped.is_set():
+            job = self.queue.claim()
+            if job is None:
+                # Also wakes up periodically for jobs whose backoff expired.
+                self.queue.wait(1.0)
+                continue
+            try:
+                sent_bytes = self.handler(job)
+            except Exception as e:
+                if self._stopped.is_set():
+                    self.queue.retry(job, 0)
+                    break
+                limited = isinstance(e, self.limited_errors)
+                if limited and job.failures + 1 >= self.max_failures:
+                    print(f"Upload of {job.path} failed {job.failures + 1} times, giving up until the file changes: {e}")
+                    self.queue.dead_letter(job, str(e))
+                    with self._stats_lock:
+                        self._failed += 1
+                    continue
+                delay = min(self.backoff_base * 2 ** job.attempts, self.backoff_max)
+                delay = random.uniform(delay / 2, delay)
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after:
+                    delay = max(delay, min(retry_after, self.backoff_max))
+                print(f"Upload of {job.path} failed (attempt {job.attempts + 1}), retrying in {delay:.0f}s: {e}")
+                self.queue.retry(job, delay, failed=limited)
+                with self._stats_lock:
+                    self._failed += 1
+                continue
+            self.queue.complete(job)
+            with self._stats_lock:
+                self._sent += 1
+                self._bytes += sent_bytes or 0
+
+    def _report(self):
+        last = time.monotonic()
+        while not self._stopped.wait(self.report_interval):
+            now = time.monotonic()
+            with self._stats_lock:
+                sent, failed, sent_bytes = self._sent, self._failed, self._bytes
+                self._sent = self._failed = self._bytes = 0
+            elapsed = now - last
+            last = now
+            print(
+                f"Upload queue depth {self.queue.depth()} ({self.queue.dead_count()} dead-lettered); last {elapsed:.0f}s: {sent} sent "
+                f"({sent / elapsed:.2f} files/s, {sent_bytes / elapsed / 1024:.1f} KB/s), {failed} failed attempts."
+            )
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
 
-from app.core.auth import get_current_admin_user, FAKE_USER_DB, get_user
-from app.core.security import get_password_hash
-from app.models.user import User, UserCreate
+from app.core.auth import get_current_admin_user, FAKE_USER_DB, get_user, token_cache
+from app.core.security import get_password_hash_async
+from app.models.user import User, UserCreate, UserUpdate
+from app.db.session import get_es_client
+from app.db.indices import READ_ALIAS, WRITE_ALIAS, document_indices
+from app.services.change_feed import change_feed
+from app.services.dedupe import dedupe_job
+from app.services.index_maintenance import bulk_load, reindex_job, rollover
+from app.services.reprocess import reprocess_job
+from app.services.search_cache import search_cache
+from elasticsearch import AsyncElasticsearch
 
 router = APIRouter()
 
@@ -33,7 +41,7 @@ async def create_user(
             detail="The user with this username already exists in the system.",
         )
     
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash_async(user_in.password)
     user_data = user_in.model_dump()
     user_data.pop("password") # Remove plain password before storing
     user_data["hashed_password"] = hashed_password
@@ -43,4 +51,241 @@ async def create_user(
     FAKE_USER_DB[user_in.username] = user_data
     
     # Return a User model, not the one with the hashed password
-    return User(**user_data)
\ No newline at end of file
+    return User(**user_data)
+
+@router.patch("/users/{username}", response_model=User)
+async def update_user(
+    username: str,
+    user_in: UserUpdate,
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Change a user's name, password or role, or disable them. Takes effect on
+    the user's next request; their cached tokens are dropped.
+    """
+    user_data = FAKE_USER_DB.get(username)
+    if user_data is None:
+        raise HTTPException(status_code=404, detail="The user does not exist.")
+    changes = user_in.model_dump(exclude_unset=True)
+    password = changes.pop("password", None)
+    if password is not None:
+        changes["hashed_password"] = await get_password_hash_async(password)
+    user_data.update(changes)
+    token_cache.invalidate_user(username)
+    return User(**user_data)
+
+@router.post("/maintenance/dedupe", status_code=status.HTTP_202_ACCEPTED)
+async def start_dedupe(
+    dry_run: bool = False,
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Start collapsing duplicate documents onto their stable ids in the background.
+    With dry_run, only count what would be copied and deleted.
+    """
+    try:
+        dedupe_job.start(es_client, dry_run=dry_run)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "dry_run": dry_run}
+
+@router.get("/maintenance/dedupe")
+async def read_dedupe_status(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Progress of the current or last dedupe job.
+    """
+    return dedupe_job.status
+
+@router.get("/maintenance/search-cache")
+async def read_search_cache_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Hit and miss counts, hit ratio and memory use of this worker's search cache.
+    """
+    return search_cache.stats()
+
+@router.delete("/maintenance/search-cache", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_search_cache(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Drop every cached search response in all workers.
+    """
+    search_cache.clear()
+    await search_cache.invalidate()
+
+@router.get("/maintenance/change-feed")
+async def read_change_feed_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Connected clients, buffered events and the last event id of this worker's change feed.
+    """
+    return change_feed.stats()
+
+@router.get("/maintenance/indices")
+async def read_document_indices(
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    The document indices behind the read alias, which one takes writes, and
+    their document counts and sizes.
+    """
+    try:
+        await document_indices.refresh(es_client)
+        stats = await es_client.indices.stats(index=READ_ALIAS, metric="docs,store")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading document indices: {e}")
+    return {
+        "read_alias": READ_ALIAS,
+        "write_alias": WRITE_ALIAS,
+        "write_index": document_indices.write_index,
+        "legacy": document_indices.legacy,
+        "reindexing": sorted(document_indices.reindexing),
+        "indices": {
+            index: {
+                "documents": entry["primaries"]["docs"]["count"],
+                "primary_bytes": entry["primaries"]["store"]["size_in_bytes"],
+            }
+            for index, entry in sorted(stats.get("indices", {}).items())
+        },
+        "bulk_load": bulk_load.status(),
+    }
+
+@router.post("/maintenance/indices/rollover")
+async def rollover_document_index(
+    force: bool = False,
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Roll the write alias over to a new index if the write index has reached
+    the configured size or age, or unconditionally with force.
+    """
+    if reindex_job.is_running():
+        raise HTTPException(status_code=409, detail="A reindex job is running.")
+    try:
+        return await rollover(es_client, force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rolling over: {e}")
+
+@router.post("/maintenance/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def start_reindex(
+    delete_old: bool = False,
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Start copying every document into a new index built from the current
+    template and swap the aliases over to it, without downtime. With
+    delete_old, the old indices are deleted afterwards.
+    """
+    try:
+        # Another worker's job shows in the aliases.
+        await document_indices.refresh(es_client)
+        if document_indices.reindexing:
+            raise RuntimeError(f"A reindex is running (on {', '.join(sorted(document_indices.reindexing))}).")
+        reindex_job.start(es_client, delete_old=delete_old)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "delete_old": delete_old}
+
+@router.get("/maintenance/reindex")
+async def read_reindex_status(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Progress of the current or last reindex job.
+    """
+    return reindex_job.status
+
+@router.get("/maintenance/bulk-load")
+async def read_bulk_load_status(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    return bulk_load.status()
+
+@router.post("/maintenance/bulk-load")
+async def enable_bulk_load(
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Switch off refresh and replicas on the write index for a large backfill.
+    Documents written meanwhile are not searchable until bulk load is
+    switched off again (or BULK_LOAD_MAX_DURATION passes).
+    """
+    try:
+        return await bulk_load.enable(es_client)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error enabling bulk load mode: {e}")
+
+@router.delete("/maintenance/bulk-load")
+async def disable_bulk_load(
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Restore the write index's refresh interval and replicas and make
+    everything loaded searchable.
+    """
+    try:
+        return await bulk_load.disable(es_client)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error disabling bulk load mode: {e}")
+
+@router.post("/maintenance/reprocess", status_code=status.HTTP_202_ACCEPTED)
+async def start_reprocess(
+    dry_run: bool = False,
+    resume: bool = True,
+    slices: Optional[int] = Query(None, ge=1, le=64),
+    max_docs_per_second: Optional[float] = Query(None, ge=0),
+    es_client: AsyncElasticsearch = Depends(get_es_client),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Start re-running FileProcessor over every document in the background and
+    updating the derived fields that change. Continues an interrupted job
+    unless resume is false. With dry_run, only count the documents that
+    would change.
+    """
+    try:
+        reprocess_job.start(es_client, dry_run=dry_run, resume=resume, slices=slices, max_docs_per_second=max_docs_per_second)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "dry_run": dry_run, "resume": resume}
+
+@router.get("/maintenance/reprocess")
+async def read_reprocess_status(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Progress and throughput of the current or last reprocess job.
+    """
+    return reprocess_job.progress()
+
+@router.put("/maintenance/reprocess/throttle")
+async def throttle_reprocess(
+    max_docs_per_second: float = Query(..., ge=0),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Cap the running job's throughput in documents per second (0 removes the cap).
+    """
+    reprocess_job.throttle(max_docs_per_second)
+    return reprocess_job.progress()
+
+@router.delete("/maintenance/reprocess")
+async def stop_reprocess(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Stop the running job; its progress is checkpointed and a new start resumes it.
+    """
+    await reprocess_job.stop()
+    return reprocess_job.progress()
@@ -1,155 +1,731 @@
+import asyncio
 import json
-import csv
-import io
+import mimetypes
+import ntpath
 from datetime import datetime
 import uuid
-from app.services.file_processor import FileProcessor
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Header
-from fastapi.responses import StreamingResponse
-from typing import List
-from app.db.session import get_es_client
+from app.services.processing_pool import processing_pool
+from app.services.ingest_queue import ingest_queue, IngestQueueFull
+from app.services.blob_store import blob_store, ChecksumMismatch, SHA256_PATTERN
+from app.services.document_identity import stable_document_id, document_version
+from app.services.admission import admission, AdmissionRejected
+from app.services.search_query import build_search_query, build_search_sort, build_highlight, encode_cursor, decode_cursor, search_cache_params, build_facet_aggs, parse_facets, parse_passages
+from app.services.passages import passages_for, join_passages
+from app.services.similarity import find_similar, version_families
+from app.services.facets import facet_cache
+from app.services.search_cache import search_cache
+from app.services.change_feed import change_feed, stream_changes
+from app.services.document_fetch import parse_fields, source_filter, document_etag, etag_matches, content_disposition
+from app.services.export import ExportCursor, EXPORT_FORMATS, stream_export
+from app.services.index_maintenance import index_maintenance
+from app.services.payload import DecodingReader, InvalidPayload, PayloadTooLarge, read_payload, supported_encodings, IDENTITY
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form, Header
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from app.db.session import get_es_client, get_ingest_client, get_search_client
+from app.db.indices import READ_ALIAS, WRITE_ALIAS, get_document
 from elasticsearch import AsyncElasticsearch
-from app.models.document import DocumentSearchRequest, DocumentSearchResult, DocumentInDB
+from app.models.document import DocumentSearchRequest, DocumentSearchPage, SearchHit, FacetCounts, DocumentInDB, RelatedVersions, RelatedVersion, BatchIngestItem, BatchIngestResult, IngestAccepted, IngestStatus, IngestStatusList, IngestStatusRequest, DocumentDeleteRequest
 from app.models.user import User
 from app.core.auth import get_current_active_user
+from app.core.config import settings
 
 router = APIRouter()
 
+AGENT_API_KEYS = {key.strip() for key in settings.AGENT_API_KEY.split(",") if key.strip()}
+
 async def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != "DEV_API_KEY_12345":
+    if x_api_key not in AGENT_API_KEYS:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API Key")
+    return x_api_key
+
+async def admit_api_key(api_key: str = Depends(verify_api_key)):
+    """
+    Holds one of the API key's admission slots while the request runs (see
+    AdmissionController); a key over its share gets 429 with a Retry-After.
+    """
+    try:
+        admission.admit(api_key)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    try:
+        yield api_key
+    finally:
+        admission.release(api_key)
+
+async def _find_unchanged_document(es_client: AsyncElasticsearch, metadata: dict, sha256: str):
+    """
+    Returns the id of the indexed document for the same source file when its
+    original has the given hash, or None when the file is new or changed.
+    """
+    document_id = stable_document_id(metadata.get('source_hostname'), metadata.get('filename_full_path'))
+    if document_id is None:
+        return None
+    response = await get_document(es_client, document_id, source_includes=["metadata.content_sha256"])
+    if response is None:
+        return None
+    if response['_source'].get('metadata', {}).get('content_sha256') == sha256:
+        return document_id
+    return None
+
+async def _store_original(es_client: AsyncElasticsearch, metadata: dict, original_file: Optional[UploadFile], encoding: str = IDENTITY):
+    """
+    Streams the original file into the blob store and records its hash and
+    size in the metadata. Returns the id of the already indexed document when
+    this exact file has been ingested before, in which case there is nothing
+    to reindex.
+
+    The original may be omitted when the metadata carries a content_sha256
+    that is already stored; it may be sent compressed with `encoding`. A sent
+    original must match a declared content_sha256.
+    """
+    if original_file is None:
+        sha256 = metadata.get('content_sha256') or ''
+        if not SHA256_PATTERN.fullmatch(sha256) or not await run_in_threadpool(blob_store.exists, sha256):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The original file is not stored on the server; send it with the document."
+            )
+        metadata['file_size'] = await run_in_threadpool(blob_store.size, sha256)
+        return await _find_unchanged_document(es_client, metadata, sha256)
+
+    if encoding != IDENTITY:
+        original_file = DecodingReader(original_file, encoding, settings.INGEST_ORIGINAL_MAX_BYTES)
+    try:
+        blob = await blob_store.save_upload(original_file, metadata.get('content_sha256'))
+    except ChecksumMismatch as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    metadata['content_sha256'] = blob.sha256
+    metadata['file_size'] = blob.size
+    if blob.existed:
+        return await _find_unchanged_document(es_client, metadata, blob.sha256)
+    return None
+
+async def _read_ingest_payload(json_payload: Optional[str], payload: Optional[UploadFile], encoding: str) -> dict:
+    """
+    The document payload comes either as the `json_payload` form field or,
+    usually compressed, as the `payload` file part.
+    """
+    if payload is not None:
+        return json.loads(await read_payload(payload, encoding, settings.INGEST_PAYLOAD_MAX_BYTES))
+    if json_payload is None:
+        raise HTTPException(status_code=400, detail="Either json_payload or payload is required.")
+    return json.loads(json_payload)
+
+def _document_payload(payload) -> tuple:
+    """
+    The metadata and content of a decoded document payload. Raises
+    InvalidPayload when it does not have the expected shape.
+    """
+    if not isinstance(payload, dict):
+        raise InvalidPayload("The payload must be a JSON object.")
+    metadata = payload.get('metadata', {})
+    if not isinstance(metadata, dict):
+        raise InvalidPayload("metadata must be a JSON object.")
+    content = payload.get('content', '')
+    if not isinstance(content, str):
+        raise InvalidPayload("content must be a string.")
+    return metadata, content
+
+async def _prepare_document(metadata: dict, content: str, filename: str) -> dict:
+    """
+    Runs the FileProcessor over a single document and returns the body that
+    is stored in Elasticsearch.
+    """
+    processed_data = await processing_pool.process(metadata, content, filename)
+
+    # Update metadata with processed data and original filename; the
+    # similarity signature is stored beside the metadata.
+    similarity = processed_data.pop('similarity', None)
+    metadata.update(processed_data)
+    metadata['filename_original'] = filename
+
+    # Convert timestamps to datetime objects for storage
+    if 'created_date' in metadata and metadata['created_date']:
+        metadata['created_date'] = datetime.fromtimestamp(metadata['created_date'])
+    if 'modified_date' in metadata and metadata['modified_date']:
+        metadata['modified_date'] = datetime.fromtimestamp(metadata['modified_date'])
+
+    document_body = {
+        "metadata": metadata,
+        "content": content,
+        "ingest_date": datetime.utcnow()
+    }
+    if similarity is not None:
+        document_body["similarity"] = similarity
+    passages = passages_for(content)
+    if passages:
+        document_body["passages"] = passages
+        # Beyond the cap, the passages alone stand in for the content.
+        if len(content) > settings.PASSAGE_CONTENT_MAX_CHARS:
+            del document_body["content"]
+    return document_body
+
+def _document_content(source: dict) -> Optional[str]:
+    """
+    A document's content, rebuilt from its passages when only those are stored.
+    """
+    if source.get("content") is None and source.get("passages"):
+        return join_passages(source["passages"])
+    return source.get("content")
+
+def _index_action(document_body: dict) -> dict:
+    """
+    Builds the bulk action for a prepared document. Documents are addressed
+    by a stable id derived from their source file and versioned externally by
+    their modification time, so re-ingesting a file replaces its document and
+    an older version arriving late is rejected by Elasticsearch as a
+    conflict instead of overwriting newer data.
+    """
+    metadata = document_body["metadata"]
+    document_id = stable_document_id(metadata.get('source_hostname'), metadata.get('filename_full_path')) or str(uuid.uuid4())
+    document_body["document_id"] = document_id
+    action = {
+        "_op_type": "index",
+        "_index": WRITE_ALIAS,
+        "_id": document_id,
+        "_source": document_body,
+    }
+    version = document_version(metadata.get('modified_date'))
+    if version is not None:
+        action["_version"] = version
+        action["_version_type"] = "external_gte"
+    return action
+
+async def _link_version_families(es_client: AsyncElasticsearch, actions: List[dict]):
+    """
+    Puts prepared documents into the version family of their closest
+    near-duplicate (see VersionFamilies). The lookups run concurrently; the
+    families are assigned in order, so a document finds the earlier ones.
+    """
+    bodies = [action["_source"] for action in actions]
+    indexed = await asyncio.gather(*(
+        version_families.lookup(es_client, action["_id"], body.get("similarity")) for action, body in zip(actions, bodies)
+    ))
+    for action, body, matches in zip(actions, bodies, indexed):
+        body["version_family"] = version_families.assign(action["_id"], body.get("similarity"), matches)
+
+def _superseded_action(metadata: dict):
+    """
+    When the agent reports a move or rename, the document indexed under the
+    old path has been replaced by the one at the new path. Returns the delete
+    action for it, or None.
+    """
+    previous_path = metadata.pop('previous_full_path', None)
+    if not previous_path or previous_path == metadata.get('filename_full_path'):
+        return None
+    previous_id = stable_document_id(metadata.get('source_hostname'), previous_path)
+    if previous_id is None:
+        return None
+    return {"_op_type": "delete", "_index": WRITE_ALIAS, "_id": previous_id}
+
+@router.get("/ingest/capabilities")
+async def get_ingest_capabilities(api_key: str = Depends(verify_api_key)):
+    """
+    Lets agents negotiate how they upload: which encodings the payload and
+    original may be compressed with, and whether an original that is already
+    stored (see HEAD /ingest/blobs/{sha256}) may be left out.
+    """
+    return {
+        "encodings": supported_encodings(),
+        "skip_stored_originals": True,
+        "max_payload_bytes": settings.INGEST_PAYLOAD_MAX_BYTES,
+    }
 
-@router.post("/ingest", status_code=status.HTTP_201_CREATED)
+@router.head("/ingest/blobs/{sha256}")
+async def check_stored_original(sha256: str, api_key: str = Depends(verify_api_key)):
+    """
+    200 when an original with this SHA-256 is stored, 404 otherwise.
+    """
+    if SHA256_PATTERN.fullmatch(sha256) and await run_in_threadpool(blob_store.exists, sha256):
+        return Response(status_code=status.HTTP_200_OK)
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+@router.post("/ingest", status_code=status.HTTP_202_ACCEPTED, response_model=IngestAccepted)
 async def ingest_document(
-    json_payload: str = Form(...),
-    original_file: UploadFile = File(...),
+    json_payload: Optional[str] = Form(None),
+    payload: Optional[UploadFile] = File(None),
+    payload_encoding: str = Form(IDENTITY),
+    original_file: Optional[UploadFile] = File(None),
+    original_encoding: str = Form(IDENTITY),
     es_client: AsyncElasticsearch = Depends(get_es_client),
-    api_key: str = Depends(verify_api_key)
+    api_key: str = Depends(admit_api_key)
 ):
-    try:
-        payload = json.loads(json_payload)
-        metadata = payload.get('metadata', {})
-        content = payload.get('content', '')
+    """
+    Validates and processes a document, then hands it to the write-behind
+    ingest queue. "queued" only means accepted: the returned tracking id can
+    be looked up with /ingest/status once the document has been flushed,
+    and only "indexed" (or "stale") means it is in the index.
+    Re-ingesting a file that is already indexed unchanged returns 200 with
+    status "unchanged" and queues nothing. When the metadata carries a
+    previous_full_path (the file was moved), the document at the old path
+    is removed.
 
-        # Run the file processor
-        processor = FileProcessor(metadata, content, original_file.filename)
-        processed_data = processor.run_all()
-
-        # Update metadata with processed data and original filename
-        metadata.update(processed_data)
-        metadata['filename_original'] = original_file.filename
+    The payload may be sent compressed as the `payload` file part and the
+    original compressed with `original_encoding`; both are decoded while
+    they are read. The original may be left out when the metadata's
+    content_sha256 is already stored.
+    """
+    try:
+        metadata, content = _document_payload(await _read_ingest_payload(json_payload, payload, payload_encoding))
+        superseded = _superseded_action(metadata)
 
-        # Convert timestamps to datetime objects for storage
-        if 'created_date' in metadata and metadata['created_date']:
-            metadata['created_date'] = datetime.fromtimestamp(metadata['created_date'])
-        if 'modified_date' in metadata and metadata['modified_date']:
-            metadata['modified_date'] = datetime.fromtimestamp(metadata['modified_date'])
+        existing_id = await _store_original(es_client, metadata, original_file, original_encoding)
+        if existing_id:
+            if superseded:
+                ingest_queue.enqueue(superseded)
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content=IngestAccepted(
+                    status="unchanged",
+                    document_id=existing_id,
+                    content_sha256=metadata['content_sha256']
+                ).model_dump()
+            )
 
         # Prepare the document for Elasticsearch
-        document_body = {
-            "metadata": metadata,
-            "content": content,
-            "ingest_date": datetime.utcnow()
-        }
-
-        # Index the document
-        response = await es_client.index(
-            index="documents",
-            id=str(uuid.uuid4()),
-            document=document_body
-        )
+        filename = original_file.filename if original_file else ntpath.basename(metadata.get('filename_full_path', ''))
+        document_body = await _prepare_document(metadata, content, filename)
+        action = _index_action(document_body)
+        await _link_version_families(es_client, [action])
+        # Queued together, so a full queue never takes the old path's delete alone.
+        tracking_id = ingest_queue.enqueue_many([superseded, action] if superseded else [action])[-1]
 
-        return {
-            "status": "success",
-            "document_id": response['_id'],
-            "filename_corpus": metadata.get('filename_corpus')
-        }
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON payload.")
+        return IngestAccepted(
+            status="queued",
+            tracking_id=tracking_id,
+            document_id=action["_id"],
+            filename_corpus=metadata.get('filename_corpus'),
+            content_sha256=metadata['content_sha256']
+        )
+    except (json.JSONDecodeError, UnicodeDecodeError, InvalidPayload) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except IngestQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(settings.INGEST_QUEUE_RETRY_AFTER)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during ingestion: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred during document ingestion: {str(e)}")
 
-@router.post("/search", response_model=DocumentSearchResult)
+@router.get("/ingest/status/{tracking_id}", response_model=IngestStatus)
+async def get_ingest_status(
+    tracking_id: str,
+    api_key: str = Depends(verify_api_key)
+):
+    entry = ingest_queue.get_status(tracking_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No ingest with tracking id '{tracking_id}' is known.")
+    return entry
+
+@router.post("/ingest/status", response_model=IngestStatusList)
+async def get_ingest_statuses(
+    request: IngestStatusRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Looks up many tracking ids at once. Ids that are not listed are unknown:
+    never issued, forgotten after INGEST_STATUS_RETENTION newer ones, or
+    lost with a restart, so their documents may not have been indexed.
+    """
+    entries = (ingest_queue.get_status(tracking_id) for tracking_id in request.tracking_ids)
+    return IngestStatusList(statuses=[entry for entry in entries if entry is not None])
+
+@router.post("/ingest/delete", status_code=status.HTTP_202_ACCEPTED, response_model=IngestAccepted)
+async def delete_ingested_document(
+    request: DocumentDeleteRequest,
+    api_key: str = Depends(admit_api_key)
+):
+    """
+    Removes the document for a source file that was deleted. The delete goes
+    through the ingest queue, so it is ordered with the file's other writes.
+    """
+    document_id = stable_document_id(request.source_hostname, request.filename_full_path)
+    if document_id is None:
+        raise HTTPException(status_code=400, detail="source_hostname and filename_full_path are required.")
+    try:
+        tracking_id = ingest_queue.enqueue({"_op_type": "delete", "_index": WRITE_ALIAS, "_id": document_id})
+    except IngestQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(settings.INGEST_QUEUE_RETRY_AFTER)}
+        )
+    return IngestAccepted(status="queued", tracking_id=tracking_id, document_id=document_id)
+
+@router.post("/ingest/batch", status_code=status.HTTP_202_ACCEPTED, response_model=BatchIngestResult)
+async def ingest_documents_batch(
+    metadata_ndjson: str = Form(...),
+    original_files: List[UploadFile] = File(...),
+    es_client: AsyncElasticsearch = Depends(get_ingest_client),
+    api_key: str = Depends(admit_api_key)
+):
+    """
+    Ingests many documents in one request. `metadata_ndjson` holds one JSON
+    object per line ({"metadata": ..., "content": ...}); line N describes
+    the Nth file in `original_files`. Every document gets its own result so a
+    single bad document does not fail the rest of the batch. Like single
+    ingest, the documents go through the write-behind ingest queue: each
+    queued one gets a tracking id to look up with /ingest/status. When the
+    queue cannot take the whole batch, none of it is queued and the request
+    gets 429.
+    """
+    lines = [line for line in metadata_ndjson.splitlines() if line.strip()]
+    if len(lines) != len(original_files):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected one metadata line per file, got {len(lines)} lines for {len(original_files)} files."
+        )
+    if len(lines) > settings.INGEST_BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {settings.INGEST_BATCH_MAX_DOCUMENTS} documents."
+        )
+
+    results = [None] * len(lines)
+    parsed = []
+    superseded_actions = {}
+    for position, (line, original_file) in enumerate(zip(lines, original_files)):
+        try:
+            metadata, content = _document_payload(json.loads(line))
+        except json.JSONDecodeError:
+            results[position] = BatchIngestItem(index=position, status="error", error="Invalid JSON payload.")
+            continue
+        except InvalidPayload as e:
+            results[position] = BatchIngestItem(index=position, status="error", error=f"Invalid payload: {e}")
+            continue
+        try:
+            superseded = _superseded_action(metadata)
+            existing_id = await _store_original(es_client, metadata, original_file)
+        except Exception as e:
+            results[position] = BatchIngestItem(index=position, status="error", error=str(e))
+            continue
+        if superseded:
+            superseded_actions[position] = superseded
+        if existing_id:
+            results[position] = BatchIngestItem(index=position, status="unchanged", document_id=existing_id)
+            continue
+        parsed.append((position, metadata, content, original_file.filename))
+
+    # Preparing all documents concurrently lets the processing pool group
+    # them into batched pool tasks.
+    prepared = await asyncio.gather(
+        *(_prepare_document(metadata, content, filename) for _, metadata, content, filename in parsed),
+        return_exceptions=True
+    )
+    actions = {}
+    for (position, _, _, _), document_body in zip(parsed, prepared):
+        if isinstance(document_body, Exception):
+            results[position] = BatchIngestItem(index=position, status="error", error=str(document_body))
+            # The move is not carried out when the new document fails.
+            superseded_actions.pop(position, None)
+            continue
+        actions[position] = _index_action(document_body)
+    await _link_version_families(es_client, list(actions.values()))
+
+    # Each document's action goes right after the delete of its old path.
+    queued = [
+        (position, kind, action)
+        for position in sorted(superseded_actions.keys() | actions.keys())
+        for kind, action in (("superseded", superseded_actions.get(position)), ("document", actions.get(position)))
+        if action is not None
+    ]
+    try:
+        tracking_ids = ingest_queue.enqueue_many([action for _, _, action in queued])
+    except IngestQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(settings.INGEST_QUEUE_RETRY_AFTER)}
+        )
+    for (position, kind, action), tracking_id in zip(queued, tracking_ids):
+        if kind == "document":
+            results[position] = BatchIngestItem(
+                index=position,
+                status="queued",
+                tracking_id=tracking_id,
+                document_id=action["_id"],
+                filename_corpus=action["_source"]["metadata"].get('filename_corpus')
+            )
+
+    succeeded = sum(1 for result in results if result.status != "error")
+    return BatchIngestResult(succeeded=succeeded, failed=len(results) - succeeded, items=results)
+
+@router.post("/search", response_model=DocumentSearchPage)
 async def search_documents(
     search_params: DocumentSearchRequest,
-    es_client: AsyncElasticsearch = Depends(get_es_client),
+    es_client: AsyncElasticsearch = Depends(get_search_client),
     current_user: User = Depends(get_current_active_user)
 ):
-    query_body = {"bool": {"must": [], "filter": []}}
-    if search_params.query:
-        query_body["bool"]["must"].append({"multi_match": {"query": search_params.query, "fields": ["content", "metadata.filename_original", "metadata.client_project_name"]}})
-    if search_params.client_project:
-        query_body["bool"]["filter"].append({"term": {"metadata.client_project_name.keyword": search_params.client_project}})
-    if search_params.doc_type:
-        query_body["bool"]["filter"].append({"term": {"metadata.doc_type.keyword": search_params.doc_type}})
-    if search_params.date_from or search_params.date_to:
-        date_range = {}
-        if search_params.date_from:
-            date_range["gte"] = search_params.date_from
-        if search_params.date_to:
-            date_range["lt"] = search_params.date_to
-        query_body["bool"]["filter"].append({"range": {"metadata.modified_date": date_range}})
-    try:
-        response = await es_client.search(index="documents", query=query_body, size=100)
-        hits = [doc for doc in response['hits']['hits']]
-        total = response['hits']['total']['value']
-        return {"total": total, "hits": hits}
+    """
+    Returns one page of matching documents: their metadata (and content only
+    when include_content is set), highlighted fragments of the content that
+    match the query, the best matching passages with their page for long
+    documents, and a next_cursor to request the following page (once
+    documents from before document_id was stored have been given one).
+    With facets set, the first page also carries facet counts over all
+    matching documents. Responses are cached until ingest changes the index (X-Cache tells
+    whether this one was); use_cache=false skips the cache.
+    """
+    try:
+        search_after = decode_cursor(search_params.cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cache_key = search_cache.key("search", search_cache_params(search_params))
+    generation = None
+    if search_params.use_cache:
+        cached, generation = await search_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json", headers={"X-Cache": "HIT"})
+    try:
+        response = await es_client.search(
+            index=READ_ALIAS,
+            query=build_search_query(search_params, passages=True),
+            sort=build_search_sort(search_params),
+            search_after=search_after,
+            size=search_params.page_size,
+            source_includes=["metadata", "content", "passages"] if search_params.include_content else ["metadata"],
+            highlight=build_highlight(search_params),
+            aggs=build_facet_aggs() if search_params.facets and not search_after else None,
+            track_total_hits=settings.SEARCH_TRACK_TOTAL_HITS
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching documents: {e}")
+    hits = response['hits']['hits']
+    page = DocumentSearchPage(
+        total=response['hits']['total']['value'],
+        total_relation=response['hits']['total']['relation'],
+        hits=[
+            SearchHit(
+                id=hit['_id'],
+                score=hit.get('_score'),
+                metadata=hit['_source'].get('metadata', {}),
+                highlights=hit.get('highlight', {}).get('content', []),
+                passages=parse_passages(hit),
+                content=_document_content(hit['_source']) if search_params.include_content else None
+            )
+            for hit in hits
+        ],
+        next_cursor=encode_cursor(hits[-1]['sort']) if len(hits) == search_params.page_size and index_maintenance.document_ids_complete else None,
+        facets=parse_facets(response['aggregations']) if 'aggregations' in response else None
+    )
+    body = page.model_dump_json().encode("utf-8")
+    search_cache.put(cache_key, generation, body)
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS" if search_params.use_cache else "BYPASS"})
+
+@router.get("/facets", response_model=FacetCounts)
+async def get_facets(
+    es_client: AsyncElasticsearch = Depends(get_search_client),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Document counts per client project, doc type, status and language, and
+    per month of modified_date, over the whole index. Served from memory and
+    refreshed in the background after ingest (see FacetCache).
+    """
+    try:
+        return await facet_cache.get(es_client)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing facets: {e}")
+
+@router.get("/changes")
+async def stream_document_changes(
+    client_project: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Server-Sent Events announcing documents as ingest commits them, with the
+    metadata a list of recent files needs, optionally for one client project
+    only. A reconnecting client sends the id of the last event it saw (as
+    Last-Event-ID, or last_event_id) and first gets what it missed; a
+    'reset' event means that is no longer known and it should reload.
+    """
+    return StreamingResponse(
+        stream_changes(change_feed, last_event_id_header or last_event_id, client_project, settings.CHANGE_FEED_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/{document_id}", response_model=DocumentInDB)
 async def get_document_by_id(
     document_id: str,
-    es_client: AsyncElasticsearch = Depends(get_es_client),
+    fields: Optional[str] = None,
+    content_offset: int = Query(0, ge=0),
+    content_length: Optional[int] = Query(None, ge=1),
+    if_none_match: Optional[str] = Header(None),
+    es_client: AsyncElasticsearch = Depends(get_search_client),
     current_user: User = Depends(get_current_active_user)
 ):
+    """
+    Returns a document. `fields` selects what to return (comma-separated, e.g.
+    "metadata" or "metadata,content"; all by default), and `content_offset`
+    and `content_length` return only that stretch of the content, in
+    characters, described by a content_range with the total length.
+    Responses carry a strong ETag; a request whose If-None-Match still
+    matches gets 304 without the document being loaded.
+    """
     try:
-        response = await es_client.get(index="documents", id=document_id)
-        return response
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    variant = (",".join(selected) if selected is not None else "*", content_offset, content_length)
+    not_found = HTTPException(status_code=404, detail=f"Document with id '{document_id}' not found.")
+    headers = {"Cache-Control": "private, no-cache"}
+    if if_none_match:
+        try:
+            probe = await get_document(es_client, document_id, source=False)
+        except Exception:
+            probe = None
+        if probe is None:
+            raise not_found
+        etag = document_etag(probe, *variant)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": etag})
+    try:
+        response = await get_document(es_client, document_id, **source_filter(selected))
+    except Exception:
+        response = None
+    if response is None:
+        raise not_found
+    source = response["_source"]
+    body = {"_id": response["_id"], "_source": source}
+    if selected is None or "content" in selected:
+        content = _document_content(source) or ""
+        source.pop("passages", None)
+        if content_offset or content_length is not None:
+            end = len(content) if content_length is None else content_offset + content_length
+            source["content"] = content[content_offset:end]
+            body["content_range"] = {"offset": content_offset, "length": len(source["content"]), "total": len(content)}
+        else:
+            source["content"] = content
+    headers["ETag"] = document_etag(response, *variant)
+    return Response(content=json.dumps(body).encode("utf-8"), media_type="application/json", headers=headers)
+
+@router.get("/{document_id}/versions", response_model=RelatedVersions)
+async def get_related_versions(
+    document_id: str,
+    es_client: AsyncElasticsearch = Depends(get_search_client),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Other versions of a document (drafts, revisions, executed copies): the
+    rest of its version family, and any document whose estimated
+    similarity reaches SIMILARITY_THRESHOLD, looked up through the LSH
+    buckets rather than by comparing with every document. Newest first.
+    """
+    try:
+        response = await get_document(es_client, document_id, source_includes=["similarity", "version_family"])
+    except Exception:
+        response = None
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"Document with id '{document_id}' not found.")
+    source = response["_source"]
+    try:
+        matches = await find_similar(
+            es_client, document_id, source.get("similarity"),
+            family=source.get("version_family"), size=settings.SIMILARITY_MAX_RELATED
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding related versions: {e}")
+    matches.sort(key=lambda match: match["metadata"].get("modified_date") or "", reverse=True)
+    return RelatedVersions(
+        document_id=document_id,
+        version_family=source.get("version_family"),
+        versions=[RelatedVersion(**match) for match in matches]
+    )
+
+@router.get("/{document_id}/original")
+async def download_original(
+    document_id: str,
+    if_none_match: Optional[str] = Header(None),
+    es_client: AsyncElasticsearch = Depends(get_search_client),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Downloads the original file of a document, with Range requests supported.
+    Originals are content-addressed, so their SHA-256 is the ETag. The file
+    is sent by nginx when DOWNLOAD_ACCEL_REDIRECT_PREFIX is set, and
+    otherwise streamed from disk in chunks.
+    """
+    try:
+        response = await get_document(es_client, document_id, source_includes=["metadata.content_sha256", "metadata.filename_original"])
     except Exception:
+        response = None
+    if response is None:
         raise HTTPException(status_code=404, detail=f"Document with id '{document_id}' not found.")
+    metadata = response["_source"].get("metadata", {})
+    sha256 = metadata.get("content_sha256") or ""
+    if not SHA256_PATTERN.fullmatch(sha256) or not await run_in_threadpool(blob_store.exists, sha256):
+        raise HTTPException(status_code=404, detail="The original file of this document is not stored.")
+    filename = metadata.get("filename_original") or sha256
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400, immutable"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file itself (sendfile, ranges), keeping these headers.
+        location = settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + "/".join((sha256[:2], sha256[2:4], sha256))
+        headers.update({"X-Accel-Redirect": location, "Content-Disposition": content_disposition(filename)})
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(blob_store.path_for(sha256), media_type=media_type, filename=filename, headers=headers)
 
 @router.get("/recent/", response_model=List[DocumentInDB])
 async def get_recent_documents(
     limit: int = 20,
-    es_client: AsyncElasticsearch = Depends(get_es_client),
+    use_cache: bool = True,
+    es_client: AsyncElasticsearch = Depends(get_search_client),
     current_user: User = Depends(get_current_active_user)
 ):
+    cache_key = search_cache.key("recent", {"limit": limit})
+    generation = None
+    if use_cache:
+        cached, generation = await search_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json", headers={"X-Cache": "HIT"})
     try:
         sort_options = [{"metadata.modified_date": {"order": "desc"}}]
-        response = await es_client.search(index="documents", sort=sort_options, size=limit)
-        return [doc for doc in response['hits']['hits']]
+        response = await es_client.search(index=READ_ALIAS, sort=sort_options, size=limit, source_excludes=["passages", "similarity"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching recent documents: {e}")
+    body = json.dumps([{"_id": doc["_id"], "_source": doc["_source"]} for doc in response['hits']['hits']]).encode("utf-8")
+    search_cache.put(cache_key, generation, body)
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS" if use_cache else "BYPASS"})
 
-@router.post("/export/csv")
-async def export_search_to_csv(
+@router.post("/export/{export_format}")
+async def export_search(
+    export_format: str,
     search_params: DocumentSearchRequest,
     es_client: AsyncElasticsearch = Depends(get_es_client),
     current_user: User = Depends(get_current_active_user)
 ):
-    query_body = {"bool": {"must": [], "filter": []}}
-    if search_params.query:
-        query_body["bool"]["must"].append({"multi_match": {"query": search_params.query, "fields": ["content", "metadata.filename_original", "metadata.client_project_name"]}})
-    try:
-        response = await es_client.search(index="documents", query=query_body, size=1000)
-        hits = [doc['_source'] for doc in response['hits']['hits']]
-        output = io.StringIO()
-        writer = csv.writer(output)
-        headers = ['Corpus Filename', 'Original Filename', 'Client/Project', 'Doc Type', 'Status', 'Modified Date', 'Language']
-        writer.writerow(headers)
-        for hit in hits:
-            meta = hit.get('metadata', {})
-            writer.writerow([
-                meta.get('filename_corpus', ''), meta.get('filename_original', ''),
-                meta.get('client_project_name', ''), meta.get('doc_type', ''),
-                meta.get('status', ''), meta.get('modified_date', ''), meta.get('language', '')
-            ])
-        output.seek(0)
-        return StreamingResponse(
-            output, media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=corpus_export_{datetime.now().strftime('%Y%m%d')}.csv"}
-        )
+    """
+    Streams every document matching the search, with the same filters, as
+    CSV or NDJSON. Rows are written as they are read from Elasticsearch, so
+    memory use does not grow with the size of the export.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}.")
+    cursor = ExportCursor(es_client, build_search_query(search_params), settings.EXPORT_PAGE_SIZE, settings.EXPORT_PIT_KEEP_ALIVE)
+    try:
+        await cursor.open()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error exporting to CSV: {e}")
\ No newline at end of file
+        await cursor.close()
+        raise HTTPException(status_code=500, detail=f"Error exporting documents: {e}")
+    return StreamingResponse(
+        stream_export(cursor, export_format), media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=corpus_export_{datetime.now().strftime('%Y%m%d')}.{export_format}"}
+    )
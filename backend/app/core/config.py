@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,12 +9,215 @@ class Settings(BaseSettings):
     
     # Required environment variables
     SECRET_KEY: str
-    ELASTICSEARCH_HOST: str
     
     # Environment variables with default values
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
-    ELASTICSEARCH_PORT: int = 9200
     CORPUS_FILES_DIR: str = "/app/corpus_files"
+    BLOB_CHUNK_SIZE: int = 1024 * 1024
+    # When set, original downloads are handed to nginx with X-Accel-Redirect
+    # to this internal location (mapped to CORPUS_FILES_DIR/originals/), so
+    # nginx sends the file; otherwise the backend streams it.
+    DOWNLOAD_ACCEL_REDIRECT_PREFIX: Optional[str] = None
+
+    # Elasticsearch connection. ELASTICSEARCH_HOSTS lists the cluster's nodes
+    # (comma-separated URLs or host:port) and takes precedence over the single
+    # ELASTICSEARCH_HOST; one of them is required. Sniffing discovers the
+    # other nodes from those, and only works when the addresses the nodes
+    # publish are reachable from the backend.
+    ELASTICSEARCH_HOST: Optional[str] = None
+    ELASTICSEARCH_PORT: int = 9200
+    ELASTICSEARCH_HOSTS: Optional[str] = None
+    ELASTICSEARCH_CONNECTIONS_PER_NODE: int = 10
+    ELASTICSEARCH_HTTP_COMPRESS: bool = True
+    ELASTICSEARCH_SNIFF_ON_START: bool = False
+    ELASTICSEARCH_SNIFF_ON_NODE_FAILURE: bool = False
+    ELASTICSEARCH_SNIFF_INTERVAL: Optional[float] = None
+    # Timeouts (seconds) and retries per workload: searches and document
+    # reads, ingest writes, and everything else (maintenance jobs, exports).
+    ELASTICSEARCH_REQUEST_TIMEOUT: float = 30.0
+    ELASTICSEARCH_MAX_RETRIES: int = 3
+    ELASTICSEARCH_SEARCH_TIMEOUT: float = 10.0
+    ELASTICSEARCH_SEARCH_MAX_RETRIES: int = 2
+    ELASTICSEARCH_INGEST_TIMEOUT: float = 60.0
+    ELASTICSEARCH_INGEST_MAX_RETRIES: int = 3
+    # Circuit breaker: after this many consecutive failed requests (no
+    # connection, timeouts, 502/503/504) requests fail immediately for
+    # BREAKER_RESET_TIMEOUT seconds, after which one request is let through
+    # to test the cluster.
+    ELASTICSEARCH_BREAKER_FAILURE_THRESHOLD: int = 5
+    ELASTICSEARCH_BREAKER_RESET_TIMEOUT: float = 30.0
+    # Startup connects in the background, retrying with a delay that doubles
+    # up to this many seconds; /ready reports when it is done.
+    ELASTICSEARCH_STARTUP_RETRY_MAX_DELAY: float = 30.0
+    # How long /ready waits for the cluster health.
+    READY_CHECK_TIMEOUT: float = 2.0
+
+    # Authentication: resolved users are cached by token for up to
+    # AUTH_TOKEN_CACHE_TTL seconds (0 entries disables the cache), and bcrypt
+    # runs on at most AUTH_HASH_WORKERS threads.
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL: float = 60.0
+    AUTH_HASH_WORKERS: int = 2
+
+    # Agent API keys (comma-separated) and per-key admission control. A key
+    # may send INGEST_KEY_RATE requests per second in bursts of
+    # INGEST_KEY_BURST (0 disables the rate limit) and have at most
+    # INGEST_KEY_MAX_CONCURRENT in flight; INGEST_MAX_CONCURRENT caps all keys
+    # together. Rejected requests get 429 with a Retry-After.
+    AGENT_API_KEY: str = "DEV_API_KEY_12345"
+    INGEST_MAX_CONCURRENT: int = 32
+    INGEST_KEY_MAX_CONCURRENT: int = 8
+    INGEST_KEY_RATE: float = 20.0
+    INGEST_KEY_BURST: int = 40
+    INGEST_ADMISSION_RETRY_AFTER: int = 2
+
+    # Document indices. Concrete indices (<DOCUMENTS_INDEX_PREFIX>-000001, ...)
+    # are created from an index template with these settings; reads go
+    # through DOCUMENTS_READ_ALIAS and ingest through DOCUMENTS_WRITE_ALIAS.
+    # The write index rolls over when it reaches either limit (empty disables
+    # a limit), checked every DOCUMENTS_ROLLOVER_CHECK_INTERVAL seconds. A
+    # running reindex marks its indices with DOCUMENTS_REINDEX_ALIAS. Each
+    # worker rereads the aliases every DOCUMENTS_ALIAS_REFRESH_INTERVAL.
+    DOCUMENTS_INDEX_PREFIX: str = "documents"
+    DOCUMENTS_READ_ALIAS: str = "documents"
+    DOCUMENTS_WRITE_ALIAS: str = "documents-write"
+    DOCUMENTS_REINDEX_ALIAS: str = "documents-reindex"
+    DOCUMENTS_SHARDS: int = 1
+    DOCUMENTS_REPLICAS: int = 1
+    DOCUMENTS_REFRESH_INTERVAL: str = "1s"
+    DOCUMENTS_ROLLOVER_MAX_PRIMARY_SHARD_SIZE: str = "50gb"
+    DOCUMENTS_ROLLOVER_MAX_AGE: str = ""
+    DOCUMENTS_ROLLOVER_CHECK_INTERVAL: float = 3600.0
+    DOCUMENTS_ALIAS_REFRESH_INTERVAL: float = 10.0
+
+    # Reindex-and-swap: documents per scroll batch, and catch-up passes over
+    # documents ingested meanwhile until fewer than the threshold were copied.
+    REINDEX_BATCH_SIZE: int = 1000
+    REINDEX_CATCH_UP_PASSES: int = 5
+    REINDEX_CATCH_UP_THRESHOLD: int = 1000
+
+    # Bulk load mode switches itself off after this many seconds.
+    BULK_LOAD_MAX_DURATION: float = 6 * 3600.0
+
+    # Batch ingestion
+    INGEST_BATCH_MAX_DOCUMENTS: int = 500
+    INGEST_BULK_CHUNK_SIZE: int = 200
+
+    # Compressed uploads: limits on the decoded size of the JSON payload and
+    # of a compressed original, so a small upload cannot inflate without bound.
+    INGEST_PAYLOAD_MAX_BYTES: int = 64 * 1024 * 1024
+    INGEST_ORIGINAL_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    # Write-behind ingest queue
+    INGEST_QUEUE_MAXSIZE: int = 10000
+    INGEST_QUEUE_WORKERS: int = 2
+    INGEST_QUEUE_BATCH_SIZE: int = 500
+    INGEST_QUEUE_FLUSH_INTERVAL: float = 1.0
+    INGEST_QUEUE_MAX_RETRIES: int = 3
+    INGEST_QUEUE_RETRY_BACKOFF: float = 1.0
+    INGEST_QUEUE_RETRY_AFTER: int = 5
+    INGEST_QUEUE_DRAIN_TIMEOUT: float = 30.0
+    INGEST_STATUS_RETENTION: int = 100000
+
+    # Search: how exactly hits are counted (beyond this the total is a lower
+    # bound) and the content fragments returned for each hit.
+    SEARCH_TRACK_TOTAL_HITS: int = 10000
+    SEARCH_HIGHLIGHT_FRAGMENTS: int = 3
+    SEARCH_HIGHLIGHT_FRAGMENT_SIZE: int = 150
+    SEARCH_HIGHLIGHT_MAX_ANALYZED_OFFSET: int = 1000000
+
+    # Facets: buckets per terms facet, the modified_date histogram interval,
+    # and how often the cached unfiltered counts may be recomputed after
+    # ingest has changed the index.
+    FACET_SIZE: int = 20
+    FACET_DATE_INTERVAL: str = "month"
+    FACETS_REFRESH_INTERVAL: float = 30.0
+
+    # Search result cache (0 entries or bytes disables it). Entries expire
+    # after the TTL and whenever ingest writes to the index; the second
+    # invalidation after SEARCH_CACHE_REFRESH_DELAY matches the index refresh
+    # interval. With several workers, SEARCH_CACHE_REDIS_URL shares the
+    # invalidation counter (requires the redis package).
+    SEARCH_CACHE_MAX_ENTRIES: int = 1000
+    SEARCH_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    SEARCH_CACHE_MAX_ENTRY_BYTES: int = 4 * 1024 * 1024
+    SEARCH_CACHE_TTL: float = 300.0
+    SEARCH_CACHE_REFRESH_DELAY: float = 1.0
+    SEARCH_CACHE_REDIS_URL: Optional[str] = None
+
+    # Passages: content of at least PASSAGE_MIN_CONTENT_CHARS is also indexed
+    # as overlapping passages of about PASSAGE_SIZE characters (0 disables
+    # them), so a document is scored by its best matching passages and
+    # search returns up to SEARCH_PASSAGES of them with their page. Content
+    # longer than PASSAGE_CONTENT_MAX_CHARS is stored as passages only.
+    PASSAGE_SIZE: int = 1000
+    PASSAGE_OVERLAP: int = 200
+    PASSAGE_MIN_CONTENT_CHARS: int = 5000
+    PASSAGE_MAX_COUNT: int = 5000
+    PASSAGE_CONTENT_MAX_CHARS: int = 1000000
+    SEARCH_PASSAGES: int = 3
+
+    # Near-duplicate detection: MinHash signatures of word shingles, with
+    # NUM_PERM slots cut into BANDS LSH bands (NUM_PERM must divide by BANDS).
+    # Documents at or above SIMILARITY_THRESHOLD estimated Jaccard similarity
+    # join each other's version family; at most MAX_CANDIDATES bucket
+    # matches are checked per ingested document, and MAX_RELATED returned
+    # by /documents/{id}/versions. At most LOOKUP_CONCURRENCY of those checks
+    # run at once per worker. Documents given a family in the last
+    # RECENT_SECONDS (at most RECENT_MAX of them) are also compared in
+    # memory, as they may not be searchable yet.
+    SIMILARITY_NUM_PERM: int = 128
+    SIMILARITY_BANDS: int = 16
+    SIMILARITY_SHINGLE_SIZE: int = 5
+    SIMILARITY_THRESHOLD: float = 0.8
+    SIMILARITY_MAX_CHARS: int = 500000
+    SIMILARITY_MAX_CANDIDATES: int = 20
+    SIMILARITY_MAX_RELATED: int = 50
+    SIMILARITY_LOOKUP_CONCURRENCY: int = 8
+    SIMILARITY_RECENT_SECONDS: float = 60.0
+    SIMILARITY_RECENT_MAX: int = 20000
+
+    # Change feed (GET /documents/changes): events kept for reconnecting
+    # clients, events a slow client may fall behind before it is reset, and
+    # the heartbeat interval in seconds.
+    CHANGE_FEED_BUFFER: int = 1000
+    CHANGE_FEED_SUBSCRIBER_QUEUE: int = 256
+    CHANGE_FEED_HEARTBEAT: float = 15.0
+
+    # Streaming export: hits fetched per page and how long the point in time
+    # is kept open between pages.
+    EXPORT_PAGE_SIZE: int = 1000
+    EXPORT_PIT_KEEP_ALIVE: str = "2m"
+
+    # Reprocessing the corpus with the current FileProcessor: documents per
+    # page, parallel slices, a throughput cap (0 = none), how long the point
+    # in time is kept open between pages, and how often progress is
+    # checkpointed (defaults to reprocess-checkpoint.json in CORPUS_FILES_DIR).
+    REPROCESS_PAGE_SIZE: int = 100
+    REPROCESS_SLICES: int = 4
+    REPROCESS_MAX_DOCS_PER_SECOND: float = 0.0
+    REPROCESS_PIT_KEEP_ALIVE: str = "5m"
+    REPROCESS_CHECKPOINT_PATH: Optional[str] = None
+    REPROCESS_CHECKPOINT_INTERVAL: float = 10.0
+
+    # FileProcessor process pool (PROCESSING_WORKERS=0 processes inline)
+    PROCESSING_WORKERS: int = 2
+    PROCESSING_INLINE_MAX_CHARS: int = 20000
+    PROCESSING_MAX_TASK_CHARS: int = 5000000
+    PROCESSING_BATCH_WINDOW: float = 0.01
+
+    # Classification rules (defaults to app/services/classification_rules.json)
+    CLASSIFICATION_RULES_PATH: Optional[str] = None
+    CLASSIFICATION_RULES_RELOAD_INTERVAL: float = 5.0
+
+    # Language identification ("ngram" or "langdetect"). An empty candidate
+    # list scores every language langdetect ships a profile for; listing the
+    # few a corpus uses (e.g. "en,id,nl") makes the ngram scorer faster.
+    LANGUAGE_IDENTIFIER: str = "ngram"
+    LANGUAGE_CANDIDATES: str = ""
+    LANGUAGE_SAMPLE_WINDOWS: int = 9
+    LANGUAGE_WINDOW_CHARS: int = 80
+    LANGUAGE_SECONDARY_MIN_SHARE: float = 0.2
 
 # Create a single, global settings instance that will be used by the application
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,119 @@
+import time
+from typing import Type
+
+from elastic_transport import AsyncTransport, ConnectionError as TransportConnectionError, TransportError
+
+# Responses that mean the cluster (not the request) is in trouble.
+DEGRADED_STATUSES = {502, 503, 504}
+
+
+class CircuitOpenError(TransportConnectionError):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    It is a connection error, so callers that handle Elasticsearch being
+    unreachable handle it too.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to Elasticsearch once it is failing, so callers
+    fail in microseconds instead of each waiting out timeouts and retries
+    against a degraded cluster (and adding to its load).
+
+    After `failure_threshold` consecutive failed requests the circuit opens
+    and requests fail immediately. After `reset_timeout` seconds one request
+    is let through as a trial: if it succeeds the circuit closes, otherwise
+    it opens again for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_running = False
+
+    def allows_requests(self) -> bool:
+        """
+        Whether a request would be let through now, without using up the trial.
+        """
+        if self.state == "closed":
+            return True
+        return time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial_running
+
+    def acquire(self) -> bool:
+        if self.state == "closed":
+            return True
+        if not self.allows_requests():
+            return False
+        self.state = "half-open"
+        self._trial_running = True
+        return True
+
+    def release(self):
+        # A request that ended without an outcome (e.g. cancelled).
+        self._trial_running = False
+
+    def record_success(self):
+        if self.state != "closed":
+            print("Elasticsearch circuit breaker closed.")
+        self.state = "closed"
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == "half-open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            if self.state == "closed":
+                print(f"Elasticsearch circuit breaker opened after {self.failures} failed requests.")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a request may be let through again.
+        """
+        if self.state == "closed":
+            return 0
+        return max(1, round(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_after": self.retry_after(),
+        }
+
+
+def breaker_transport(breaker: CircuitBreaker) -> Type[AsyncTransport]:
+    """
+    An AsyncTransport class that passes every request through `breaker`.
+    The transport's own retries (and its failover between nodes) happen
+    within one request, so the breaker only sees the final outcome.
+    """
+
+    class BreakerTransport(AsyncTransport):
+        async def perform_request(self, method, target, **kwargs):
+            if not breaker.acquire():
+                raise CircuitOpenError(f"Elasticsearch is unavailable; retry in {breaker.retry_after()}s (circuit breaker open).")
+            try:
+                response = await super().perform_request(method, target, **kwargs)
+            except TransportError:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            if response.meta.status in DEGRADED_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+    return BreakerTransport
@@ -0,0 +1,278 @@
+import re
+import time
+from typing import List, Optional, Set, Tuple
+
+from elasticsearch import AsyncElasticsearch, NotFoundError
+
+from app.core.config import settings
+
+# Searches and reads go through the read alias, which spans every document
+# index; ingest writes through the write alias, which points at exactly one
+# of them. Concrete indices are named <prefix>-000001, <prefix>-000002, ...
+READ_ALIAS = settings.DOCUMENTS_READ_ALIAS
+WRITE_ALIAS = settings.DOCUMENTS_WRITE_ALIAS
+# Marks the indices a running reindex copies from and into (see ReindexJob),
+# so that every worker, not only the one running it, writes to them too.
+REINDEX_ALIAS = settings.DOCUMENTS_REINDEX_ALIAS
+INDEX_PREFIX = settings.DOCUMENTS_INDEX_PREFIX
+TEMPLATE_NAME = f"{INDEX_PREFIX}-template"
+# Only numbered names match, so a write to the write alias while it is
+# missing cannot auto-create an index from the template.
+INDEX_PATTERN = f"{INDEX_PREFIX}-0*"
+_INDEX_NUMBER = re.compile(rf"^{re.escape(INDEX_PREFIX)}-(\d+)$")
+
+DOCUMENT_MAPPING = {
+    "properties": {
+        "metadata": {
+            "properties": {
+                "filename_original": {"type": "keyword"},
+                "filename_corpus": {"type": "keyword"},
+                "client_project_name": {"type": "keyword"},
+                "created_date": {"type": "date"},
+                "modified_date": {"type": "date"},
+                "source_hostname": {"type": "keyword"},
+                "filename_full_path": {"type": "keyword"},
+                "content_sha256": {"type": "keyword"},
+                "file_size": {"type": "long"},
+                "creator": {"type": "keyword"},
+                "modifier": {"type": "keyword"},
+                "language": {"type": "keyword"},
+                "language_confidence": {"type": "float"},
+                "languages_secondary": {"type": "keyword"},
+                "doc_type": {"type": "keyword"},
+                "status": {"type": "keyword"}
+            }
+        },
+        "document_id": {"type": "keyword"},
+        "content": {"type": "text", "analyzer": "standard"},
+        "passages": {
+            "type": "nested",
+            "properties": {
+                "text": {"type": "text", "analyzer": "standard"},
+                "page": {"type": "integer"},
+                "offset": {"type": "integer"}
+            }
+        },
+        "tags": {"type": "keyword"},
+        "ingest_date": {"type": "date"},
+        "similarity": {
+            "properties": {
+                "scheme": {"type": "keyword"},
+                "minhash": {"type": "binary"},
+                "bands": {"type": "keyword"}
+            }
+        },
+        "version_family": {"type": "keyword"}
+    }
+}
+
+
+def index_settings() -> dict:
+    """
+    The settings every document index is created with, and that bulk load
+    mode restores.
+    """
+    return {
+        "number_of_shards": settings.DOCUMENTS_SHARDS,
+        "number_of_replicas": settings.DOCUMENTS_REPLICAS,
+        "refresh_interval": settings.DOCUMENTS_REFRESH_INTERVAL,
+    }
+
+
+def index_name(number: int) -> str:
+    return f"{INDEX_PREFIX}-{number:06d}"
+
+
+async def next_index_name(client: AsyncElasticsearch) -> str:
+    """
+    The name after the highest numbered document index that exists.
+    """
+    try:
+        existing = await client.indices.get(index=INDEX_PATTERN, expand_wildcards="all")
+    except NotFoundError:
+        existing = {}
+    numbers = [int(match.group(1)) for match in map(_INDEX_NUMBER.match, existing) if match]
+    return index_name(max(numbers, default=0) + 1)
+
+
+class IndexRegistry:
+    """
+    Which concrete indices hold documents, as last read from the aliases.
+
+    Documents are addressed by stable ids and updated in place, but after a
+    rollover (or during a reindex) the current copy of a document may sit in
+    an older index than the write index. So every write is expanded: the
+    action itself goes to the write index, and the same id is deleted from
+    every other index. Deletes that follow an index action carry its
+    external version, so they only remove older copies; a newer copy
+    elsewhere shows up as a conflict and the write is undone.
+
+    `reindexing` holds the indices carrying the reindex alias: those a
+    running reindex copies into (and, once it has moved the write alias,
+    from), which must also receive those deletes though they are not (or no
+    longer) behind the read alias.
+    """
+
+    def __init__(self):
+        self.read_indices: Set[str] = set()
+        self.write_index: Optional[str] = None
+        self.legacy = False
+        self.reindexing: Set[str] = set()
+        self.refreshed_at = 0.0
+
+    async def refresh(self, client: AsyncElasticsearch):
+        try:
+            aliases = await client.indices.get_alias(name=f"{READ_ALIAS},{WRITE_ALIAS},{REINDEX_ALIAS}")
+        except NotFoundError:
+            aliases = {}
+        read_indices, reindexing, write_indices, write_index = set(), set(), [], None
+        for index, entry in aliases.items():
+            names = entry.get("aliases", {})
+            if READ_ALIAS in names:
+                read_indices.add(index)
+            if REINDEX_ALIAS in names:
+                reindexing.add(index)
+            if WRITE_ALIAS in names:
+                write_indices.append(index)
+                # After a rollover the old index keeps the alias with
+                # is_write_index false; only the flagged one takes writes.
+                if names[WRITE_ALIAS].get("is_write_index"):
+                    write_index = index
+        if write_index is None and len(write_indices) == 1:
+            write_index = write_indices[0]
+        # A pre-alias installation has a concrete index named like the read alias.
+        self.legacy = READ_ALIAS in aliases or (not read_indices and await client.indices.exists(index=READ_ALIAS))
+        if self.legacy:
+            read_indices.add(READ_ALIAS)
+        self.read_indices = read_indices
+        self.reindexing = reindexing
+        self.write_index = write_index
+        self.refreshed_at = time.time()
+
+    def indices(self) -> Set[str]:
+        return self.read_indices | self.reindexing | ({self.write_index} if self.write_index else set())
+
+    def expand(self, action: dict) -> List[Tuple[dict, bool]]:
+        """
+        Returns the bulk actions that carry out `action` across all document
+        indices, each paired with whether it is the action itself.
+        """
+        primary = dict(action, _index=self.write_index or WRITE_ALIAS)
+        expanded = [(primary, True)]
+        for index in sorted(self.indices() - {primary["_index"]}):
+            delete = {"_op_type": "delete", "_index": index, "_id": action["_id"]}
+            if action.get("_op_type", "index") == "index" and "_version" in action:
+                delete["_version"] = action["_version"]
+                delete["_version_type"] = "external_gte"
+            expanded.append((delete, False))
+        return expanded
+
+    def compensating_delete(self, primary: dict) -> dict:
+        """
+        Undoes an index action that turned out to be older than a copy in
+        another index; a newer write to the same index is left alone.
+        """
+        delete = {"_op_type": "delete", "_index": primary["_index"], "_id": primary["_id"]}
+        if "_version" in primary:
+            delete["_version"] = primary["_version"]
+            delete["_version_type"] = "external_gte"
+        return delete
+
+
+document_indices = IndexRegistry()
+
+
+async def get_document(client: AsyncElasticsearch, document_id: str, **kwargs) -> Optional[dict]:
+    """
+    Fetches a document by id through the read alias, or None. A get needs a
+    single index, so when the alias spans several the id is searched for.
+    Either way the hit carries its _seq_no and _primary_term.
+    """
+    if len(document_indices.read_indices) <= 1:
+        try:
+            return await client.get(index=READ_ALIAS, id=document_id, **kwargs)
+        except NotFoundError:
+            return None
+    response = await client.search(index=READ_ALIAS, query={"ids": {"values": [document_id]}}, size=1,
+                                 seq_no_primary_term=True, **kwargs)
+    hits = response["hits"]["hits"]
+    return hits[0] if hits else None
+
+
+async def setup_indices(client: AsyncElasticsearch):
+    """
+    Installs the index template and makes sure the aliases exist: a new
+    installation gets its first index behind both aliases, and an existing
+    'documents' index from before aliases gets the write alias so ingest
+    works until it is moved over with a reindex.
+    """
+    await client.indices.put_index_template(
+        name=TEMPLATE_NAME,
+        index_patterns=[INDEX_PATTERN],
+        template={"settings": index_settings(), "mappings": DOCUMENT_MAPPING},
+        priority=100,
+    )
+    await document_indices.refresh(client)
+    if document_indices.write_index is None:
+        if document_indices.legacy:
+            print(f"Index '{READ_ALIAS}' predates aliases; adding '{WRITE_ALIAS}' to it. Run a reindex to move it to managed indices.")
+            await client.indices.update_aliases(actions=[
+                {"add": {"index": READ_ALIAS, "alias": WRITE_ALIAS, "is_write_index": True}}
+            ])
+        else:
+            first = await next_index_name(client)
+            print(f"Creating document index '{first}'...")
+            await client.indices.create(index=first, aliases={
+                READ_ALIAS: {},
+                WRITE_ALIAS: {"is_write_index": True},
+            })
+        await document_indices.refresh(client)
+    await update_mapping(client)
+    # A bulk load interrupted by a restart would leave refresh disabled.
+    write_index = document_indices.write_index
+    current = await client.indices.get_settings(index=write_index, name="index.refresh_interval,index.number_of_replicas")
+    index = current.get(write_index, {}).get("settings", {}).get("index", {})
+    if index.get("refresh_interval") == "-1":
+        print(f"Index '{write_index}' was left in bulk load mode; restoring its settings.")
+        await restore_index_settings(client, write_index)
+    print(f"Document indices: {sorted(document_indices.read_indices)}, writing to '{write_index}'.")
+
+
+def _mapping_fields(properties: dict, prefix: str = "") -> List[Tuple[str, dict]]:
+    """
+    The mapping's fields as (dotted name, properties to put) pairs, with
+    the fields of objects such as metadata listed one by one.
+    """
+    fields = []
+    for name, spec in properties.items():
+        if "properties" in spec and "type" not in spec:
+            for path, nested in _mapping_fields(spec["properties"], f"{prefix}{name}."):
+                fields.append((path, {name: {"properties": nested}}))
+        else:
+            fields.append((f"{prefix}{name}", {name: spec}))
+    return fields
+
+
+async def update_mapping(client: AsyncElasticsearch):
+    """
+    Adds fields the mapping has gained since the indices were created, one
+    field at a time: a field an older index already mapped differently
+    (e.g. dynamically) cannot be changed in place and takes a reindex, but
+    must not keep the other fields from being added.
+    """
+    conflicts = []
+    for path, properties in _mapping_fields(DOCUMENT_MAPPING["properties"]):
+        try:
+            await client.indices.put_mapping(index=READ_ALIAS, properties=properties)
+        except Exception as e:
+            conflicts.append(f"{path} ({e})")
+    if conflicts:
+        print(f"Some fields of the document indices do not match the current mapping; run a reindex to apply it: {'; '.join(conflicts)}")
+
+
+async def restore_index_settings(client: AsyncElasticsearch, index: str):
+    configured = index_settings()
+    await client.indices.put_settings(index=index, settings={"index": {
+        "refresh_interval": configured["refresh_interval"],
+        "number_of_replicas": configured["number_of_replicas"],
+    }})
@@ -1,92 +1,175 @@
 import asyncio
-from elasticsearch import AsyncElasticsearch, ConnectionError as ESConnectionError
+import time
+from typing import Callable, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+from fastapi import HTTPException, status
 from app.core.config import settings
+from app.db.circuit_breaker import CircuitBreaker, breaker_transport
+from app.db.indices import setup_indices
+
+
+def elasticsearch_hosts() -> List[str]:
+    """
+    The node URLs from ELASTICSEARCH_HOSTS, or else from ELASTICSEARCH_HOST
+    and ELASTICSEARCH_PORT. Entries without a scheme are taken as http, and
+    entries without a port get ELASTICSEARCH_PORT.
+    """
+    entries = settings.ELASTICSEARCH_HOSTS.split(",") if settings.ELASTICSEARCH_HOSTS else [settings.ELASTICSEARCH_HOST or ""]
+    hosts = []
+    for entry in (entry.strip().rstrip("/") for entry in entries):
+        if not entry:
+            continue
+        if "://" not in entry:
+            entry = f"http://{entry}"
+        if ":" not in entry.split("://", 1)[1]:
+            entry = f"{entry}:{settings.ELASTICSEARCH_PORT}"
+        hosts.append(entry)
+    if not hosts:
+        raise ValueError("Set ELASTICSEARCH_HOSTS or ELASTICSEARCH_HOST.")
+    return hosts
 
-# --- Corrected Elasticsearch Client Initialization ---
-# The client is configured to use the host and port from the settings file,
-# which are loaded from your .env file. This makes the connection
-# configurable and correctly points to the 'elasticsearch' service name.
+
+es_breaker = CircuitBreaker(
+    failure_threshold=settings.ELASTICSEARCH_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.ELASTICSEARCH_BREAKER_RESET_TIMEOUT,
+)
+
+# One connection pool for the whole cluster, shared by the per-workload
+# clients below, which only differ in their timeouts and retries.
 es_client = AsyncElasticsearch(
-    hosts=[
-        {
-            "host": settings.ELASTICSEARCH_HOST,
-            "port": settings.ELASTICSEARCH_PORT,
-            "scheme": "http"
-        }
-    ],
-    request_timeout=30
+    hosts=elasticsearch_hosts(),
+    transport_class=breaker_transport(es_breaker),
+    connections_per_node=settings.ELASTICSEARCH_CONNECTIONS_PER_NODE,
+    http_compress=settings.ELASTICSEARCH_HTTP_COMPRESS,
+    sniff_on_start=settings.ELASTICSEARCH_SNIFF_ON_START,
+    sniff_on_node_failure=settings.ELASTICSEARCH_SNIFF_ON_NODE_FAILURE,
+    sniff_before_requests=settings.ELASTICSEARCH_SNIFF_INTERVAL is not None,
+    min_delay_between_sniffing=settings.ELASTICSEARCH_SNIFF_INTERVAL or 10.0,
+    request_timeout=settings.ELASTICSEARCH_REQUEST_TIMEOUT,
+    max_retries=settings.ELASTICSEARCH_MAX_RETRIES,
+    retry_on_timeout=True,
+)
+
+# Searches are cheap to repeat and a user is waiting: short timeout, retried
+# on another node.
+search_client = es_client.options(
+    request_timeout=settings.ELASTICSEARCH_SEARCH_TIMEOUT,
+    max_retries=settings.ELASTICSEARCH_SEARCH_MAX_RETRIES,
+    retry_on_timeout=True,
 )
 
+# Bulk writes may take long on a busy cluster. One that timed out may still
+# be running, so it is not sent again on top of it; the ingest queue retries
+# rejected documents itself.
+ingest_client = es_client.options(
+    request_timeout=settings.ELASTICSEARCH_INGEST_TIMEOUT,
+    max_retries=settings.ELASTICSEARCH_INGEST_MAX_RETRIES,
+    retry_on_timeout=False,
+)
+
+
+def _require_elasticsearch():
+    if not elasticsearch_startup.is_ready():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Elasticsearch is not connected yet.",
+            headers={"Retry-After": "5"}
+        )
+    if not es_breaker.allows_requests():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Elasticsearch is unavailable.",
+            headers={"Retry-After": str(es_breaker.retry_after())}
+        )
+
+
 async def get_es_client():
     """
-    Returns the shared asynchronous Elasticsearch client instance.
+    Returns the shared asynchronous Elasticsearch client instance, or
+    answers 503 while Elasticsearch is not set up or is failing.
     """
+    _require_elasticsearch()
     return es_client
 
+
+async def get_search_client():
+    """
+    Like get_es_client, with the timeouts and retries for searches and reads.
+    """
+    _require_elasticsearch()
+    return search_client
+
+
+async def get_ingest_client():
+    """
+    Like get_es_client, with the timeouts and retries for bulk writes.
+    """
+    _require_elasticsearch()
+    return ingest_client
+
+
 async def close_es_client():
     """
     Closes the shared asynchronous Elasticsearch client instance.
     """
     await es_client.close()
 
+
 async def create_indices():
     """
-    Connects to Elasticsearch with retries and creates the 'documents' index
-    if it does not already exist.
+    Checks that Elasticsearch answers, then installs the document index
+    template and aliases (see app.db.indices).
+    """
+    await es_client.info()
+    await setup_indices(es_client)
+
+
+class ElasticsearchStartup:
+    """
+    Connects to Elasticsearch and sets up the document indices in the
+    background, so the API starts at once instead of blocking until the
+    cluster is up. Until it is done, endpoints that need Elasticsearch
+    answer 503 and /ready says so.
+
+    Attempts are retried for as long as it takes, with a delay that doubles
+    up to ELASTICSEARCH_STARTUP_RETRY_MAX_DELAY.
     """
-    max_retries = 15
-    retry_delay = 5  # seconds
-
-    for attempt in range(max_retries):
-        try:
-            # The ping() method confirms that a connection can be established.
-            if await es_client.ping():
-                print("✅ Successfully connected to Elasticsearch.")
+
+    def __init__(self):
+        self.status = {"state": "pending", "attempts": 0}
+        self.ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_ready(self) -> bool:
+        return self.ready.is_set()
+
+    def start(self, on_ready: Optional[Callable[[], None]] = None):
+        self._task = asyncio.create_task(self.run(on_ready))
+
+    async def stop(self):
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self, on_ready: Optional[Callable[[], None]] = None):
+        delay = 1.0
+        while True:
+            self.status["attempts"] += 1
+            try:
+                await create_indices()
                 break
-            else:
-                # This case is unlikely but handled for completeness.
-                print(f"Ping to Elasticsearch failed. Retrying... (Attempt {attempt + 1}/{max_retries})")
-                await asyncio.sleep(retry_delay)
-        except ESConnectionError:
-            # This is the expected exception if the service is not ready.
-            print(f"Waiting for Elasticsearch... (Attempt {attempt + 1}/{max_retries}).")
-            if attempt + 1 == max_retries:
-                print("❌ Could not connect to Elasticsearch after several attempts. Exiting.")
-                # Re-raising the exception will cause the application to fail startup,
-                # which is the correct behavior if the database is unavailable.
-                raise
-            await asyncio.sleep(retry_delay)
-    
-    # Define the structure (mapping) for the 'documents' index.
-    document_mapping = {
-        "properties": {
-            "metadata": {
-                "properties": {
-                    "filename_original": {"type": "keyword"},
-                    "filename_corpus": {"type": "keyword"},
-                    "client_project_name": {"type": "keyword"},
-                    "created_date": {"type": "date"},
-                    "modified_date": {"type": "date"},
-                    "source_hostname": {"type": "keyword"},
-                    "creator": {"type": "keyword"},
-                    "modifier": {"type": "keyword"},
-                    "language": {"type": "keyword"},
-                    "doc_type": {"type": "keyword"},
-                    "status": {"type": "keyword"}
-                }
-            },
-            "content": {"type": "text", "analyzer": "standard"},
-            "tags": {"type": "keyword"}
-        }
-    }
-
-    # Check if the index already exists before trying to create it.
-    if not await es_client.indices.exists(index="documents"):
-        print("Creating 'documents' index...")
-        await es_client.indices.create(
-            index="documents",
-            mappings=document_mapping
-        )
-        print("Index 'documents' created successfully.")
-    else:
-        print("Index 'documents' already exists.")
\ No newline at end of file
+            except Exception as e:
+                self.status.update(state="waiting", error=str(e))
+                print(f"Waiting for Elasticsearch (attempt {self.status['attempts']}, retrying in {delay:g}s): {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.ELASTICSEARCH_STARTUP_RETRY_MAX_DELAY)
+        self.status = {"state": "ready", "attempts": self.status["attempts"], "ready_at": time.time()}
+        self.ready.set()
+        print("✅ Connected to Elasticsearch.")
+        if on_ready is not None:
+            on_ready()
+
+
+elasticsearch_startup = ElasticsearchStartup()
@@ -1,6 +1,12 @@
 from fastapi import FastAPI
-from app.api.v1.endpoints import documents, auth
-from app.db.session import create_indices, close_es_client
+from fastapi.responses import JSONResponse
+from app.api.v1.endpoints import documents, auth, admin
+from app.db.session import close_es_client, es_breaker, es_client, elasticsearch_startup
+from app.services.ingest_queue import ingest_queue
+from app.services.index_maintenance import index_maintenance
+from app.services.processing_pool import processing_pool
+from app.services.language import language_identifier
+from app.core.config import settings
 
 app = FastAPI(
     title="Corpus API",
@@ -10,15 +16,51 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def startup_event():
-    await create_indices()
+    # Elasticsearch is connected in the background; the ingest queue holds
+    # documents until it is ready.
+    elasticsearch_startup.start(on_ready=lambda: index_maintenance.start(es_client))
+    language_identifier.load()
+    processing_pool.start()
+    await ingest_queue.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    # Flush everything still queued before the client goes away.
+    await ingest_queue.stop(timeout=settings.INGEST_QUEUE_DRAIN_TIMEOUT)
+    await index_maintenance.stop()
+    await elasticsearch_startup.stop()
+    processing_pool.stop()
     await close_es_client()
 
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["Documents"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
 
 @app.get("/health", tags=["System"])
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    """
+    Liveness: the process is up. See /ready for whether it can serve requests.
+    """
+    return {"status": "ok"}
+
+@app.get("/ready", tags=["System"])
+async def readiness_check():
+    """
+    Readiness: Elasticsearch is connected, the document indices are set up,
+    the circuit breaker is closed and the cluster is not red. Answers 503
+    otherwise, so a load balancer can hold traffic back from this instance.
+    """
+    elasticsearch = {"startup": elasticsearch_startup.status, "breaker": es_breaker.stats()}
+    ready = elasticsearch_startup.is_ready() and es_breaker.allows_requests()
+    if ready:
+        try:
+            health = await es_client.options(request_timeout=settings.READY_CHECK_TIMEOUT, max_retries=0).cluster.health()
+            elasticsearch["cluster_status"] = health["status"]
+            ready = health["status"] != "red"
+        except Exception as e:
+            elasticsearch["error"] = str(e)
+            ready = False
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "elasticsearch": elasticsearch}
+    )
\ No newline at end of file
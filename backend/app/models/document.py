@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class DocumentMetadata(BaseModel):
@@ -9,9 +9,14 @@ class DocumentMetadata(BaseModel):
     created_date: datetime
     modified_date: datetime
     source_hostname: str
+    filename_full_path: Optional[str] = None
+    content_sha256: Optional[str] = None
+    file_size: Optional[int] = None
     creator: Optional[str] = None
     modifier: Optional[str] = None
     language: Optional[str] = None
+    language_confidence: Optional[float] = None
+    languages_secondary: List[str] = []
     doc_type: Optional[str] = Field(None, description="e.g., AGMT, LTR, MEMO")
     status: Optional[str] = Field(None, description="e.g., DRAFT, EXECUTED, FILED")
 
@@ -23,9 +28,96 @@ class DocumentSearchRequest(BaseModel):
     query: Optional[str] = None
     client_project: Optional[str] = None
     doc_type: Optional[str] = None
+    status: Optional[str] = None
+    language: Optional[str] = None
     date_from: Optional[datetime] = None
     date_to: Optional[datetime] = None
+    page_size: int = Field(25, ge=1, le=100)
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+    include_content: bool = Field(False, description="Return the full content of every hit")
+    use_cache: bool = Field(True, description="Set to false to bypass the search result cache")
+    facets: bool = Field(False, description="Return facet counts for the matching documents (first page only)")
     
 class DocumentSearchResult(BaseModel):
     total: int
-    hits: List[DocumentInDB]
\ No newline at end of file
+    hits: List[DocumentInDB]
+
+class PassageHit(BaseModel):
+    page: Optional[int] = Field(None, description="1-based page the passage starts on")
+    offset: Optional[int] = Field(None, description="Character offset of the passage in the content")
+    score: Optional[float] = None
+    highlights: List[str] = Field([], description="HTML-escaped fragment of the passage, matches wrapped in <mark>")
+
+class SearchHit(BaseModel):
+    id: str
+    score: Optional[float] = None
+    metadata: dict
+    highlights: List[str] = Field([], description="HTML-escaped fragments of content, matches wrapped in <mark>")
+    passages: List[PassageHit] = Field([], description="Best matching passages, for documents indexed as passages")
+    content: Optional[str] = None
+
+class RelatedVersion(BaseModel):
+    id: str
+    similarity: Optional[float] = Field(None, description="Estimated Jaccard similarity of the content, 0 to 1")
+    same_family: bool = Field(False, description="Whether it is in the same version family")
+    version_family: Optional[str] = None
+    metadata: dict
+
+class RelatedVersions(BaseModel):
+    document_id: str
+    version_family: Optional[str] = None
+    versions: List[RelatedVersion]
+
+class FacetBucket(BaseModel):
+    value: str
+    count: int
+
+class DocumentSearchPage(BaseModel):
+    total: int
+    total_relation: str = Field("eq", description="eq, or gte when total is a lower bound")
+    hits: List[SearchHit]
+    next_cursor: Optional[str] = None
+    facets: Optional[Dict[str, List[FacetBucket]]] = None
+
+class FacetCounts(BaseModel):
+    total: int
+    facets: Dict[str, List[FacetBucket]]
+    computed_at: float
+    stale: bool = Field(False, description="The index has changed since the counts were computed; a refresh is under way")
+
+class IngestAccepted(BaseModel):
+    status: str = Field(..., description="queued, or unchanged when the file is already indexed")
+    tracking_id: Optional[str] = None
+    document_id: str
+    filename_corpus: Optional[str] = None
+    content_sha256: Optional[str] = None
+
+class DocumentDeleteRequest(BaseModel):
+    source_hostname: str
+    filename_full_path: str
+
+class IngestStatus(BaseModel):
+    tracking_id: str
+    status: str = Field(..., description="queued, indexed, deleted, stale or failed")
+    document_id: Optional[str] = None
+    error: Optional[str] = None
+    updated_at: float
+
+class IngestStatusRequest(BaseModel):
+    tracking_ids: List[str] = Field(..., max_length=1000)
+
+class IngestStatusList(BaseModel):
+    statuses: List[IngestStatus] = Field(..., description="The known ones among the requested tracking ids")
+
+class BatchIngestItem(BaseModel):
+    index: int
+    status: str = Field(..., description="queued, unchanged or error")
+    tracking_id: Optional[str] = None
+    document_id: Optional[str] = None
+    filename_corpus: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchIngestResult(BaseModel):
+    succeeded: int
+    failed: int
+    items: List[BatchIngestItem]
\ No newline at end of file
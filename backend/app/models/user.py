@@ -7,5 +7,17 @@ class User(BaseModel):
     role: str
     disabled: Optional[bool] = None
 
+class UserCreate(BaseModel):
+    username: EmailStr
+    full_name: Optional[str] = None
+    password: str
+    role: str = "user"
+
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    password: Optional[str] = None
+    role: Optional[str] = None
+    disabled: Optional[bool] = None
+
 class UserInDB(User):
     hashed_password: str
\ No newline at end of file
@@ -0,0 +1,96 @@
+import math
+import time
+from typing import Dict
+
+from app.core.config import settings
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when an API key may not start another request right now.
+    `retry_after` is the number of seconds the client should wait.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KeyState:
+    def __init__(self, burst: float):
+        self.in_flight = 0
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Per-API-key admission control for agent requests, so one busy agent
+    cannot take all of the server's capacity.
+
+    Each key has a token bucket (`key_rate` requests per second, bursts of up
+    to `key_burst`; a rate of 0 disables it) and may have at most
+    `key_max_concurrent` requests in flight. Across all keys at most
+    `max_concurrent` requests are in flight, except that a key holding less
+    than its fair share (max_concurrent divided by the keys with requests in
+    flight) is still admitted, so a quiet agent gets through while a noisy
+    one is being turned away.
+
+    Keys are only tracked once verify_api_key has accepted them, so there is
+    one entry per configured key. Everything runs on the event loop, so no
+    locking is needed.
+    """
+
+    def __init__(self, max_concurrent: int, key_max_concurrent: int, key_rate: float, key_burst: int, retry_after: int):
+        self.max_concurrent = max_concurrent
+        self.key_max_concurrent = key_max_concurrent
+        self.key_rate = key_rate
+        self.key_burst = max(1, key_burst)
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._keys: Dict[str, KeyState] = {}
+
+    def admit(self, key: str):
+        """
+        Takes a slot for one request, or raises AdmissionRejected.
+        """
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = KeyState(self.key_burst)
+        if self.key_rate > 0:
+            now = time.monotonic()
+            state.tokens = min(self.key_burst, state.tokens + (now - state.refilled_at) * self.key_rate)
+            state.refilled_at = now
+            if state.tokens < 1:
+                raise AdmissionRejected(
+                    f"Request rate limit of {self.key_rate:g}/s for this API key exceeded.",
+                    max(1, math.ceil((1 - state.tokens) / self.key_rate))
+                )
+        if state.in_flight >= self.key_max_concurrent:
+            raise AdmissionRejected(
+                f"This API key already has {state.in_flight} requests in progress.", self.retry_after
+            )
+        if self.in_flight >= self.max_concurrent:
+            active_keys = sum(1 for other in self._keys.values() if other.in_flight) + (0 if state.in_flight else 1)
+            if state.in_flight >= max(1, self.max_concurrent // active_keys):
+                raise AdmissionRejected("The server is busy.", self.retry_after)
+        if self.key_rate > 0:
+            state.tokens -= 1
+        state.in_flight += 1
+        self.in_flight += 1
+
+    def release(self, key: str):
+        state = self._keys.get(key)
+        if state is None or not state.in_flight:
+            return
+        state.in_flight -= 1
+        self.in_flight -= 1
+
+
+admission = AdmissionController(
+    max_concurrent=settings.INGEST_MAX_CONCURRENT,
+    key_max_concurrent=settings.INGEST_KEY_MAX_CONCURRENT,
+    key_rate=settings.INGEST_KEY_RATE,
+    key_burst=settings.INGEST_KEY_BURST,
+    retry_after=settings.INGEST_ADMISSION_RETRY_AFTER,
+)
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class ChecksumMismatch(ValueError):
+    """
+    Raised when an upload's bytes do not hash to the SHA-256 its sender
+    declared for it.
+    """
+
+
+class StoredBlob:
+    def __init__(self, sha256: str, size: int, existed: bool):
+        self.sha256 = sha256
+        self.size = size
+        self.existed = existed
+
+
+class BlobStore:
+    """
+    A content-addressed store for original files under CORPUS_FILES_DIR.
+
+    Each blob is stored once, at originals/<aa>/<bb>/<sha256>, no matter how
+    many documents reference it. Uploads are streamed to a temporary file in
+    chunks while their SHA-256 is computed, then atomically moved into place,
+    so a whole file is never held in memory and readers never see a partial
+    blob.
+    """
+
+    def __init__(self, root: str, chunk_size: int):
+        self.root = os.path.join(root, "originals")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.chunk_size = chunk_size
+
+    def path_for(self, sha256: str) -> str:
+        if not SHA256_PATTERN.fullmatch(sha256):
+            raise ValueError(f"Not a SHA-256 hex digest: {sha256!r}")
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.isfile(self.path_for(sha256))
+
+    def size(self, sha256: str) -> int:
+        return os.path.getsize(self.path_for(sha256))
+
+    async def save_upload(self, upload: UploadFile, expected_sha256: Optional[str] = None) -> StoredBlob:
+        """
+        Stores an uploaded file and returns its hash. When the caller declares
+        the hash, the upload must match it (ChecksumMismatch otherwise); if
+        that blob is already stored, the upload is only hashed, not written.
+        """
+        if expected_sha256 and SHA256_PATTERN.fullmatch(expected_sha256) and await run_in_threadpool(self.exists, expected_sha256):
+            hasher = hashlib.sha256()
+            size = 0
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+            self._check(hasher.hexdigest(), expected_sha256)
+            return StoredBlob(expected_sha256, size, True)
+
+        await run_in_threadpool(os.makedirs, self.tmp_dir, exist_ok=True)
+        tmp = await run_in_threadpool(tempfile.NamedTemporaryFile, dir=self.tmp_dir, delete=False)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = await upload.read(self.chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+                await run_in_threadpool(tmp.write, chunk)
+            await run_in_threadpool(tmp.close)
+            sha256 = hasher.hexdigest()
+            self._check(sha256, expected_sha256)
+            existed = await run_in_threadpool(self._commit, tmp.name, sha256)
+        except BaseException:
+            await run_in_threadpool(self._discard, tmp)
+            raise
+        return StoredBlob(sha256, size, existed)
+
+    def _check(self, sha256: str, expected_sha256: Optional[str]):
+        if expected_sha256 and sha256 != expected_sha256:
+            raise ChecksumMismatch(f"The original file's SHA-256 is {sha256}, not the declared {expected_sha256}.")
+
+    def _commit(self, tmp_path: str, sha256: str) -> bool:
+        path = self.path_for(sha256)
+        if os.path.isfile(path):
+            os.remove(tmp_path)
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return False
+
+    def _discard(self, tmp):
+        tmp.close()
+        try:
+            os.remove(tmp.name)
+        except FileNotFoundError:
+            pass
+
+
+blob_store = BlobStore(root=settings.CORPUS_FILES_DIR, chunk_size=settings.BLOB_CHUNK_SIZE)
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import List, Optional, Set
+
+from app.core.config import settings
+
+# The metadata pushed with each change: enough for a list of recent files.
+FEED_METADATA_FIELDS = [
+    "filename_original",
+    "filename_corpus",
+    "client_project_name",
+    "doc_type",
+    "status",
+    "modified_date",
+    "language",
+]
+
+
+class Subscription:
+    def __init__(self, client_project: Optional[str], maxsize: int):
+        self.client_project = client_project
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def matches(self, event: dict) -> bool:
+        # Deletes carry no metadata, so every subscriber gets them.
+        if self.client_project is None or event["type"] == "deleted":
+            return True
+        return event.get("metadata", {}).get("client_project_name") == self.client_project
+
+
+class ChangeFeed:
+    """
+    Announces documents as ingest commits them, to dashboards listening on
+    GET /documents/changes, instead of each of them polling /recent/.
+
+    The last `capacity` events are kept in a ring buffer so a client that
+    reconnects with the id of the last event it saw catches up without a
+    query to Elasticsearch. Ids are "<epoch>-<sequence>", the epoch being
+    fixed per process, so after a restart (or when the client fell further
+    behind than the buffer reaches) the client is told to reset and reload
+    instead of silently missing events. A subscriber too slow to keep up is
+    reset the same way rather than buffering without bound.
+
+    The feed is per worker process; with several workers a client only sees
+    the documents committed by the one it is connected to.
+    """
+
+    def __init__(self, capacity: int, subscriber_queue: int):
+        self.capacity = capacity
+        self.subscriber_queue = subscriber_queue
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._events: deque = deque(maxlen=capacity)
+        self._subscribers: Set[Subscription] = set()
+
+    def publish(self, event_type: str, document_id: str, metadata: Optional[dict] = None):
+        self._sequence += 1
+        event = {"id": f"{self.epoch}-{self._sequence}", "seq": self._sequence, "type": event_type,
+                 "document_id": document_id, "at": time.time()}
+        if metadata is not None:
+            event["metadata"] = {field: metadata.get(field) for field in FEED_METADATA_FIELDS}
+        self._events.append(event)
+        for subscription in self._subscribers:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._overflow(subscription)
+
+    def subscribe(self, client_project: Optional[str] = None) -> Subscription:
+        subscription = Subscription(client_project, self.subscriber_queue)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def since(self, last_event_id: Optional[str]) -> Optional[List[dict]]:
+        """
+        The buffered events after `last_event_id`, or None when the events
+        in between are no longer known. A new client (no id) starts from now.
+        """
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) > self._sequence:
+            return None
+        sequence = int(sequence)
+        oldest = self._events[0]["seq"] if self._events else self._sequence + 1
+        if sequence + 1 < oldest:
+            return None
+        return [event for event in self._events if event["seq"] > sequence]
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "buffered": len(self._events), "last_id": f"{self.epoch}-{self._sequence}"}
+
+    def _overflow(self, subscription: Subscription):
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+def format_event(event: dict) -> bytes:
+    data = {key: value for key, value in event.items() if key != "seq"}
+    return f"id: {event['id']}\nevent: document\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+def format_reset() -> bytes:
+    return b"event: reset\ndata: {}\n\n"
+
+
+async def stream_changes(feed: ChangeFeed, last_event_id: Optional[str], client_project: Optional[str], heartbeat: float):
+    """
+    Server-Sent Events for one client: buffered events after its last seen
+    id, then live ones, with a comment line as heartbeat so proxies keep the
+    connection open.
+    """
+    subscription = feed.subscribe(client_project)
+    try:
+        backlog = feed.since(last_event_id)
+        sent = 0
+        if backlog is None:
+            yield format_reset()
+            backlog = []
+        for event in backlog:
+            if subscription.matches(event):
+                yield format_event(event)
+            sent = event["seq"]
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event is None:
+                yield format_reset()
+                return
+            # Events published while the backlog was read arrive twice.
+            if event["seq"] <= sent:
+                continue
+            sent = event["seq"]
+            yield format_event(event)
+    finally:
+        feed.unsubscribe(subscription)
+
+
+change_feed = ChangeFeed(capacity=settings.CHANGE_FEED_BUFFER, subscriber_queue=settings.CHANGE_FEED_SUBSCRIBER_QUEUE)
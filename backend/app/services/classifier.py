@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import ahocorasick
+
+from app.core.config import settings
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "classification_rules.json")
+
+
+class ClassificationRule:
+    def __init__(self, field: str, value: str, keywords: List[str], priority: int = 0, word_boundary: bool = False):
+        self.field = field
+        self.value = value
+        self.keywords = keywords
+        self.priority = priority
+        self.word_boundary = word_boundary
+
+
+class RulesEngine:
+    """
+    Classifies a document against a set of keyword rules.
+
+    Rules are ranked by priority (ties keep their order in the rules file)
+    and, for each field, the best-ranked matching rule wins; when no rule
+    matches, the field's default value is used.
+
+    All keywords are compiled into one Aho-Corasick automaton and matched in
+    a single pass over the content, lowercased chunk by chunk as it is
+    scanned, so the cost does not grow with the number of keywords (see
+    benchmarks/bench_classifier.py); the scan stops as soon as every field
+    has matched its best rule.
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, rules: List[ClassificationRule], defaults: Dict[str, str]):
+        self.rules = sorted(rules, key=lambda rule: rule.priority, reverse=True)
+        self.defaults = defaults
+        self.fields = sorted({rule.field for rule in self.rules} | set(defaults))
+        self._rank = {id(rule): rank for rank, rule in enumerate(self.rules)}
+        self._best_rank = {}
+        for rank, rule in enumerate(self.rules):
+            self._best_rank.setdefault(rule.field, rank)
+
+        keyword_rules: Dict[str, List[ClassificationRule]] = {}
+        for rule in self.rules:
+            for keyword in rule.keywords:
+                keyword_rules.setdefault(" ".join(keyword.lower().split()), []).append(rule)
+        self._max_keyword_length = max((len(keyword) for keyword in keyword_rules), default=0)
+        # An automaton without words cannot be searched.
+        self._automaton = None
+        if keyword_rules:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, rules_for_keyword in keyword_rules.items():
+                self._automaton.add_word(keyword, (len(keyword), tuple(rules_for_keyword)))
+            self._automaton.make_automaton()
+
+    @classmethod
+    def from_file(cls, path: str) -> "RulesEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        rules = [
+            ClassificationRule(
+                field=rule["field"],
+                value=rule["value"],
+                keywords=rule["keywords"],
+                priority=rule.get("priority", 0),
+                word_boundary=rule.get("word_boundary", False),
+            )
+            for rule in config.get("rules", [])
+        ]
+        return cls(rules, config.get("defaults", {}))
+
+    def classify(self, content: str) -> Dict[str, str]:
+        best = self._scan_with_automaton(content) if self._automaton is not None else {}
+        return {field: best[field].value if field in best else self.defaults.get(field) for field in self.fields}
+
+    def _scan_with_automaton(self, content: str) -> Dict[str, ClassificationRule]:
+        best: Dict[str, ClassificationRule] = {}
+        remaining = set(self._best_rank)
+        for chunk, own_start, own_end in self._chunks(content):
+            for end, (length, rules) in self._automaton.iter(chunk):
+                begin = end - length + 1
+                if not own_start <= begin < own_end:
+                    # Starts in the lookbehind or lookahead; a neighbouring
+                    # chunk owns this match.
+                    continue
+                for rule in rules:
+                    if rule.word_boundary and not _at_word_boundary(chunk, begin, end):
+                        continue
+                    current = best.get(rule.field)
+                    rank = self._rank[id(rule)]
+                    if current is None or rank < self._rank[id(current)]:
+                        best[rule.field] = rule
+                        if rank == self._best_rank[rule.field]:
+                            remaining.discard(rule.field)
+                if not remaining:
+                    return best
+        return best
+
+    def _chunks(self, content: str):
+        """
+        Yields lowercased chunks of the content together with the bounds of
+        each chunk's own region. Every chunk carries one character of
+        lookbehind and enough lookahead for the longest keyword (plus one
+        character) so matches and word boundaries across chunk edges are seen.
+        """
+        for start in range(0, max(len(content), 1), self.CHUNK_SIZE):
+            lookbehind = 1 if start else 0
+            chunk = content[start - lookbehind:start + self.CHUNK_SIZE + self._max_keyword_length + 1].lower()
+            yield chunk, lookbehind, lookbehind + self.CHUNK_SIZE
+
+
+def _at_word_boundary(text: str, begin: int, end: int) -> bool:
+    before = text[begin - 1] if begin > 0 else ""
+    after = text[end + 1] if end + 1 < len(text) else ""
+    return not _is_word_char(before) and not _is_word_char(after)
+
+
+def _is_word_char(char: str) -> bool:
+    return bool(char) and (char.isalnum() or char == "_")
+
+
+class ReloadingRulesEngine:
+    """
+    Wraps a RulesEngine loaded from a file and recompiles it when the file
+    changes, so rules can be edited without restarting the API or its
+    processing workers. The file's mtime is checked at most once per
+    reload interval.
+    """
+
+    def __init__(self, path: str, reload_interval: float):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._engine: Optional[RulesEngine] = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> RulesEngine:
+        now = time.monotonic()
+        if self._engine is None or now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                self._checked_at = now
+                try:
+                    mtime = os.stat(self.path).st_mtime
+                    if self._engine is None or mtime != self._mtime:
+                        self._engine = RulesEngine.from_file(self.path)
+                        self._mtime = mtime
+                except (OSError, ValueError, KeyError) as e:
+                    # Keep serving the last good rules if an edit is broken.
+                    if self._engine is None:
+                        raise
+                    print(f"Could not reload classification rules from {self.path}: {e}")
+        return self._engine
+
+    def classify(self, content: str) -> Dict[str, str]:
+        return self.get().classify(content)
+
+
+rules_engine = ReloadingRulesEngine(
+    path=settings.CLASSIFICATION_RULES_PATH or DEFAULT_RULES_PATH,
+    reload_interval=settings.CLASSIFICATION_RULES_RELOAD_INTERVAL,
+)
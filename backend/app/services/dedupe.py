@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, Optional, Set
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan, async_streaming_bulk
+
+from app.core.config import settings
+from app.db.indices import READ_ALIAS
+from app.db.session import es_client
+from app.services.document_identity import stable_document_id, document_version
+from app.services.search_cache import search_cache
+
+IDENTITY_FIELDS = [
+    "metadata.source_hostname",
+    "metadata.filename_full_path",
+    "metadata.modified_date",
+    "ingest_date",
+]
+
+# Winners are copied to their stable id in batches fetched with mget.
+COPY_BATCH_SIZE = 200
+
+
+class DedupeJob:
+    """
+    Collapses documents indexed under random ids into one document per source
+    file, stored under its stable id.
+
+    The first pass reads only identity fields and picks, for every stable id,
+    the latest version of the file (by modified_date, then ingest_date). Each
+    winner not already stored under its stable id is copied there. The second
+    pass deletes every document whose id is not its stable id; all of them are
+    either duplicates or the originals of documents just copied. Only source
+    files whose stable-id document is known to exist lose their copies: when
+    a winner's copy fails, its original and duplicates are kept (and counted
+    as "kept") for the next run. Documents without a source identity are left
+    alone.
+    """
+
+    def __init__(self):
+        self.status = {"state": "idle"}
+        self._task: Optional[asyncio.Task] = None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, client: AsyncElasticsearch, dry_run: bool = False):
+        """
+        Runs the job in the background. Raises RuntimeError if it is already running.
+        """
+        if self.is_running():
+            raise RuntimeError("A dedupe job is already running.")
+        self._task = asyncio.create_task(self.run(client, dry_run=dry_run))
+
+    async def run(self, client: AsyncElasticsearch, dry_run: bool = False) -> dict:
+        self.status = {
+            "state": "running",
+            "dry_run": dry_run,
+            "scanned": 0,
+            "source_files": 0,
+            "copied": 0,
+            "deleted": 0,
+            "kept": 0,
+            "errors": 0,
+            "started_at": time.time(),
+        }
+        try:
+            winners = await self._find_winners(client)
+            self.status["source_files"] = len(winners)
+            stored = await self._copy_winners(client, winners, dry_run)
+            await self._delete_duplicates(client, stored, dry_run)
+            self.status["state"] = "finished"
+        except Exception as e:
+            print(f"Dedupe job failed: {e}")
+            self.status["state"] = "failed"
+            self.status["error"] = str(e)
+        if not dry_run:
+            await search_cache.invalidate()
+        self.status["finished_at"] = time.time()
+        print(f"Dedupe job {self.status['state']}: {self.status}")
+        return self.status
+
+    async def _find_winners(self, client: AsyncElasticsearch) -> Dict[str, tuple]:
+        winners: Dict[str, tuple] = {}
+        async for hit in async_scan(client, index=READ_ALIAS, query={"query": {"match_all": {}}}, _source=IDENTITY_FIELDS):
+            self.status["scanned"] += 1
+            source = hit.get("_source", {})
+            metadata = source.get("metadata", {})
+            document_id = stable_document_id(metadata.get("source_hostname"), metadata.get("filename_full_path"))
+            if document_id is None:
+                continue
+            # ISO timestamps compare correctly as strings.
+            rank = (metadata.get("modified_date") or "", source.get("ingest_date") or "")
+            if document_id not in winners or rank > winners[document_id][0]:
+                winners[document_id] = (rank, hit["_id"], hit["_index"])
+        return winners
+
+    async def _copy_winners(self, client: AsyncElasticsearch, winners: Dict[str, tuple], dry_run: bool) -> Set[str]:
+        """
+        Copies the winners to their stable ids and returns the stable ids now
+        known to hold a document.
+        """
+        stored = {document_id for document_id, (_, hit_id, _) in winners.items() if hit_id == document_id}
+        copies = [(document_id, hit_id, index) for document_id, (_, hit_id, index) in winners.items() if hit_id != document_id]
+        if dry_run:
+            self.status["copied"] = len(copies)
+            return stored | {document_id for document_id, _, _ in copies}
+        for start in range(0, len(copies), COPY_BATCH_SIZE):
+            batch = dict(((index, hit_id), document_id) for document_id, hit_id, index in copies[start:start + COPY_BATCH_SIZE])
+            response = await client.mget(docs=[{"_index": index, "_id": hit_id} for index, hit_id in batch])
+            actions = []
+            for doc in response["docs"]:
+                if not doc.get("found"):
+                    continue
+                # The copy stays in the index of the document it is copied from.
+                document_id = batch[(doc["_index"], doc["_id"])]
+                source = doc["_source"]
+                source["document_id"] = document_id
+                action = {"_op_type": "index", "_index": doc["_index"], "_id": document_id, "_source": source}
+                version = document_version(source.get("metadata", {}).get("modified_date"))
+                if version is not None:
+                    action["_version"] = version
+                    action["_version_type"] = "external_gte"
+                actions.append(action)
+            async for ok, item in async_streaming_bulk(client, actions, raise_on_error=False, raise_on_exception=False):
+                info = item.get("index", {})
+                if ok:
+                    self.status["copied"] += 1
+                    stored.add(info["_id"])
+                elif info.get("status") == 409:
+                    # A newer version was ingested under the stable id while the job ran.
+                    stored.add(info["_id"])
+                else:
+                    self.status["errors"] += 1
+                    print(f"Dedupe could not copy {info.get('_id')}: {info.get('error') or info.get('exception')}")
+        return stored
+
+    async def _delete_duplicates(self, client: AsyncElasticsearch, stored: Set[str], dry_run: bool):
+        async def deletions():
+            async for hit in async_scan(client, index=READ_ALIAS, query={"query": {"match_all": {}}}, _source=IDENTITY_FIELDS[:2]):
+                metadata = hit.get("_source", {}).get("metadata", {})
+                document_id = stable_document_id(metadata.get("source_hostname"), metadata.get("filename_full_path"))
+                if document_id is None or hit["_id"] == document_id:
+                    continue
+                if document_id in stored:
+                    yield {"_op_type": "delete", "_index": hit["_index"], "_id": hit["_id"]}
+                else:
+                    self.status["kept"] += 1
+
+        if dry_run:
+            async for _ in deletions():
+                self.status["deleted"] += 1
+            return
+        async for ok, _ in async_streaming_bulk(
+            client, deletions(), chunk_size=settings.INGEST_BULK_CHUNK_SIZE, raise_on_error=False, raise_on_exception=False
+        ):
+            self.status["deleted" if ok else "errors"] += 1
+
+
+dedupe_job = DedupeJob()
+
+
+async def _main(dry_run: bool):
+    try:
+        await dedupe_job.run(es_client, dry_run=dry_run)
+    finally:
+        await es_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collapse duplicate documents onto their stable ids.")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would change without writing.")
+    args = parser.parse_args()
+    asyncio.run(_main(args.dry_run))
@@ -0,0 +1,65 @@
+import hashlib
+from typing import List, Optional
+from urllib.parse import quote
+
+# Top-level fields of a stored document a client may ask for; the passages
+# (only used to rebuild the content) and similarity signature are internal.
+DOCUMENT_FIELDS = ["document_id", "metadata", "content", "tags", "ingest_date", "version_family"]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parses a comma-separated field selection such as "metadata,content" or
+    "metadata.filename_original". None means all fields. Raises ValueError
+    for fields documents do not have.
+    """
+    if fields is None:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field.split(".", 1)[0] not in DOCUMENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(DOCUMENT_FIELDS)}.")
+    return selected
+
+
+def source_filter(fields: Optional[List[str]]) -> dict:
+    """
+    The _source filter (as get/search arguments) that fetches only the
+    selected fields; the content may have to be rebuilt from passages.
+    """
+    if fields is None:
+        return {"source_excludes": ["similarity"]}
+    includes = list(fields)
+    if "content" in fields:
+        includes.append("passages")
+    return {"source_includes": includes}
+
+
+def document_etag(hit: dict, *variant) -> str:
+    """
+    A strong ETag for a document fetched with the given parameters. Every
+    write to a document gives it a new sequence number (and a reindex a new
+    index), so the tag changes exactly when the response can.
+    """
+    key = ":".join(str(part) for part in (hit["_index"], hit["_primary_term"], hit["_seq_no"], *variant))
+    return f'"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches the ETag (weak comparison, as
+    RFC 9110 prescribes for If-None-Match).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename*=utf-8''{quoted}"
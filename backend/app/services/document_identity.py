@@ -0,0 +1,31 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+# Fixed namespace for uuid5 document ids. Changing it changes every id.
+DOCUMENT_ID_NAMESPACE = uuid.UUID("5b1d3c7e-8a43-4f0e-9a55-2f6c1d0e9b21")
+
+
+def stable_document_id(source_hostname: Optional[str], filename_full_path: Optional[str]) -> Optional[str]:
+    """
+    Derives the document id from the identity of the source file, so every
+    ingest of the same file on the same host addresses the same document.
+    Returns None when the source identity is incomplete.
+    """
+    if not source_hostname or not filename_full_path:
+        return None
+    return str(uuid.uuid5(DOCUMENT_ID_NAMESPACE, f"{source_hostname}\n{filename_full_path}"))
+
+
+def document_version(modified_date) -> Optional[int]:
+    """
+    Returns the external version for a document: its modification time in
+    milliseconds. Accepts an epoch timestamp or a datetime.
+    """
+    if not modified_date:
+        return None
+    if isinstance(modified_date, datetime):
+        modified_date = modified_date.timestamp()
+    elif isinstance(modified_date, str):
+        modified_date = datetime.fromisoformat(modified_date).timestamp()
+    return int(float(modified_date) * 1000)
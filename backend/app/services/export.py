@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from app.db.indices import READ_ALIAS
+
+# Exported columns: (CSV header, field under metadata).
+EXPORT_COLUMNS = [
+    ("Corpus Filename", "filename_corpus"),
+    ("Original Filename", "filename_original"),
+    ("Client/Project", "client_project_name"),
+    ("Doc Type", "doc_type"),
+    ("Status", "status"),
+    ("Modified Date", "modified_date"),
+    ("Language", "language"),
+]
+EXPORT_SOURCE_FIELDS = [f"metadata.{field}" for _, field in EXPORT_COLUMNS]
+
+# Export formats and their media types.
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class ExportCursor:
+    """
+    Pages through every hit of a query over a point in time with
+    search_after, so an export sees one consistent snapshot of the index and
+    is not capped at any number of hits. Only the exported fields are
+    fetched and only one page is held in memory at a time.
+    """
+
+    def __init__(self, es_client: AsyncElasticsearch, query: dict, page_size: int, keep_alive: str):
+        self.es_client = es_client
+        self.query = query
+        self.page_size = page_size
+        self.keep_alive = keep_alive
+        self.pit_id: Optional[str] = None
+        self._first_page: List[dict] = []
+
+    async def open(self):
+        """
+        Opens the point in time and fetches the first page, so that an
+        unreachable cluster or a bad query fails before the response starts.
+        """
+        response = await self.es_client.open_point_in_time(index=READ_ALIAS, keep_alive=self.keep_alive)
+        self.pit_id = response["id"]
+        self._first_page = await self._fetch()
+
+    async def pages(self) -> AsyncIterator[List[dict]]:
+        page, self._first_page = self._first_page, []
+        while page:
+            yield page
+            if len(page) < self.page_size:
+                return
+            page = await self._fetch(search_after=page[-1]["sort"])
+
+    async def close(self):
+        if self.pit_id is None:
+            return
+        pit_id, self.pit_id = self.pit_id, None
+        try:
+            await self.es_client.close_point_in_time(id=pit_id)
+        except Exception as e:
+            # It expires after keep_alive anyway.
+            print(f"Could not close export point in time: {e}")
+
+    async def _fetch(self, search_after: Optional[list] = None) -> List[dict]:
+        response = await self.es_client.search(
+            query=self.query,
+            pit={"id": self.pit_id, "keep_alive": self.keep_alive},
+            # _shard_doc is the cheapest total order; without _score in the
+            # sort, matches are not scored either.
+            sort=[{"_shard_doc": "asc"}],
+            search_after=search_after,
+            size=self.page_size,
+            source_includes=EXPORT_SOURCE_FIELDS,
+            track_total_hits=False,
+        )
+        self.pit_id = response.get("pit_id", self.pit_id)
+        return response["hits"]["hits"]
+
+
+async def stream_export(cursor: ExportCursor, export_format: str) -> AsyncIterator[bytes]:
+    """
+    Renders the cursor's hits as CSV or NDJSON, one chunk per page, and
+    closes the cursor when done or when the client goes away.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        if export_format == "csv":
+            writer.writerow([header for header, _ in EXPORT_COLUMNS])
+            yield buffer.getvalue().encode("utf-8")
+        async for page in cursor.pages():
+            buffer.seek(0)
+            buffer.truncate()
+            for hit in page:
+                meta = hit["_source"].get("metadata", {})
+                if export_format == "csv":
+                    writer.writerow([meta.get(field, "") for _, field in EXPORT_COLUMNS])
+                else:
+                    record = {"id": hit["_id"]}
+                    record.update((field, meta.get(field)) for _, field in EXPORT_COLUMNS)
+                    buffer.write(json.dumps(record, ensure_ascii=False) + "\n")
+            yield buffer.getvalue().encode("utf-8")
+    except Exception as e:
+        # Headers are already sent, so all that can be done is cut the
+        # response short; the client sees an incomplete download.
+        print(f"Export failed part way: {e}")
+        raise
+    finally:
+        await cursor.close()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from app.core.config import settings
+from app.db.indices import READ_ALIAS
+from app.services.search_cache import search_cache
+from app.services.search_query import build_facet_aggs, parse_facets
+
+
+class FacetCache:
+    """
+    The facet counts over the whole index, which every page load of the
+    search UI shows.
+
+    The counts are computed once and then served from memory. When ingest
+    has changed the index (the search cache generation moved on), the
+    current counts are still returned, marked stale, and a refresh runs in
+    the background, at most once per `refresh_interval`. So page loads never
+    wait for the aggregation, and a busy ingest does not turn into an
+    aggregation per flush.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._counts: Optional[dict] = None
+        self._generation: Optional[int] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, es_client: AsyncElasticsearch) -> dict:
+        try:
+            generation = await search_cache.generation.get()
+        except Exception:
+            generation = None
+        if self._counts is None:
+            async with self._lock:
+                if self._counts is None:
+                    await self._compute(es_client, generation)
+            return {**self._counts, "stale": False}
+        stale = generation is None or generation != self._generation
+        if stale and (self._refresh is None or self._refresh.done()):
+            if time.time() - self._counts["computed_at"] >= self.refresh_interval:
+                self._refresh = asyncio.create_task(self._refresh_counts(es_client, generation))
+        return {**self._counts, "stale": stale}
+
+    async def _refresh_counts(self, es_client: AsyncElasticsearch, generation: Optional[int]):
+        try:
+            await self._compute(es_client, generation)
+        except Exception as e:
+            print(f"Could not refresh facet counts: {e}")
+
+    async def _compute(self, es_client: AsyncElasticsearch, generation: Optional[int]):
+        # The generation is read before the aggregation runs, so a change
+        # made meanwhile leaves the result marked stale.
+        response = await es_client.search(
+            index=READ_ALIAS,
+            size=0,
+            aggs=build_facet_aggs(),
+            track_total_hits=True
+        )
+        self._counts = {
+            "total": response["hits"]["total"]["value"],
+            "facets": parse_facets(response.get("aggregations", {})),
+            "computed_at": time.time(),
+        }
+        self._generation = generation
+
+
+facet_cache = FacetCache(refresh_interval=settings.FACETS_REFRESH_INTERVAL)
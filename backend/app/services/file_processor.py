@@ -1,7 +1,9 @@
 import os
 import re
 from datetime import datetime
-from langdetect import detect
+from app.services.classifier import rules_engine
+from app.services.language import language_identifier
+from app.services.similarity import compute_similarity
 
 class FileProcessor:
     def __init__(self, metadata, content, original_filename):
@@ -14,29 +16,20 @@ class FileProcessor:
         self._detect_language()
         self._classify_document()
         self._generate_new_filename()
+        self._compute_similarity()
         return self.processed_data
 
     def _detect_language(self):
         try:
-            lang = detect(self.content[:500])
-            self.processed_data['language'] = lang
+            result = language_identifier.identify(self.content)
+            self.processed_data['language'] = result.language
+            self.processed_data['language_confidence'] = result.confidence
+            self.processed_data['languages_secondary'] = result.secondary
         except Exception:
             self.processed_data['language'] = 'unknown'
 
     def _classify_document(self):
-        content_lower = self.content.lower()
-        if "agreement" in content_lower or "contract" in content_lower:
-            self.processed_data['doc_type'] = "AGMT"
-        elif "letter" in content_lower:
-            self.processed_data['doc_type'] = "LTR"
-        else:
-            self.processed_data['doc_type'] = "MISC"
-        if "draft" in content_lower or "for review" in content_lower:
-            self.processed_data['status'] = "DRAFT"
-        elif "executed" in content_lower or "signed" in content_lower:
-            self.processed_data['status'] = "EXECUTED"
-        else:
-            self.processed_data['status'] = "PROCESSED"
+        self.processed_data.update(rules_engine.classify(self.content))
 
     def _generate_new_filename(self):
         date_str = datetime.fromtimestamp(self.metadata['modified_date']).strftime('%Y-%m-%d')
@@ -47,4 +40,8 @@ class FileProcessor:
         desc = re.sub(r'[^a-zA-Z0-9\s]', '', desc).strip()
         desc = re.sub(r'\s+', '_', desc)
         new_filename = f"{date_str}_{doc_type}_{desc}_{status}{ext}"
-        self.processed_data['filename_corpus'] = new_filename
\ No newline at end of file
+        self.processed_data['filename_corpus'] = new_filename
+
+    def _compute_similarity(self):
+        # Stored beside the metadata, not in it (see _prepare_document).
+        self.processed_data['similarity'] = compute_similarity(self.content)
\ No newline at end of file
@@ -0,0 +1,396 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from elasticsearch import AsyncElasticsearch, NotFoundError
+
+from app.core.config import settings
+from app.db.indices import (
+    READ_ALIAS, REINDEX_ALIAS, WRITE_ALIAS, document_indices, next_index_name, restore_index_settings,
+)
+from app.services.search_cache import search_cache
+
+# How often a running reindex task is polled for progress.
+REINDEX_POLL_INTERVAL = 2.0
+# Catch-up passes start this far before the previous pass did, so clock
+# skew between the backend and Elasticsearch cannot lose a document.
+CATCH_UP_MARGIN = 60.0
+
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+# Documents given a document_id per update_by_query of the backfill.
+DOCUMENT_ID_BACKFILL_BATCH = 1000
+WITHOUT_DOCUMENT_ID = {"bool": {"must_not": {"exists": {"field": "document_id"}}}}
+
+
+def rollover_conditions() -> dict:
+    conditions = {}
+    if settings.DOCUMENTS_ROLLOVER_MAX_PRIMARY_SHARD_SIZE:
+        conditions["max_primary_shard_size"] = settings.DOCUMENTS_ROLLOVER_MAX_PRIMARY_SHARD_SIZE
+    if settings.DOCUMENTS_ROLLOVER_MAX_AGE:
+        conditions["max_age"] = settings.DOCUMENTS_ROLLOVER_MAX_AGE
+    return conditions
+
+
+async def rollover(client: AsyncElasticsearch, force: bool = False) -> dict:
+    """
+    Rolls the write alias over to a new index, created from the template,
+    when the write index has reached one of the configured limits (or
+    always, with force). The new index joins the read alias in the same
+    step, so searches never miss it.
+    """
+    conditions = rollover_conditions()
+    if not force and not conditions:
+        return {"rolled_over": False, "reason": "No rollover conditions are configured."}
+    await document_indices.refresh(client)
+    if document_indices.legacy:
+        return {"rolled_over": False, "reason": f"Index '{READ_ALIAS}' predates aliases; run a reindex first."}
+    if document_indices.reindexing:
+        return {"rolled_over": False, "reason": "A reindex is running."}
+    response = await client.indices.rollover(
+        alias=WRITE_ALIAS,
+        new_index=await next_index_name(client),
+        conditions=None if force else conditions,
+        aliases={READ_ALIAS: {}},
+    )
+    if response.get("rolled_over"):
+        print(f"Rolled '{WRITE_ALIAS}' over from '{response['old_index']}' to '{response['new_index']}'.")
+        await document_indices.refresh(client)
+    return {
+        "rolled_over": response.get("rolled_over", False),
+        "old_index": response.get("old_index"),
+        "new_index": response.get("new_index"),
+        "conditions": response.get("conditions", {}),
+    }
+
+
+async def backfill_document_ids(client: AsyncElasticsearch) -> int:
+    """
+    Gives documents indexed before document_id was stored one equal to their
+    _id, as ingest does for new documents, so search_after paging can break
+    ties on it (sorting on _id itself is disabled in Elasticsearch 8). Works
+    a batch at a time so no request runs long, and returns how many
+    documents are still without one: those that conflicted with a
+    concurrent write are left for the next call.
+    """
+    while True:
+        remaining = (await client.count(index=READ_ALIAS, query=WITHOUT_DOCUMENT_ID))["count"]
+        if remaining == 0:
+            return 0
+        response = await client.update_by_query(
+            index=READ_ALIAS,
+            query=WITHOUT_DOCUMENT_ID,
+            script={"source": "ctx._source.document_id = ctx._id", "lang": "painless"},
+            max_docs=DOCUMENT_ID_BACKFILL_BATCH,
+            conflicts="proceed",
+            refresh=True,
+        )
+        if not response.get("updated"):
+            return remaining
+        print(f"Gave {response['updated']} documents a document_id; {max(0, remaining - response['updated'])} to go.")
+
+
+class BulkLoadMode:
+    """
+    Speeds up large backfills by switching off refresh and replicas on the
+    write index. Newly written documents are not searchable until it is
+    switched off again, which restores the configured settings, refreshes
+    the index and invalidates the search cache. It switches itself off after
+    BULK_LOAD_MAX_DURATION, and startup repairs an index it left behind.
+    """
+
+    def __init__(self, max_duration: float):
+        self.max_duration = max_duration
+        self.index: Optional[str] = None
+        self.enabled_at: Optional[float] = None
+        self._timer: Optional[asyncio.Task] = None
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.index is not None,
+            "index": self.index,
+            "enabled_at": self.enabled_at,
+            "expires_at": self.enabled_at + self.max_duration if self.enabled_at else None,
+        }
+
+    async def enable(self, client: AsyncElasticsearch) -> dict:
+        if self.index is not None:
+            return self.status()
+        await document_indices.refresh(client)
+        index = document_indices.write_index
+        if index is None:
+            raise RuntimeError("There is no write index.")
+        await client.indices.put_settings(index=index, settings={"index": BULK_LOAD_SETTINGS})
+        self.index, self.enabled_at = index, time.time()
+        self._timer = asyncio.create_task(self._expire(client))
+        print(f"Bulk load mode enabled on '{index}'.")
+        return self.status()
+
+    async def disable(self, client: AsyncElasticsearch) -> dict:
+        if self.index is None:
+            return self.status()
+        index = self.index
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        await restore_index_settings(client, index)
+        await client.indices.refresh(index=index)
+        self.index, self.enabled_at, self._timer = None, None, None
+        await search_cache.invalidate()
+        print(f"Bulk load mode disabled on '{index}'.")
+        return self.status()
+
+    async def _expire(self, client: AsyncElasticsearch):
+        await asyncio.sleep(self.max_duration)
+        print("Bulk load mode reached its maximum duration.")
+        try:
+            await self.disable(client)
+        except Exception as e:
+            print(f"Could not switch off bulk load mode: {e}")
+
+
+class ReindexJob:
+    """
+    Copies every document into a new index, created from the current
+    template, and swaps the aliases over to it without downtime. This is how
+    a mapping or shard count change is rolled out, and how an index from
+    before aliases is moved to managed indices.
+
+    The new index is written in bulk load mode. While the copy runs, ingest
+    keeps writing to the old write index and its writes are mirrored as
+    version-aware deletes into the new one (see IndexRegistry), so a copied
+    document that is since replaced or deleted does not come back (a file
+    deleted before its document was copied can, until it is deleted again).
+    Documents ingested meanwhile are picked up by catch-up passes on
+    ingest_date.
+    Then the write alias moves, one last pass copies what reached the old
+    index before it did, and the read alias moves. The old indices are kept
+    unless delete_old is set; an index from before aliases is always
+    removed, as its name becomes the read alias.
+
+    The indices that must receive the mirrored deletes carry the reindex
+    alias, so every worker finds them when it rereads the aliases; after
+    each alias change the job waits DOCUMENTS_ALIAS_REFRESH_INTERVAL for all
+    of them to have done so. Only one reindex can run at a time: the alias
+    also tells other workers one is running. A job that crashed leaves it
+    behind and has to be cleaned up by removing the alias.
+    """
+
+    def __init__(self):
+        self.status = {"state": "idle"}
+        self._task: Optional[asyncio.Task] = None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, client: AsyncElasticsearch, delete_old: bool = False):
+        """
+        Runs the job in the background. Raises RuntimeError if it is already running.
+        """
+        if self.is_running():
+            raise RuntimeError("A reindex job is already running.")
+        self._task = asyncio.create_task(self.run(client, delete_old=delete_old))
+
+    async def run(self, client: AsyncElasticsearch, delete_old: bool = False) -> dict:
+        self.status = {
+            "state": "running",
+            "step": "starting",
+            "source_indices": [],
+            "target_index": None,
+            "passes": 0,
+            "copied": 0,
+            "conflicts": 0,
+            "started_at": time.time(),
+        }
+        target, created = None, False
+        try:
+            await document_indices.refresh(client)
+            if document_indices.reindexing:
+                raise RuntimeError(
+                    f"Another reindex is running (on {', '.join(sorted(document_indices.reindexing))}). "
+                    f"If it crashed, remove the '{REINDEX_ALIAS}' alias first."
+                )
+            sources = sorted(document_indices.read_indices)
+            legacy = document_indices.legacy
+            target = await next_index_name(client)
+            self.status.update(source_indices=sources, target_index=target)
+
+            self.status["step"] = "copying"
+            await client.indices.create(index=target, settings={"index": BULK_LOAD_SETTINGS}, aliases={REINDEX_ALIAS: {}})
+            created = True
+            await self._await_workers(client)
+            since = time.time()
+            await self._copy(client, sources, target)
+            for _ in range(settings.REINDEX_CATCH_UP_PASSES):
+                started = time.time()
+                copied = await self._copy(client, sources, target, since)
+                since = started
+                if copied < settings.REINDEX_CATCH_UP_THRESHOLD:
+                    break
+
+            self.status["step"] = "swapping"
+            await restore_index_settings(client, target)
+            await client.indices.refresh(index=target)
+            # The old indices keep receiving deletes until the job is done.
+            write_actions = [{"remove": {"index": index, "alias": WRITE_ALIAS}} for index in sources]
+            marker_actions = [{"add": {"index": index, "alias": REINDEX_ALIAS}} for index in sources]
+            await client.indices.update_aliases(actions=write_actions + marker_actions + [
+                {"add": {"index": target, "alias": WRITE_ALIAS, "is_write_index": True}}
+            ])
+            await self._await_workers(client)
+            await self._copy(client, sources, target, since)
+            await client.indices.refresh(index=target)
+            if legacy:
+                read_actions = [{"remove_index": {"index": READ_ALIAS}}]
+            else:
+                read_actions = [{"remove": {"index": index, "alias": READ_ALIAS}} for index in sources]
+            await client.indices.update_aliases(actions=read_actions + [
+                {"add": {"index": target, "alias": READ_ALIAS}}
+            ])
+            await document_indices.refresh(client)
+            await search_cache.invalidate()
+
+            if delete_old and not legacy:
+                self.status["step"] = "deleting old indices"
+                await client.indices.delete(index=",".join(sources))
+            self.status["state"] = "finished"
+            self.status["step"] = None
+        except Exception as e:
+            print(f"Reindex job failed: {e}")
+            self.status["state"] = "failed"
+            self.status["error"] = str(e)
+            if created and WRITE_ALIAS not in await self._aliases_of(client, target):
+                # Nothing points at the half-built index yet; it can go.
+                await self._delete_quietly(client, target)
+        finally:
+            if created:
+                await self._remove_marker(client)
+            try:
+                await document_indices.refresh(client)
+            except Exception as e:
+                print(f"Could not reread the document aliases: {e}")
+        self.status["finished_at"] = time.time()
+        print(f"Reindex job {self.status['state']}: {self.status}")
+        return self.status
+
+    async def _copy(self, client: AsyncElasticsearch, sources: List[str], target: str, since: Optional[float] = None) -> int:
+        """
+        Copies the documents of the source indices (only those ingested
+        since the given time, if any) and returns how many were written.
+        External versioning keeps a newer copy already in the target.
+        """
+        source = {"index": sources, "size": settings.REINDEX_BATCH_SIZE}
+        if since is not None:
+            start = int((since - CATCH_UP_MARGIN) * 1000)
+            source["query"] = {"range": {"ingest_date": {"gte": start, "format": "epoch_millis"}}}
+        response = await client.reindex(
+            source=source,
+            dest={"index": target, "version_type": "external"},
+            conflicts="proceed",
+            slices="auto",
+            wait_for_completion=False,
+        )
+        task_id = response["task"]
+        while True:
+            await asyncio.sleep(REINDEX_POLL_INTERVAL)
+            task = await client.tasks.get(task_id=task_id)
+            if task.get("completed"):
+                break
+        result = task.get("response", {})
+        if result.get("failures"):
+            raise RuntimeError(f"Reindex into '{target}' failed: {result['failures'][0]}")
+        written = result.get("created", 0) + result.get("updated", 0)
+        self.status["passes"] += 1
+        self.status["copied"] += written
+        self.status["conflicts"] += result.get("version_conflicts", 0)
+        return written
+
+    async def _await_workers(self, client: AsyncElasticsearch):
+        """
+        Waits until every worker has reread the aliases just changed.
+        """
+        await document_indices.refresh(client)
+        await asyncio.sleep(settings.DOCUMENTS_ALIAS_REFRESH_INTERVAL)
+
+    async def _remove_marker(self, client: AsyncElasticsearch):
+        try:
+            await client.indices.delete_alias(index="_all", name=REINDEX_ALIAS)
+        except NotFoundError:
+            pass
+        except Exception as e:
+            print(f"Could not remove the '{REINDEX_ALIAS}' alias; remove it by hand: {e}")
+
+    async def _aliases_of(self, client: AsyncElasticsearch, index: str) -> dict:
+        try:
+            response = await client.indices.get_alias(index=index)
+        except Exception:
+            return {}
+        return response.get(index, {}).get("aliases", {})
+
+    async def _delete_quietly(self, client: AsyncElasticsearch, index: str):
+        try:
+            await client.indices.delete(index=index)
+        except Exception as e:
+            print(f"Could not delete '{index}': {e}")
+
+
+class IndexMaintenance:
+    """
+    Background upkeep in every worker: rereads the aliases so writes follow
+    rollovers and reindexes done elsewhere, and checks the rollover
+    conditions. At startup it also backfills document_id on documents from
+    before it was stored; until that is done, searches do not hand out
+    paging cursors (see build_search_sort).
+    """
+
+    def __init__(self, alias_refresh_interval: float, rollover_check_interval: float):
+        self.alias_refresh_interval = alias_refresh_interval
+        self.rollover_check_interval = rollover_check_interval
+        self.document_ids_complete = False
+        self._task: Optional[asyncio.Task] = None
+        self._backfill_task: Optional[asyncio.Task] = None
+
+    def start(self, client: AsyncElasticsearch):
+        self._task = asyncio.create_task(self._run(client))
+        self._backfill_task = asyncio.create_task(self._backfill(client))
+
+    async def stop(self):
+        tasks = [task for task in (self._task, self._backfill_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task, self._backfill_task = None, None
+
+    async def _backfill(self, client: AsyncElasticsearch):
+        while True:
+            try:
+                remaining = await backfill_document_ids(client)
+            except Exception as e:
+                print(f"Document id backfill failed: {e}")
+                remaining = None
+            if remaining == 0:
+                break
+            await asyncio.sleep(self.alias_refresh_interval)
+        self.document_ids_complete = True
+        # Pages cached meanwhile were served without a cursor.
+        await search_cache.invalidate()
+
+    async def _run(self, client: AsyncElasticsearch):
+        next_rollover_check = time.monotonic() + self.rollover_check_interval
+        while True:
+            await asyncio.sleep(self.alias_refresh_interval)
+            try:
+                if time.monotonic() >= next_rollover_check and not reindex_job.is_running():
+                    next_rollover_check = time.monotonic() + self.rollover_check_interval
+                    await rollover(client)
+                else:
+                    await document_indices.refresh(client)
+            except Exception as e:
+                print(f"Index maintenance failed: {e}")
+
+
+bulk_load = BulkLoadMode(max_duration=settings.BULK_LOAD_MAX_DURATION)
+reindex_job = ReindexJob()
+index_maintenance = IndexMaintenance(
+    alias_refresh_interval=settings.DOCUMENTS_ALIAS_REFRESH_INTERVAL,
+    rollover_check_interval=settings.DOCUMENTS_ROLLOVER_CHECK_INTERVAL,
+)
@@ -0,0 +1,211 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from elasticsearch.helpers import async_bulk, async_streaming_bulk
+
+from app.core.config import settings
+from app.db.indices import document_indices
+from app.db.session import es_breaker, elasticsearch_startup, ingest_client as es_client
+from app.services.change_feed import change_feed
+from app.services.search_cache import search_cache
+
+# Bulk item statuses worth retrying: rejected because ES is overloaded, or the
+# whole chunk failed to reach ES ('N/A' is what the bulk helper reports then).
+RETRYABLE_STATUSES = {429, "N/A"}
+
+
+class IngestQueueFull(Exception):
+    """
+    Raised when the ingest queue is at capacity and cannot accept a document.
+    """
+
+
+class IngestQueue:
+    """
+    A bounded, in-process write-behind queue for ingested documents.
+
+    The ingest endpoints enqueue ready-to-index bulk actions and return
+    immediately. Background workers drain the queue and write to Elasticsearch
+    in bulk batches that are bounded by size and by time.
+    """
+
+    def __init__(self, maxsize: int, workers: int, batch_size: int, flush_interval: float, status_retention: int):
+        self.maxsize = maxsize
+        self.worker_count = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.status_retention = status_retention
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._statuses: "OrderedDict[str, dict]" = OrderedDict()
+        self._accepting = False
+
+    async def start(self):
+        """
+        Creates the queue on the running event loop and starts the flushers.
+        """
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._accepting = True
+        print(f"Ingest queue started with {self.worker_count} workers (capacity {self.maxsize}).")
+
+    async def stop(self, timeout: Optional[float] = None):
+        """
+        Stops accepting documents, waits for everything already queued to be
+        flushed and then stops the workers.
+        """
+        if self._queue is None:
+            return
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Ingest queue did not drain in {timeout}s; {self._queue.qsize()} documents were not indexed.")
+            while not self._queue.empty():
+                entry = self._queue.get_nowait()
+                self._set_status(entry["tracking_id"], "failed", error="The server shut down before the document was indexed.")
+                self._queue.task_done()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        print("Ingest queue stopped.")
+
+    def enqueue(self, action: dict) -> str:
+        """
+        Queues a bulk action and returns its tracking id. Raises IngestQueueFull
+        when the queue is at capacity so callers can apply backpressure.
+        """
+        if self._queue is None or not self._accepting:
+            raise IngestQueueFull("The ingest queue is not accepting documents.")
+        tracking_id = str(uuid.uuid4())
+        try:
+            self._queue.put_nowait({"tracking_id": tracking_id, "action": action, "attempts": 0})
+        except asyncio.QueueFull:
+            raise IngestQueueFull("The ingest queue is full.")
+        self._set_status(tracking_id, "queued", document_id=action.get("_id"))
+        return tracking_id
+
+    def enqueue_many(self, actions: List[dict]) -> List[str]:
+        """
+        Queues several bulk actions, all or none: raises IngestQueueFull
+        without queueing any of them when they do not all fit.
+        """
+        if self._queue is None or not self._accepting:
+            raise IngestQueueFull("The ingest queue is not accepting documents.")
+        if self.maxsize > 0 and self.maxsize - self._queue.qsize() < len(actions):
+            raise IngestQueueFull("The ingest queue is full.")
+        return [self.enqueue(action) for action in actions]
+
+    def get_status(self, tracking_id: str) -> Optional[dict]:
+        return self._statuses.get(tracking_id)
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _set_status(self, tracking_id: str, state: str, **details):
+        entry = self._statuses.pop(tracking_id, None) or {"tracking_id": tracking_id}
+        entry.update(details)
+        entry["status"] = state
+        entry["updated_at"] = time.time()
+        self._statuses[tracking_id] = entry
+        while len(self._statuses) > self.status_retention:
+            self._statuses.popitem(last=False)
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                print(f"Error flushing ingest batch: {e}")
+                for entry in batch:
+                    self._set_status(entry["tracking_id"], "failed", error=str(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[dict]):
+        pending = batch
+        changed = False
+        # Announced once the batch is settled, as stale writes are only known
+        # after the deletes that follow them.
+        events = {}
+        while pending:
+            # Documents wait here rather than fail while Elasticsearch is not
+            # set up yet or the circuit breaker is open.
+            await elasticsearch_startup.ready.wait()
+            while not es_breaker.allows_requests():
+                await asyncio.sleep(es_breaker.retry_after())
+            retry = []
+            compensations = []
+            # Each entry becomes its own action plus deletes of the same id
+            # in the other document indices; only its own action decides
+            # the entry's status.
+            expanded = [(entry, action, primary) for entry in pending for action, primary in document_indices.expand(entry["action"])]
+            responses = async_streaming_bulk(
+                es_client,
+                (action for _, action, _ in expanded),
+                chunk_size=settings.INGEST_BULK_CHUNK_SIZE,
+                raise_on_error=False,
+                raise_on_exception=False,
+            )
+            items = iter(expanded)
+            async for ok, item in responses:
+                entry, action, primary = next(items)
+                op_type, info = next(iter(item.items()), (None, {}))
+                if not primary:
+                    if info.get("status") == 409 and entry.get("written") is not None:
+                        # Another index holds a newer copy; the write just made is stale.
+                        compensations.append(document_indices.compensating_delete(entry["written"]))
+                        self._set_status(entry["tracking_id"], "stale", document_id=info.get("_id"))
+                        events.pop(entry["tracking_id"], None)
+                    continue
+                entry["written"] = None
+                if op_type == "delete" and (ok or info.get("status") == 404):
+                    self._set_status(entry["tracking_id"], "deleted", document_id=info.get("_id"))
+                    events[entry["tracking_id"]] = ("deleted", info.get("_id"), None)
+                    changed = True
+                elif ok:
+                    self._set_status(entry["tracking_id"], "indexed", document_id=info.get("_id"))
+                    entry["written"] = action
+                    events[entry["tracking_id"]] = ("indexed", info.get("_id"), action.get("_source", {}).get("metadata", {}))
+                    changed = True
+                elif info.get("status") == 409:
+                    # Externally versioned and a newer version is already indexed.
+                    self._set_status(entry["tracking_id"], "stale", document_id=info.get("_id"))
+                elif info.get("status") in RETRYABLE_STATUSES and entry["attempts"] < settings.INGEST_QUEUE_MAX_RETRIES:
+                    entry["attempts"] += 1
+                    retry.append(entry)
+                else:
+                    error = info.get("error") or info.get("exception") or "Indexing failed."
+                    self._set_status(entry["tracking_id"], "failed", error=str(error))
+            if compensations:
+                await async_bulk(es_client, compensations, raise_on_error=False, stats_only=True)
+            if retry:
+                await asyncio.sleep(settings.INGEST_QUEUE_RETRY_BACKOFF * 2 ** (retry[0]["attempts"] - 1))
+            pending = retry
+        for event_type, document_id, metadata in events.values():
+            change_feed.publish(event_type, document_id, metadata)
+        if changed:
+            await search_cache.invalidate()
+
+ingest_queue = IngestQueue(
+    maxsize=settings.INGEST_QUEUE_MAXSIZE,
+    workers=settings.INGEST_QUEUE_WORKERS,
+    batch_size=settings.INGEST_QUEUE_BATCH_SIZE,
+    flush_interval=settings.INGEST_QUEUE_FLUSH_INTERVAL,
+    status_retention=settings.INGEST_STATUS_RETENTION,
+)
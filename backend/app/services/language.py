@@ -0,0 +1,233 @@
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from langdetect import DetectorFactory, LangDetectException
+from langdetect.detector_factory import PROFILES_DIRECTORY
+from langdetect.utils.ngram import NGram
+
+from app.core.config import settings
+
+UNKNOWN_LANGUAGE = "unknown"
+
+# langdetect's smoothing for n-grams a language has never seen (alpha / BASE_FREQ).
+UNSEEN_NGRAM_PROBABILITY = 0.5 / 10000
+
+# Per-n-gram log-likelihood margin at which a window's confidence saturates.
+MARGIN_SATURATION = 0.5
+
+NON_LETTERS = re.compile(r"[\W\d_]+")
+
+
+class _NormalizedCharacters(dict):
+    # A str.translate table applying langdetect's per-character normalization
+    # (e.g. every kana to one representative, CJK ideographs to their cluster),
+    # without which its CJK and Japanese profiles never match. Filled lazily.
+    def __missing__(self, codepoint: int) -> str:
+        self[codepoint] = NGram.normalize(chr(codepoint))
+        return self[codepoint]
+
+
+NORMALIZED_CHARACTERS = _NormalizedCharacters()
+
+# Scripts written without spaces between words: kana, bopomofo, CJK
+# ideographs and Hangul.
+IDEOGRAPHIC = re.compile(r"[\u3040-\u312f\u31a0-\u31bf\u3400-\u9fff\uac00-\ud7af]")
+
+
+class LanguageResult:
+    def __init__(self, language: str, confidence: float = 0.0, secondary: Optional[List[str]] = None):
+        self.language = language
+        self.confidence = confidence
+        self.secondary = secondary or []
+
+
+class LanguageIdentifier(ABC):
+    """
+    Base class for language identification backends.
+    """
+
+    def load(self):
+        """
+        Loads language profiles. Called at startup so the first request does
+        not pay for it.
+        """
+
+    @abstractmethod
+    def identify(self, content: str) -> LanguageResult:
+        """
+        Identifies the main language of the content, with its confidence and
+        any secondary languages.
+        """
+
+
+def sample_windows(content: str, count: int, size: int) -> List[str]:
+    """
+    Returns up to `count` windows of about `size` characters spread evenly
+    across the content, so a letterhead or boilerplate header cannot decide
+    the language of a whole document on its own.
+    """
+    if len(content) <= count * size:
+        return [content[start:start + size] for start in range(0, len(content), size)]
+    windows = []
+    stride = len(content) / count
+    for i in range(count):
+        start = int(stride * i + (stride - size) / 2)
+        # Start on a word boundary so the window does not begin mid-word.
+        space = content.find(" ", start, start + 32)
+        if space != -1:
+            start = space + 1
+        windows.append(content[start:start + size])
+    return windows
+
+
+class NgramLanguageIdentifier(LanguageIdentifier):
+    """
+    A deterministic naive-Bayes scorer over langdetect's n-gram profiles.
+
+    Unlike langdetect.detect it does not sample n-grams at random, so the same
+    text always gets the same answer. It scores every language langdetect
+    ships unless restricted to a set of candidate languages, which makes it
+    several times cheaper per document when the corpus is known to use only a
+    few. Every sampled window votes for a language; the share of votes and
+    the per-window margin give the confidence, and other languages that win
+    enough of the windows are reported as secondary languages.
+    """
+
+    # Trigrams only: on our benchmark corpus adding uni- and bigrams doubled
+    # the cost without improving accuracy.
+    NGRAM_ORDERS = (3,)
+    # Except for ideographic text, which the profiles mostly describe with
+    # single characters and pairs.
+    IDEOGRAPHIC_NGRAM_ORDERS = (1, 2, 3)
+
+    def __init__(self, candidates: List[str], window_count: int, window_size: int, secondary_min_share: float):
+        self.candidates = candidates
+        self.window_count = window_count
+        self.window_size = window_size
+        self.secondary_min_share = secondary_min_share
+        self._languages: List[str] = []
+        self._vectors: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._vectors:
+                return
+            factory = DetectorFactory()
+            factory.load_profile(PROFILES_DIRECTORY)
+            indexes = [
+                (language, index) for index, language in enumerate(factory.langlist)
+                if not self.candidates or language in self.candidates
+            ]
+            vectors = {}
+            for ngram, probabilities in factory.word_lang_prob_map.items():
+                if len(ngram) not in self.IDEOGRAPHIC_NGRAM_ORDERS:
+                    continue
+                if not any(probabilities[index] > 0 for _, index in indexes):
+                    continue
+                # One log-probability per candidate language, so a window is
+                # scored by summing the columns of its n-grams' vectors.
+                vectors[ngram] = tuple(math.log(probabilities[index] + UNSEEN_NGRAM_PROBABILITY) for _, index in indexes)
+            self._languages = [language for language, _ in indexes]
+            self._vectors = vectors
+
+    def identify(self, content: str) -> LanguageResult:
+        if not self._vectors:
+            self.load()
+        votes: Dict[str, float] = {}
+        margins: Dict[str, float] = {}
+        for window in sample_windows(content, self.window_count, self.window_size):
+            vectors = self._ngram_vectors(window)
+            if not vectors:
+                continue
+            scores = sorted(zip((sum(column) for column in zip(*vectors)), self._languages), reverse=True)
+            best_score, best_language = scores[0]
+            margin = (best_score - scores[1][0]) / len(vectors) if len(scores) > 1 else MARGIN_SATURATION
+            votes[best_language] = votes.get(best_language, 0.0) + len(vectors)
+            margins[best_language] = margins.get(best_language, 0.0) + margin * len(vectors)
+        if not votes:
+            return LanguageResult(UNKNOWN_LANGUAGE)
+
+        total = sum(votes.values())
+        ranked = sorted(votes, key=votes.get, reverse=True)
+        language = ranked[0]
+        share = votes[language] / total
+        certainty = min(1.0, margins[language] / votes[language] / MARGIN_SATURATION)
+        secondary = [other for other in ranked[1:] if votes[other] / total >= self.secondary_min_share]
+        return LanguageResult(language, round(share * certainty, 4), secondary)
+
+    def _ngram_vectors(self, window: str) -> List[tuple]:
+        """
+        Returns the score vectors of the n-grams langdetect would see in the
+        window, skipping all-caps words (acronyms, defined terms) the same way
+        it does. Slicing the space-joined words also produces n-grams that
+        span two words, but langdetect's profiles never contain those, so the
+        lookup drops them along with any other unknown n-gram.
+        """
+        orders = self.NGRAM_ORDERS
+        if not window.isascii():
+            window = window.translate(NORMALIZED_CHARACTERS)
+            if IDEOGRAPHIC.search(window):
+                orders = self.IDEOGRAPHIC_NGRAM_ORDERS
+        words = [word for word in NON_LETTERS.sub(" ", window).split() if len(word) == 1 or not word.isupper()]
+        text = f" {' '.join(words)} "
+        ngrams = (text[start:start + n] for n in orders for start in range(len(text) - n + 1))
+        return [vector for vector in map(self._vectors.get, ngrams) if vector is not None]
+
+
+class LangdetectLanguageIdentifier(LanguageIdentifier):
+    """
+    langdetect's own detector with a fixed seed, run on the sampled windows
+    joined together. It scores uni-, bi- and trigrams and iterates until its
+    estimate converges, which makes it about twice as slow as the n-gram
+    identifier. The windows do not vote separately, so the confidence is
+    langdetect's probability for the whole sample.
+    """
+
+    def __init__(self, window_count: int, window_size: int, secondary_min_share: float):
+        self.window_count = window_count
+        self.window_size = window_size
+        self.secondary_min_share = secondary_min_share
+        self._factory: Optional[DetectorFactory] = None
+
+    def load(self):
+        if self._factory is None:
+            factory = DetectorFactory()
+            factory.load_profile(PROFILES_DIRECTORY)
+            factory.set_seed(0)
+            self._factory = factory
+
+    def identify(self, content: str) -> LanguageResult:
+        if self._factory is None:
+            self.load()
+        detector = self._factory.create()
+        detector.append(" ".join(sample_windows(content, self.window_count, self.window_size)))
+        try:
+            probabilities = detector.get_probabilities()
+        except LangDetectException:
+            return LanguageResult(UNKNOWN_LANGUAGE)
+        if not probabilities:
+            return LanguageResult(UNKNOWN_LANGUAGE)
+        secondary = [p.lang for p in probabilities[1:] if p.prob >= self.secondary_min_share]
+        return LanguageResult(probabilities[0].lang, round(probabilities[0].prob, 4), secondary)
+
+
+def build_language_identifier() -> LanguageIdentifier:
+    if settings.LANGUAGE_IDENTIFIER == "langdetect":
+        return LangdetectLanguageIdentifier(
+            window_count=settings.LANGUAGE_SAMPLE_WINDOWS,
+            window_size=settings.LANGUAGE_WINDOW_CHARS,
+            secondary_min_share=settings.LANGUAGE_SECONDARY_MIN_SHARE,
+        )
+    return NgramLanguageIdentifier(
+        candidates=[language.strip() for language in settings.LANGUAGE_CANDIDATES.split(",") if language.strip()],
+        window_count=settings.LANGUAGE_SAMPLE_WINDOWS,
+        window_size=settings.LANGUAGE_WINDOW_CHARS,
+        secondary_min_share=settings.LANGUAGE_SECONDARY_MIN_SHARE,
+    )
+
+
+language_identifier = build_language_identifier()
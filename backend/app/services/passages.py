@@ -0,0 +1,82 @@
+import math
+from bisect import bisect_right
+from typing import List, Optional
+
+from app.core.config import settings
+
+# The agent separates the pages (and spreadsheet sheets) of extracted text
+# with form feeds.
+PAGE_BREAK = "\f"
+BREAK_CHARACTERS = (PAGE_BREAK, "\n", " ")
+
+
+def split_passages(content: str, size: int, overlap: int, max_passages: int) -> List[dict]:
+    """
+    Splits content into overlapping passages of about `size` characters,
+    each {"text", "page", "offset"}: the 1-based page and the character
+    offset it starts at. Passages end at a page break, line break or space
+    where there is one in their second half, and the next passage starts
+    `overlap` characters before, on a word boundary, so a phrase cut at the
+    end of one passage is whole in the next. Very long content gets larger
+    passages rather than more than `max_passages` of them (the last one
+    takes whatever is left).
+    """
+    length = len(content)
+    if max_passages and length > size * max_passages:
+        size = math.ceil(length / max_passages) + overlap
+    page_breaks = []
+    position = content.find(PAGE_BREAK)
+    while position != -1:
+        page_breaks.append(position)
+        position = content.find(PAGE_BREAK, position + 1)
+
+    passages = []
+    start = 0
+    while start < length:
+        end = min(start + size, length)
+        if max_passages and len(passages) == max_passages - 1:
+            # Cutting at breaks makes passages shorter than `size`, so the
+            # last one allowed takes whatever is left.
+            end = length
+        elif end < length:
+            for character in BREAK_CHARACTERS:
+                cut = content.rfind(character, start + size // 2, end)
+                if cut != -1:
+                    end = cut + 1
+                    break
+        text = content[start:end]
+        if text.strip():
+            passages.append({"text": text, "page": bisect_right(page_breaks, start) + 1, "offset": start})
+        if end >= length:
+            break
+        next_start = max(end - overlap, start + 1)
+        boundary = content.find(" ", next_start, end)
+        start = boundary + 1 if boundary != -1 else next_start
+    return passages
+
+
+def passages_for(content: str) -> Optional[List[dict]]:
+    """
+    The passages stored for a document's content, or None when it is short
+    enough to be scored as a whole (or passages are disabled).
+    """
+    if settings.PASSAGE_SIZE <= 0 or len(content) < settings.PASSAGE_MIN_CONTENT_CHARS:
+        return None
+    return split_passages(content, settings.PASSAGE_SIZE, settings.PASSAGE_OVERLAP, settings.PASSAGE_MAX_COUNT)
+
+
+def join_passages(passages: List[dict]) -> str:
+    """
+    Rebuilds the content of a document that was stored as passages only.
+    Overlaps are dropped; whitespace-only stretches between passages are
+    not restored.
+    """
+    parts = []
+    position = 0
+    for passage in sorted(passages, key=lambda passage: passage["offset"]):
+        text, offset = passage["text"], passage["offset"]
+        if offset + len(text) <= position:
+            continue
+        parts.append(text[max(position - offset, 0):])
+        position = offset + len(text)
+    return "".join(parts)
@@ -0,0 +1,134 @@
+import zlib
+from typing import List
+
+from fastapi import UploadFile
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional; gzip always works.
+    zstandard = None
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+
+# Compressed bytes read from the upload per step, and the most decoded
+# bytes a gzip step returns.
+READ_CHUNK_SIZE = 64 * 1024
+
+# zstd input fed to the decompressor per call. zstandard cannot bound a
+# call's output, but a zstd block (at most 128 KiB decoded) takes at least 4
+# compressed bytes, so this many bytes decode to at most 8 MiB.
+ZSTD_INPUT_STEP = 256
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+class InvalidPayload(Exception):
+    pass
+
+
+class UnsupportedEncoding(InvalidPayload):
+    pass
+
+
+def supported_encodings() -> List[str]:
+    """
+    Encodings the server can decode, in order of preference.
+    """
+    encodings = [GZIP, IDENTITY]
+    if zstandard is not None:
+        encodings.insert(0, ZSTD)
+    return encodings
+
+
+def _decompressor(encoding: str):
+    if encoding == GZIP:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise UnsupportedEncoding(f"Unsupported encoding '{encoding}'. Supported: {', '.join(supported_encodings())}.")
+
+
+class DecodingReader:
+    """
+    Wraps an uploaded file and decompresses it as it is read, so compressed
+    uploads are never held in memory as a whole. Raises PayloadTooLarge as
+    soon as more than `max_bytes` have been decoded. Each decompression step
+    is bounded, so a small, highly compressed upload (a decompression bomb)
+    is rejected before it can inflate in memory.
+    """
+
+    def __init__(self, upload: UploadFile, encoding: str, max_bytes: int):
+        self.upload = upload
+        self.filename = upload.filename
+        self.max_bytes = max_bytes
+        self.decoded_bytes = 0
+        self._encoding = encoding
+        self._decompressor = None if encoding == IDENTITY else _decompressor(encoding)
+        self._input = memoryview(b"")
+        self._input_finished = False
+        self._finished = False
+
+    async def read(self, size: int = -1) -> bytes:
+        """
+        Returns the next decoded bytes; b"" once the upload is exhausted.
+        `size` bounds the bytes read from the upload, not the decoded output.
+        """
+        while not self._finished:
+            if self._decompressor is None:
+                chunk = await self.upload.read(size if size and size > 0 else READ_CHUNK_SIZE)
+                data = chunk
+                self._finished = not chunk
+            else:
+                if not self._input and not self._input_finished:
+                    chunk = await self.upload.read(min(size, READ_CHUNK_SIZE) if size and size > 0 else READ_CHUNK_SIZE)
+                    self._input = memoryview(chunk)
+                    self._input_finished = not chunk
+                try:
+                    data = self._decode_step()
+                except Exception as e:
+                    # zlib.error or zstandard.ZstdError: corrupt data.
+                    raise InvalidPayload(f"Could not decode upload: {e}")
+                if self._input_finished and not data:
+                    if not self._decompressor.eof:
+                        raise InvalidPayload("The compressed upload is truncated.")
+                    self._finished = True
+            self.decoded_bytes += len(data)
+            if self.decoded_bytes > self.max_bytes:
+                raise PayloadTooLarge(f"Decoded upload exceeds {self.max_bytes} bytes.")
+            if data:
+                return data
+        return b""
+
+    def _decode_step(self) -> bytes:
+        """
+        Decodes a bounded part of the pending input. Once the input is
+        exhausted it returns whatever output the decompressor still holds.
+        """
+        if self._encoding == GZIP:
+            if self._decompressor.eof:
+                return b""
+            data = self._decompressor.decompress(self._input, READ_CHUNK_SIZE)
+            self._input = memoryview(self._decompressor.unconsumed_tail)
+            return data
+        step, self._input = self._input[:ZSTD_INPUT_STEP], self._input[ZSTD_INPUT_STEP:]
+        if not step or self._decompressor.eof:
+            # Like gzip, data after the end of the stream is ignored.
+            return b""
+        return self._decompressor.decompress(step)
+
+
+async def read_payload(upload: UploadFile, encoding: str, max_bytes: int) -> bytes:
+    """
+    Reads and decodes a whole (small) upload such as the JSON payload.
+    """
+    reader = DecodingReader(upload, encoding, max_bytes)
+    parts = []
+    while True:
+        data = await reader.read(READ_CHUNK_SIZE)
+        if not data:
+            return b"".join(parts)
+        parts.append(data)
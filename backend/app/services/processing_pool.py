@@ -0,0 +1,146 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.file_processor import FileProcessor
+from app.services.language import language_identifier
+
+
+def _init_worker():
+    # Load language profiles once per worker instead of on its first document.
+    language_identifier.load()
+
+
+def _process_batch(items: List[Tuple[dict, str, str]]) -> List[Tuple[bool, object]]:
+    """
+    Runs in a pool worker. Processes every document of a batch and returns an
+    (ok, result-or-error) pair per document, so one bad document does not fail
+    the documents it was batched with.
+    """
+    results = []
+    for metadata, content, filename in items:
+        try:
+            results.append((True, FileProcessor(metadata, content, filename).run_all()))
+        except Exception as e:
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class ProcessingPool:
+    """
+    Runs FileProcessor off the event loop in a pool of worker processes.
+
+    Small documents are processed inline because the IPC round trip would cost
+    more than the processing itself. Larger documents that arrive within the
+    same short window are grouped into one pool task, up to a maximum number
+    of characters per task.
+    """
+
+    def __init__(self, workers: int, inline_max_chars: int, max_task_chars: int, batch_window: float):
+        self.workers = workers
+        self.inline_max_chars = inline_max_chars
+        self.max_task_chars = max_task_chars
+        self.batch_window = batch_window
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: List[Tuple[Tuple[dict, str, str], asyncio.Future]] = []
+        self._pending_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def start(self):
+        if self.workers <= 0:
+            print("FileProcessor pool disabled; documents are processed inline.")
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        print(f"FileProcessor pool started with {self.workers} workers.")
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._dispatch()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def process(self, metadata: dict, content: str, filename: str) -> dict:
+        """
+        Returns FileProcessor's processed data for a single document.
+        """
+        if self._executor is None or len(content) <= self.inline_max_chars:
+            return FileProcessor(metadata, content, filename).run_all()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._pending and self._pending_chars + len(content) > self.max_task_chars:
+            self._dispatch()
+        self._pending.append(((metadata, content, filename), future))
+        self._pending_chars += len(content)
+        if self._pending_chars >= self.max_task_chars:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_chars = self._pending, [], 0
+        futures = [future for _, future in batch]
+        try:
+            task = self._executor.submit(_process_batch, [item for item, _ in batch])
+        except BrokenProcessPool as e:
+            self._restart()
+            self._fail(futures, e)
+            return
+        asyncio.wrap_future(task).add_done_callback(lambda done: self._resolve(futures, done))
+
+    def _resolve(self, futures: List[asyncio.Future], done: asyncio.Future):
+        if done.cancelled():
+            self._fail(futures, asyncio.CancelledError())
+            return
+        error = done.exception()
+        if error is not None:
+            if isinstance(error, BrokenProcessPool):
+                self._restart()
+            self._fail(futures, error)
+            return
+        for future, (ok, result) in zip(futures, done.result()):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+
+    def _fail(self, futures: List[asyncio.Future], error: BaseException):
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _restart(self):
+        """
+        Replaces a pool whose worker died (e.g. killed by the OOM killer).
+        """
+        print("FileProcessor pool is broken; restarting it.")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.start()
+
+
+processing_pool = ProcessingPool(
+    workers=settings.PROCESSING_WORKERS,
+    inline_max_chars=settings.PROCESSING_INLINE_MAX_CHARS,
+    max_task_chars=settings.PROCESSING_MAX_TASK_CHARS,
+    batch_window=settings.PROCESSING_BATCH_WINDOW,
+)
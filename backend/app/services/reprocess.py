@@ -0,0 +1,338 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from elasticsearch import AsyncElasticsearch, NotFoundError
+from elasticsearch.helpers import async_bulk
+
+from app.core.config import settings
+from app.db.indices import READ_ALIAS
+from app.services.passages import join_passages
+from app.services.processing_pool import processing_pool
+from app.services.search_cache import search_cache
+
+CHECKPOINT_FORMAT = 1
+
+
+def slice_ranges(slices: int) -> List[dict]:
+    """
+    Splits the document_id key space into `slices` contiguous ranges.
+    Document ids are UUIDs, so ranges over their first two hex digits are
+    about equally full, and unlike Elasticsearch's own slicing the split does
+    not depend on the point in time, so a checkpoint stays valid after one
+    expires.
+    """
+    bounds = [format(n * 256 // slices, "02x") for n in range(1, slices)]
+    ranges = []
+    for number in range(slices):
+        key_range = {}
+        if number > 0:
+            key_range["gte"] = bounds[number - 1]
+        if number < slices - 1:
+            key_range["lt"] = bounds[number]
+        ranges.append(key_range)
+    return ranges
+
+
+def _processing_input(source: dict):
+    """
+    The (metadata, content, filename) FileProcessor was given at ingest,
+    recovered from a stored document.
+    """
+    metadata = dict(source.get("metadata", {}))
+    for field in ("created_date", "modified_date"):
+        if isinstance(metadata.get(field), str):
+            metadata[field] = datetime.fromisoformat(metadata[field]).timestamp()
+    content = source.get("content")
+    if content is None:
+        content = join_passages(source.get("passages") or [])
+    return metadata, content, metadata.get("filename_original") or ""
+
+
+class ReprocessJob:
+    """
+    Re-runs FileProcessor over every indexed document after its logic
+    (classification rules, the corpus filename scheme, language detection)
+    has changed, and writes back only the derived fields that come out
+    different.
+
+    The corpus is read through one point in time in several slices, key
+    ranges of document_id, paged concurrently with search_after. Documents
+    go through the processing pool like ingest does. Changes are written as
+    bulk partial updates guarded by the sequence number read, so a document
+    re-ingested meanwhile (which already has fresh values) is left alone.
+    Updates leave the document's version one above its modification time;
+    a later modification still replaces it.
+
+    Similarity signatures are (re)computed the same way, which is how
+    documents indexed before them get one; version families are only
+    assigned at ingest.
+
+    Each slice's position is checkpointed to a file once its page has been
+    written, so a stopped or crashed job resumes where it was. Throughput
+    can be capped, also while the job runs. Documents without a
+    document_id (from before stable ids; see the dedupe job) are skipped.
+    """
+
+    def __init__(self, checkpoint_path: str):
+        self.checkpoint_path = checkpoint_path
+        self.status = {"state": "idle"}
+        self.max_docs_per_second = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._pit_id: Optional[str] = None
+        self._pit_lock = asyncio.Lock()
+        self._next_slot = 0.0
+        self._checkpoint: dict = {}
+        self._checkpointed_at = 0.0
+        self._changed_since_invalidate = False
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, client: AsyncElasticsearch, dry_run: bool = False, resume: bool = True,
+              slices: Optional[int] = None, max_docs_per_second: Optional[float] = None):
+        """
+        Runs the job in the background, continuing from the checkpoint of an
+        unfinished job unless resume is False. Raises RuntimeError if it is
+        already running.
+        """
+        if self.is_running():
+            raise RuntimeError("A reprocess job is already running.")
+        if max_docs_per_second is not None:
+            self.max_docs_per_second = max_docs_per_second
+        else:
+            self.max_docs_per_second = settings.REPROCESS_MAX_DOCS_PER_SECOND
+        self._task = asyncio.create_task(
+            self.run(client, dry_run=dry_run, resume=resume, slices=slices or settings.REPROCESS_SLICES)
+        )
+
+    async def stop(self):
+        """
+        Stops the job after checkpointing; start it again to resume.
+        """
+        if not self.is_running():
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def throttle(self, max_docs_per_second: float):
+        """
+        Caps throughput in documents per second (0 removes the cap).
+        """
+        self.max_docs_per_second = max_docs_per_second
+        self.status["max_docs_per_second"] = max_docs_per_second
+
+    def progress(self) -> dict:
+        status = dict(self.status)
+        if status.get("state") == "running":
+            elapsed = time.time() - status["resumed_at"]
+            rate = status["scanned_this_run"] / elapsed if elapsed > 0 else 0.0
+            status["docs_per_second"] = round(rate, 1)
+            remaining = status["total"] - status["scanned"]
+            status["eta_seconds"] = round(remaining / rate) if rate > 0 and remaining > 0 else None
+        elif self._load_checkpoint() is not None:
+            status["resumable"] = True
+        return status
+
+    async def run(self, client: AsyncElasticsearch, dry_run: bool = False, resume: bool = True, slices: int = 4) -> dict:
+        checkpoint = self._load_checkpoint() if resume and not dry_run else None
+        if checkpoint is None:
+            checkpoint = {
+                "format": CHECKPOINT_FORMAT,
+                "started_at": time.time(),
+                "cursors": [None] * slices,
+                "done": [False] * slices,
+                "counters": {"scanned": 0, "changed": 0, "updated": 0, "conflicts": 0, "errors": 0, "skipped": 0},
+            }
+        self._checkpoint = checkpoint
+        self.status = {
+            "state": "running",
+            "dry_run": dry_run,
+            "resumed": checkpoint["counters"]["scanned"] > 0,
+            "slices": len(checkpoint["cursors"]),
+            "total": 0,
+            **checkpoint["counters"],
+            "scanned_this_run": 0,
+            "max_docs_per_second": self.max_docs_per_second,
+            "started_at": checkpoint["started_at"],
+            "resumed_at": time.time(),
+        }
+        try:
+            count = await client.count(index=READ_ALIAS, query={"exists": {"field": "document_id"}})
+            without_id = await client.count(index=READ_ALIAS, query={"bool": {"must_not": {"exists": {"field": "document_id"}}}})
+            self.status["total"] = count["count"]
+            self.status["skipped"] = checkpoint["counters"]["skipped"] = without_id["count"]
+            await self._open_pit(client)
+            ranges = slice_ranges(len(checkpoint["cursors"]))
+            await asyncio.gather(*(
+                self._run_slice(client, number, key_range, dry_run)
+                for number, key_range in enumerate(ranges)
+                if not checkpoint["done"][number]
+            ))
+            self.status["state"] = "finished"
+            if not dry_run:
+                self._remove_checkpoint()
+        except asyncio.CancelledError:
+            self.status["state"] = "stopped"
+            if not dry_run:
+                self._save_checkpoint()
+        except Exception as e:
+            print(f"Reprocess job failed: {e}")
+            self.status["state"] = "failed"
+            self.status["error"] = str(e)
+            if not dry_run:
+                self._save_checkpoint()
+        finally:
+            await self._close_pit(client)
+            if self._changed_since_invalidate:
+                await search_cache.invalidate()
+                self._changed_since_invalidate = False
+        self.status["finished_at"] = time.time()
+        print(f"Reprocess job {self.status['state']}: {self.status}")
+        return self.status
+
+    async def _run_slice(self, client: AsyncElasticsearch, number: int, key_range: dict, dry_run: bool):
+        cursors = self._checkpoint["cursors"]
+        query = {"bool": {"filter": [{"exists": {"field": "document_id"}}]}}
+        if key_range:
+            query["bool"]["filter"].append({"range": {"document_id": key_range}})
+        while True:
+            hits = await self._fetch(client, query, cursors[number])
+            if not hits:
+                break
+            await self._throttle(len(hits))
+            await self._process_page(client, hits, dry_run)
+            # The position only moves on once the page has been written.
+            cursors[number] = hits[-1]["sort"][0]
+            if not dry_run and time.monotonic() - self._checkpointed_at >= settings.REPROCESS_CHECKPOINT_INTERVAL:
+                self._save_checkpoint()
+            if len(hits) < settings.REPROCESS_PAGE_SIZE:
+                break
+        self._checkpoint["done"][number] = True
+
+    async def _fetch(self, client: AsyncElasticsearch, query: dict, cursor: Optional[str]) -> List[dict]:
+        for attempt in range(2):
+            pit_id = self._pit_id
+            try:
+                response = await client.search(
+                    query=query,
+                    pit={"id": pit_id, "keep_alive": settings.REPROCESS_PIT_KEEP_ALIVE},
+                    sort=[{"document_id": "asc"}],
+                    search_after=[cursor] if cursor is not None else None,
+                    size=settings.REPROCESS_PAGE_SIZE,
+                    source_includes=["metadata", "content", "passages", "similarity"],
+                    seq_no_primary_term=True,
+                    track_total_hits=False,
+                )
+            except NotFoundError:
+                # The point in time expired (e.g. while throttled); the
+                # cursors do not depend on it.
+                if attempt:
+                    raise
+                await self._open_pit(client, expired=pit_id)
+                continue
+            self._pit_id = response.get("pit_id", self._pit_id)
+            return response["hits"]["hits"]
+
+    async def _process_page(self, client: AsyncElasticsearch, hits: List[dict], dry_run: bool):
+        inputs = [_processing_input(hit["_source"]) for hit in hits]
+        results = await asyncio.gather(
+            *(processing_pool.process(metadata, content, filename) for metadata, content, filename in inputs),
+            return_exceptions=True
+        )
+        counters = self._checkpoint["counters"]
+        actions = []
+        for hit, processed in zip(hits, results):
+            counters["scanned"] += 1
+            self.status["scanned_this_run"] += 1
+            if isinstance(processed, Exception):
+                counters["errors"] += 1
+                print(f"Could not reprocess {hit['_id']}: {processed}")
+                continue
+            metadata = hit["_source"].get("metadata", {})
+            similarity = processed.pop("similarity", None)
+            changed = {field: value for field, value in processed.items() if metadata.get(field) != value}
+            doc = {"metadata": changed} if changed else {}
+            if similarity != hit["_source"].get("similarity"):
+                doc["similarity"] = similarity
+            if not doc:
+                continue
+            counters["changed"] += 1
+            actions.append({
+                "_op_type": "update",
+                "_index": hit["_index"],
+                "_id": hit["_id"],
+                "if_seq_no": hit["_seq_no"],
+                "if_primary_term": hit["_primary_term"],
+                "doc": doc,
+            })
+        if actions and not dry_run:
+            updated, errors = await async_bulk(client, actions, raise_on_error=False, stats_only=True)
+            counters["updated"] += updated
+            # Nearly always a conflict: the document was re-ingested meanwhile.
+            counters["conflicts"] += errors
+            self._changed_since_invalidate = self._changed_since_invalidate or updated > 0
+        self.status.update(counters)
+
+    async def _throttle(self, documents: int):
+        if self.max_docs_per_second <= 0:
+            return
+        now = time.monotonic()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + documents / self.max_docs_per_second
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _open_pit(self, client: AsyncElasticsearch, expired: Optional[str] = None):
+        async with self._pit_lock:
+            # Another slice may have replaced the expired one already.
+            if expired is not None and self._pit_id != expired:
+                return
+            response = await client.open_point_in_time(index=READ_ALIAS, keep_alive=settings.REPROCESS_PIT_KEEP_ALIVE)
+            self._pit_id = response["id"]
+
+    async def _close_pit(self, client: AsyncElasticsearch):
+        if self._pit_id is None:
+            return
+        pit_id, self._pit_id = self._pit_id, None
+        try:
+            await client.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Could not close reprocess point in time: {e}")
+
+    def _load_checkpoint(self) -> Optional[dict]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable reprocess checkpoint: {e}")
+            return None
+        return checkpoint if checkpoint.get("format") == CHECKPOINT_FORMAT else None
+
+    def _save_checkpoint(self):
+        # Written to a temporary file and renamed, so a crash mid-write
+        # leaves the previous checkpoint intact.
+        temporary = self.checkpoint_path + ".tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(self._checkpoint, f)
+            os.replace(temporary, self.checkpoint_path)
+            self._checkpointed_at = time.monotonic()
+        except OSError as e:
+            print(f"Could not write reprocess checkpoint: {e}")
+
+    def _remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+
+reprocess_job = ReprocessJob(
+    checkpoint_path=settings.REPROCESS_CHECKPOINT_PATH or os.path.join(settings.CORPUS_FILES_DIR, "reprocess-checkpoint.json")
+)
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Only needed to share invalidation between workers.
+    redis_asyncio = None
+
+GENERATION_KEY = "corpus:search-cache:generation"
+
+
+class LocalGeneration:
+    """
+    The invalidation counter of a single worker process.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    async def get(self) -> int:
+        return self.value
+
+    async def bump(self):
+        self.value += 1
+
+
+class RedisGeneration:
+    """
+    An invalidation counter shared by every worker through Redis (or
+    anything that speaks its protocol), so ingest in one worker invalidates
+    the caches of all of them.
+    """
+
+    def __init__(self, url: str, key: str = GENERATION_KEY):
+        self.key = key
+        self._redis = redis_asyncio.from_url(url)
+
+    async def get(self) -> int:
+        return int(await self._redis.get(self.key) or 0)
+
+    async def bump(self):
+        await self._redis.incr(self.key)
+
+
+class CacheEntry:
+    def __init__(self, generation: int, expires_at: float, body: bytes):
+        self.generation = generation
+        self.expires_at = expires_at
+        self.body = body
+
+
+class SearchCache:
+    """
+    An in-process LRU cache of serialised search responses, bounded by the
+    number of entries and by their total size, with a TTL.
+
+    Every entry is stamped with the generation counter as it was read before
+    Elasticsearch was queried. Ingest bumps the counter whenever it changes
+    the index, which makes every older entry stale at once; the counter can
+    live in Redis so all workers see the same value. If the counter cannot
+    be read, the cache is bypassed rather than risk serving stale results.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, max_entry_bytes: int, ttl: float, refresh_delay: float, generation):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.refresh_delay = refresh_delay
+        self.generation = generation
+        self.size = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._pending_bump: Optional[asyncio.Task] = None
+        self._bump_due = 0.0
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "skipped": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def key(namespace: str, params: dict) -> str:
+        encoded = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+        return namespace + ":" + hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Tuple[Optional[bytes], Optional[int]]:
+        """
+        Returns (cached body or None, current generation). Pass the
+        generation to `put` once the result has been computed; it is None
+        when the cache is disabled or unavailable.
+        """
+        if not self.enabled:
+            return None, None
+        try:
+            generation = await self.generation.get()
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Search cache generation unavailable, bypassing the cache: {e}")
+            return None, None
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation == generation and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.body, generation
+        if entry is not None:
+            self._stats["stale"] += 1
+            self._remove(key)
+        self._stats["misses"] += 1
+        return None, generation
+
+    def put(self, key: str, generation: Optional[int], body: bytes):
+        if generation is None:
+            return
+        if len(body) > self.max_entry_bytes:
+            self._stats["skipped"] += 1
+            return
+        self._remove(key)
+        self._entries[key] = CacheEntry(generation, time.monotonic() + self.ttl, body)
+        self.size += len(body)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    async def invalidate(self):
+        """
+        Called after ingest has written to the index. The counter is bumped
+        now and once more after the index refresh interval, because a search
+        run before the refresh may still see the old data and would
+        otherwise be cached under the new generation.
+        """
+        try:
+            await self.generation.bump()
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Could not invalidate the search cache: {e}")
+        self._bump_due = time.monotonic() + self.refresh_delay
+        if self._pending_bump is None or self._pending_bump.done():
+            self._pending_bump = asyncio.create_task(self._bump_after_refresh())
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "shared": not isinstance(self.generation, LocalGeneration),
+        }
+
+    async def _bump_after_refresh(self):
+        # Later invalidations push the deadline back; one task covers them.
+        while self._bump_due > time.monotonic():
+            await asyncio.sleep(self._bump_due - time.monotonic())
+        try:
+            await self.generation.bump()
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"Could not invalidate the search cache: {e}")
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+
+def _generation_counter():
+    if not settings.SEARCH_CACHE_REDIS_URL:
+        return LocalGeneration()
+    if redis_asyncio is None:
+        print("SEARCH_CACHE_REDIS_URL is set but the redis package is not installed; invalidation is per worker.")
+        return LocalGeneration()
+    return RedisGeneration(settings.SEARCH_CACHE_REDIS_URL)
+
+
+search_cache = SearchCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    max_bytes=settings.SEARCH_CACHE_MAX_BYTES,
+    max_entry_bytes=settings.SEARCH_CACHE_MAX_ENTRY_BYTES,
+    ttl=settings.SEARCH_CACHE_TTL,
+    refresh_delay=settings.SEARCH_CACHE_REFRESH_DELAY,
+    generation=_generation_counter(),
+)
@@ -0,0 +1,198 @@
+import base64
+import json
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.models.document import DocumentSearchRequest
+
+SEARCH_FIELDS = ["content", "metadata.filename_original", "metadata.client_project_name"]
+
+# Facets: request field -> keyword field, as mapped in DOCUMENT_MAPPING. The
+# same fields back the request's exact-match filters.
+FACET_FIELDS = {
+    "client_project": "metadata.client_project_name",
+    "doc_type": "metadata.doc_type",
+    "status": "metadata.status",
+    "language": "metadata.language",
+}
+DATE_FACET = "modified_date"
+
+
+def build_search_query(search_params: DocumentSearchRequest, passages: bool = False) -> dict:
+    """
+    Builds the Elasticsearch query for a search request: the free-text query
+    is scored, the project, type, status, language and date filters are not. Shared by search
+    and export so an export contains exactly what the search shows. With
+    passages, the best matching passages of each hit are returned as inner hits.
+    """
+    query_body = {"bool": {"must": [], "filter": []}}
+    if search_params.query:
+        # A document scores as its whole content or as its best passage,
+        # whichever is higher, so one matching page of a long document is
+        # not diluted by the rest of it.
+        query_body["bool"]["must"].append({"dis_max": {
+            "queries": [
+                {"multi_match": {"query": search_params.query, "fields": SEARCH_FIELDS}},
+                build_passage_query(search_params.query, inner_hits=passages),
+            ],
+            "tie_breaker": 0.3,
+        }})
+    for name, field in FACET_FIELDS.items():
+        value = getattr(search_params, name)
+        if value:
+            query_body["bool"]["filter"].append({"term": {field: value}})
+    if search_params.date_from or search_params.date_to:
+        date_range = {}
+        if search_params.date_from:
+            date_range["gte"] = search_params.date_from
+        if search_params.date_to:
+            date_range["lt"] = search_params.date_to
+        query_body["bool"]["filter"].append({"range": {"metadata.modified_date": date_range}})
+    return query_body
+
+
+def build_search_sort(search_params: DocumentSearchRequest) -> List[dict]:
+    """
+    A total order for search_after paging: relevance when there is a query,
+    then newest first, then document_id to break ties. Documents from before
+    document_id was stored get one from the index maintenance backfill, and
+    cursors are only handed out once it has finished: until then those
+    documents would all tie.
+    """
+    sort = [{"_score": "desc"}] if search_params.query else []
+    return sort + [{"metadata.modified_date": {"order": "desc"}}, {"document_id": {"order": "asc"}}]
+
+
+def build_highlight(search_params: DocumentSearchRequest) -> Optional[dict]:
+    """
+    Highlighting of query matches in content. Fragments are HTML-escaped,
+    with matches wrapped in <mark>, so they are safe to render as HTML.
+    """
+    if not search_params.query:
+        return None
+    return {
+        "fields": {"content": {
+            "fragment_size": settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE,
+            "number_of_fragments": settings.SEARCH_HIGHLIGHT_FRAGMENTS,
+        }},
+        "encoder": "html",
+        "pre_tags": ["<mark>"],
+        "post_tags": ["</mark>"],
+        # Long documents are only highlighted within their first part rather
+        # than failing the search.
+        "max_analyzed_offset": settings.SEARCH_HIGHLIGHT_MAX_ANALYZED_OFFSET,
+    }
+
+
+def build_passage_query(query: str, inner_hits: bool = False) -> dict:
+    """
+    Matches the query against the passages of a document, scoring it by its
+    best one. The inner hits carry the page, offset and a highlighted
+    fragment of the top passages.
+    """
+    nested = {
+        "path": "passages",
+        "query": {"match": {"passages.text": query}},
+        "score_mode": "max",
+        # Indices from before passages have no such field.
+        "ignore_unmapped": True,
+    }
+    if inner_hits:
+        nested["inner_hits"] = {
+            "size": settings.SEARCH_PASSAGES,
+            "_source": False,
+            "docvalue_fields": ["passages.page", "passages.offset"],
+            "highlight": {
+                "fields": {"passages.text": {
+                    "fragment_size": settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE,
+                    "number_of_fragments": 1,
+                    "no_match_size": settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE,
+                }},
+                "encoder": "html",
+                "pre_tags": ["<mark>"],
+                "post_tags": ["</mark>"],
+            },
+        }
+    return {"nested": nested}
+
+
+def parse_passages(hit: dict) -> List[dict]:
+    """
+    The passages of a search hit, from the inner hits of build_passage_query.
+    """
+    inner = hit.get("inner_hits", {}).get("passages", {}).get("hits", {}).get("hits", [])
+    passages = []
+    for passage in inner:
+        fields = passage.get("fields", {})
+        passages.append({
+            "page": (fields.get("passages.page") or [None])[0],
+            "offset": (fields.get("passages.offset") or [None])[0],
+            "score": passage.get("_score"),
+            "highlights": passage.get("highlight", {}).get("passages.text", []),
+        })
+    return passages
+
+
+def build_facet_aggs() -> dict:
+    """
+    Terms aggregations over the facet fields and a histogram of
+    modified_date, computed in the same request as the hits.
+    """
+    aggs = {
+        name: {"terms": {"field": field, "size": settings.FACET_SIZE}}
+        for name, field in FACET_FIELDS.items()
+    }
+    aggs[DATE_FACET] = {
+        "date_histogram": {
+            "field": "metadata.modified_date",
+            "calendar_interval": settings.FACET_DATE_INTERVAL,
+            "min_doc_count": 1,
+        }
+    }
+    return aggs
+
+
+def parse_facets(aggregations: dict) -> Dict[str, List[dict]]:
+    """
+    Turns the aggregations built by build_facet_aggs into
+    {facet: [{"value": ..., "count": ...}]}.
+    """
+    facets = {}
+    for name in list(FACET_FIELDS) + [DATE_FACET]:
+        buckets = aggregations.get(name, {}).get("buckets", [])
+        facets[name] = [
+            {"value": bucket.get("key_as_string", bucket["key"]), "count": bucket["doc_count"]}
+            for bucket in buckets
+        ]
+    return facets
+
+
+def encode_cursor(sort_values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(sort_values, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+    """
+    Returns the search_after values in a cursor. Raises ValueError when the
+    cursor was not produced by encode_cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+def search_cache_params(search_params: DocumentSearchRequest) -> dict:
+    """
+    The request as a search cache key: unset fields are dropped and the
+    query's white space is normalised, so equivalent searches share an entry.
+    """
+    params = search_params.model_dump(mode="json", exclude={"use_cache"}, exclude_none=True)
+    if "query" in params:
+        params["query"] = " ".join(params["query"].split())
+    return params
@@ -0,0 +1,296 @@
+import asyncio
+import base64
+import hashlib
+import re
+import struct
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from app.core.config import settings
+from app.db.indices import READ_ALIAS
+
+WORD = re.compile(r"\w+")
+
+MASK64 = (1 << 64) - 1
+# Base of the rolling shingle hash and the multiplier of the bit mixer.
+ROLLING_BASE = 0x100000001B3
+MIXER = 0xBF58476D1CE4E5B9
+# An empty slot borrows from the next filled one, shifted by this much per
+# slot of distance, so borrowed values do not look like native ones.
+BORROW_OFFSET = 0x9E3779B9
+
+
+def similarity_scheme() -> str:
+    """
+    Names the signature parameters. Signatures are only comparable when
+    their schemes match; changing a parameter needs a reprocess job.
+    """
+    return f"oph-{settings.SIMILARITY_NUM_PERM}-{settings.SIMILARITY_BANDS}-{settings.SIMILARITY_SHINGLE_SIZE}"
+
+
+def shingle_hashes(content: str, shingle_size: int) -> List[int]:
+    """
+    64-bit hashes of the content's overlapping word n-grams (lower-cased),
+    computed as a rolling hash over per-word CRCs so each shingle costs a
+    few integer operations instead of a hash call.
+    """
+    words = WORD.findall(content.lower())
+    if len(words) < shingle_size:
+        return []
+    word_hash = {}
+    ids = [word_hash.get(word) or word_hash.setdefault(word, zlib.crc32(word.encode("utf-8")) + 1) for word in words]
+    leading = pow(ROLLING_BASE, shingle_size - 1, 1 << 64)
+    rolling = 0
+    for word_id in ids[:shingle_size]:
+        rolling = (rolling * ROLLING_BASE + word_id) & MASK64
+    hashes = []
+    for position in range(shingle_size, len(ids) + 1):
+        # Mixed so that the low and high bits are both well spread.
+        mixed = rolling ^ (rolling >> 31)
+        mixed = (mixed * MIXER) & MASK64
+        hashes.append(mixed ^ (mixed >> 29))
+        if position < len(ids):
+            rolling = ((rolling - ids[position - shingle_size] * leading) * ROLLING_BASE + ids[position]) & MASK64
+    return hashes
+
+
+def minhash_signature(hashes: List[int], num_perm: int) -> Optional[List[int]]:
+    """
+    A one-permutation MinHash signature: each shingle hash is routed to one
+    of `num_perm` slots by its value and every slot keeps its minimum, so
+    a signature costs one pass over the shingles rather than one per slot.
+    Empty slots are filled from the next filled slot (rotation
+    densification). The share of equal slots between two signatures
+    estimates the Jaccard similarity of the shingle sets.
+    """
+    if not hashes:
+        return None
+    empty = MASK64
+    slots = [empty] * num_perm
+    for value in hashes:
+        slot = value % num_perm
+        value //= num_perm
+        if value < slots[slot]:
+            slots[slot] = value
+    if empty in slots:
+        dense = list(slots)
+        for slot in range(num_perm):
+            if slots[slot] != empty:
+                continue
+            distance = 1
+            while slots[(slot + distance) % num_perm] == empty:
+                distance += 1
+            dense[slot] = (slots[(slot + distance) % num_perm] + distance * BORROW_OFFSET) & MASK64
+        slots = dense
+    # 32 bits per slot keep accidental equality negligible at half the size.
+    return [slot & 0xFFFFFFFF for slot in slots]
+
+
+def band_tokens(signature: List[int], bands: int) -> List[str]:
+    """
+    The LSH buckets of a signature: it is cut into `bands` bands and each
+    band hashed to a token. Documents sharing any token are candidates;
+    with b bands of r slots a pair of similarity s shares one with
+    probability 1 - (1 - s^r)^b.
+    """
+    rows = len(signature) // bands
+    tokens = []
+    for band in range(bands):
+        packed = struct.pack(f"<{rows}I", *signature[band * rows:(band + 1) * rows])
+        tokens.append(f"{band:02x}{hashlib.blake2b(packed, digest_size=8).hexdigest()}")
+    return tokens
+
+
+def compute_similarity(content: str) -> Optional[dict]:
+    """
+    The similarity fields stored with a document: its packed signature and
+    its LSH band tokens. None when the content is too short to shingle.
+    """
+    hashes = shingle_hashes(content[:settings.SIMILARITY_MAX_CHARS], settings.SIMILARITY_SHINGLE_SIZE)
+    signature = minhash_signature(hashes, settings.SIMILARITY_NUM_PERM)
+    if signature is None:
+        return None
+    return {
+        "scheme": similarity_scheme(),
+        "minhash": base64.b64encode(struct.pack(f"<{len(signature)}I", *signature)).decode("ascii"),
+        "bands": band_tokens(signature, settings.SIMILARITY_BANDS),
+    }
+
+
+def unpack_signature(similarity: dict) -> List[int]:
+    packed = base64.b64decode(similarity["minhash"])
+    return list(struct.unpack(f"<{len(packed) // 4}I", packed))
+
+
+def estimate_similarity(first: Optional[dict], second: Optional[dict]) -> Optional[float]:
+    """
+    Estimated Jaccard similarity of two documents' shingle sets, or None
+    when either has no signature or they were made with different schemes.
+    """
+    if not first or not second or first.get("scheme") != second.get("scheme"):
+        return None
+    a, b = unpack_signature(first), unpack_signature(second)
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _candidate_query(document_id: str, similarity: Optional[dict], family: Optional[str] = None) -> dict:
+    # One clause per band, so documents sharing more buckets rank first.
+    should = [{"term": {"similarity.bands": token}} for token in (similarity or {}).get("bands", [])]
+    if family:
+        should.append({"term": {"version_family": {"value": family, "boost": 100.0}}})
+        should.append({"ids": {"values": [family], "boost": 100.0}})
+    return {"bool": {"should": should, "minimum_should_match": 1, "must_not": [{"ids": {"values": [document_id]}}]}}
+
+
+async def find_similar(client: AsyncElasticsearch, document_id: str, similarity: Optional[dict],
+                       family: Optional[str] = None, size: Optional[int] = None) -> List[dict]:
+    """
+    Documents sharing an LSH bucket with the signature (or, given a family,
+    in that family), each with its estimated similarity, best first. Those
+    in neither the family nor above SIMILARITY_THRESHOLD are dropped, as
+    sharing a bucket only makes a document a candidate.
+    """
+    query = _candidate_query(document_id, similarity, family)
+    if not query["bool"]["should"]:
+        return []
+    response = await client.search(
+        index=READ_ALIAS,
+        query=query,
+        size=size or settings.SIMILARITY_MAX_CANDIDATES,
+        source_includes=["metadata", "similarity", "version_family"],
+    )
+    matches = []
+    for hit in response["hits"]["hits"]:
+        source = hit["_source"]
+        estimate = estimate_similarity(similarity, source.get("similarity"))
+        same_family = family is not None and family in (source.get("version_family"), hit["_id"])
+        if not same_family and (estimate is None or estimate < settings.SIMILARITY_THRESHOLD):
+            continue
+        matches.append({
+            "id": hit["_id"],
+            "similarity": estimate,
+            "same_family": same_family,
+            "version_family": source.get("version_family"),
+            "metadata": source.get("metadata", {}),
+        })
+    matches.sort(key=lambda match: match["similarity"] or 0.0, reverse=True)
+    return matches
+
+
+class RecentSignatures:
+    """
+    The signatures and families of documents given a family in the last
+    `retention` seconds, bucketed by band token like the index. Such a
+    document may still be in the ingest queue or not yet searchable, so
+    near-duplicates ingested right after it would not find it in
+    Elasticsearch.
+    """
+
+    def __init__(self, retention: float, max_documents: int):
+        self.retention = retention
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[str, tuple]" = OrderedDict()
+        self._buckets = defaultdict(set)
+
+    def add(self, document_id: str, similarity: dict, family: str):
+        self._remove(document_id)
+        self._documents[document_id] = (time.monotonic(), similarity, family)
+        for token in similarity["bands"]:
+            self._buckets[token].add(document_id)
+        self._expire()
+
+    def matches(self, document_id: str, similarity: dict) -> List[dict]:
+        """
+        Recent documents at or above SIMILARITY_THRESHOLD, shaped like the
+        results of find_similar.
+        """
+        self._expire()
+        candidates = set().union(*(self._buckets.get(token, ()) for token in similarity["bands"])) - {document_id}
+        matches = []
+        for candidate in candidates:
+            _, other, family = self._documents[candidate]
+            estimate = estimate_similarity(similarity, other)
+            if estimate is not None and estimate >= settings.SIMILARITY_THRESHOLD:
+                matches.append({"id": candidate, "similarity": estimate, "version_family": family})
+        return matches
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.retention
+        while self._documents:
+            document_id, (added_at, _, _) = next(iter(self._documents.items()))
+            if added_at >= cutoff and len(self._documents) <= self.max_documents:
+                break
+            self._remove(document_id)
+
+    def _remove(self, document_id: str):
+        entry = self._documents.pop(document_id, None)
+        if entry is None:
+            return
+        for token in entry[1]["bands"]:
+            bucket = self._buckets.get(token)
+            if bucket is not None:
+                bucket.discard(document_id)
+                if not bucket:
+                    del self._buckets[token]
+
+
+class VersionFamilies:
+    """
+    Assigns ingested documents to version families: a document joins the
+    family of the most similar document above the threshold (a document
+    that has none yet started its own, named by its id), or else starts a
+    new family named by its own id.
+
+    Candidates come from Elasticsearch and from the documents this worker
+    assigned recently (see RecentSignatures), so versions uploaded together,
+    in one batch or one after another, end up in one family. Families are
+    only assigned at ingest and never merged later; near-duplicates ingested
+    at the same moment through different workers can still start separate
+    families (the versions endpoint finds them regardless).
+    """
+
+    def __init__(self, concurrency: int, recent: RecentSignatures):
+        self.recent = recent
+        self._lookups = asyncio.Semaphore(concurrency)
+
+    async def lookup(self, client: AsyncElasticsearch, document_id: str, similarity: Optional[dict]) -> List[dict]:
+        """
+        The indexed near-duplicates of a document. Lookup errors count as
+        none; ingest does not fail over them.
+        """
+        if similarity is None:
+            return []
+        try:
+            async with self._lookups:
+                return await find_similar(client, document_id, similarity)
+        except Exception as e:
+            print(f"Could not look up near-duplicates of {document_id}: {e}")
+            return []
+
+    def assign(self, document_id: str, similarity: Optional[dict], indexed: List[dict]) -> str:
+        """
+        Picks the family from the indexed matches (see lookup) and the recent
+        documents, and records the document as recent. Documents must be
+        assigned in ingest order for earlier ones to be found.
+        """
+        if similarity is None:
+            return document_id
+        # A recent entry is newer than the indexed copy of the same document.
+        matches = {match["id"]: match for match in indexed}
+        matches.update((match["id"], match) for match in self.recent.matches(document_id, similarity))
+        family = document_id
+        if matches:
+            best = max(matches.values(), key=lambda match: match["similarity"] or 0.0)
+            family = best["version_family"] or best["id"]
+        self.recent.add(document_id, similarity, family)
+        return family
+
+
+version_families = VersionFamilies(
+    concurrency=settings.SIMILARITY_LOOKUP_CONCURRENCY,
+    recent=RecentSignatures(retention=settings.SIMILARITY_RECENT_SECONDS, max_documents=settings.SIMILARITY_RECENT_MAX),
+)
@@ -0,0 +1,116 @@
+"""
+Micro-benchmark: the single-pass RulesEngine against the original
+lowercase-and-scan `_classify_document` implementation.
+
+Run from the backend directory:
+
+    SECRET_KEY=x ELASTICSEARCH_HOST=localhost python -m benchmarks.bench_classifier
+"""
+import random
+import time
+
+from app.services.classifier import ClassificationRule, RulesEngine, DEFAULT_RULES_PATH
+
+FILLER = (
+    "The parties acknowledge the terms set out in the schedules hereto and agree "
+    "that each obligation shall survive termination for the period stated. "
+)
+
+
+# A larger rule set of the kind we expect to grow into, to show how each
+# implementation scales with the number of keywords.
+EXTENDED_KEYWORDS = {
+    "AGMT": ["agreement", "contract", "amendment", "addendum", "lease", "deed"],
+    "NDA": ["non-disclosure", "confidentiality agreement"],
+    "LTR": ["letter", "engagement letter"],
+    "MEMO": ["memorandum", "memo"],
+    "INV": ["invoice", "purchase order", "statement of work", "bill of sale"],
+    "PLD": ["affidavit", "pleading", "motion", "subpoena", "power of attorney"],
+    "MIN": ["minutes", "resolution", "settlement", "release"],
+}
+
+
+def extended_engine():
+    rules = [
+        ClassificationRule("doc_type", value, keywords, priority=len(EXTENDED_KEYWORDS) - rank)
+        for rank, (value, keywords) in enumerate(EXTENDED_KEYWORDS.items())
+    ]
+    rules += [
+        ClassificationRule("status", "DRAFT", ["draft", "for review"], priority=2),
+        ClassificationRule("status", "EXECUTED", ["executed", "signed"], priority=1),
+    ]
+    return RulesEngine(rules, {"doc_type": "MISC", "status": "PROCESSED"})
+
+
+def legacy_extended_classify(content):
+    # The legacy approach extended the obvious way: one scan per keyword.
+    content_lower = content.lower()
+    result = {"doc_type": "MISC", "status": "PROCESSED"}
+    for value, keywords in EXTENDED_KEYWORDS.items():
+        if any(keyword in content_lower for keyword in keywords):
+            result["doc_type"] = value
+            break
+    if "draft" in content_lower or "for review" in content_lower:
+        result["status"] = "DRAFT"
+    elif "executed" in content_lower or "signed" in content_lower:
+        result["status"] = "EXECUTED"
+    return result
+
+
+def legacy_classify(content):
+    result = {}
+    content_lower = content.lower()
+    if "agreement" in content_lower or "contract" in content_lower:
+        result['doc_type'] = "AGMT"
+    elif "letter" in content_lower:
+        result['doc_type'] = "LTR"
+    else:
+        result['doc_type'] = "MISC"
+    if "draft" in content_lower or "for review" in content_lower:
+        result['status'] = "DRAFT"
+    elif "executed" in content_lower or "signed" in content_lower:
+        result['status'] = "EXECUTED"
+    else:
+        result['status'] = "PROCESSED"
+    return result
+
+
+def build_corpus(seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for size in (2_000, 50_000, 1_000_000, 5_000_000):
+        body = (FILLER * (size // len(FILLER) + 1))[:size]
+        for keyword in ("", "Draft Agreement", "Signed letter"):
+            if keyword:
+                at = rng.randrange(len(body))
+                corpus.append((size, keyword, body[:at] + f" {keyword} " + body[at:]))
+            else:
+                corpus.append((size, "none", body))
+    return corpus
+
+
+def timed(func, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    return (time.perf_counter() - start) / repeat
+
+
+def compare(title, legacy_func, engine):
+    print(title)
+    print(f"{'size':>10} {'keyword':>16} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8}")
+    for size, keyword, content in build_corpus():
+        repeat = max(1, 2_000_000 // size)
+        legacy = timed(legacy_func, content, repeat)
+        compiled = timed(engine.classify, content, repeat)
+        print(f"{size:>10} {keyword:>16} {legacy * 1000:>10.3f} {compiled * 1000:>10.3f} {legacy / compiled:>7.2f}x")
+    print()
+
+
+def main():
+    compare("Default rules", legacy_classify, RulesEngine.from_file(DEFAULT_RULES_PATH))
+    compare("Extended rules", legacy_extended_classify, extended_engine())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: streaming export throughput and peak memory.
+
+Drives ExportCursor and stream_export against a synthetic client that
+generates hits page by page, so the numbers show the cost of the export
+code itself. Peak memory should not depend on the number of rows.
+
+Run from the backend directory:
+
+    SECRET_KEY=x ELASTICSEARCH_HOST=localhost python -m benchmarks.bench_export [rows ...]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from app.services.export import ExportCursor, stream_export
+
+
+class SyntheticClient:
+    """
+    Answers point-in-time searches with `rows` generated hits.
+    """
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    async def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit"}
+
+    async def close_point_in_time(self, id):
+        return {}
+
+    async def search(self, size, search_after=None, **kwargs):
+        start = search_after[0] + 1 if search_after else 0
+        hits = [
+            {
+                "_id": f"doc-{n}",
+                "sort": [n],
+                "_source": {"metadata": {
+                    "filename_corpus": f"2024-01-01_ACME_AGMT_{n}.docx",
+                    "filename_original": f"Supply agreement {n}.docx",
+                    "client_project_name": "ACME",
+                    "doc_type": "AGMT",
+                    "status": "EXECUTED",
+                    "modified_date": "2024-01-01T10:00:00",
+                    "language": "en",
+                }},
+            }
+            for n in range(start, min(start + size, self.rows))
+        ]
+        return {"pit_id": "pit", "hits": {"hits": hits}}
+
+
+async def run(rows: int, export_format: str):
+    cursor = ExportCursor(SyntheticClient(rows), {"match_all": {}}, page_size=1000, keep_alive="1m")
+    await cursor.open()
+    written = 0
+    async for chunk in stream_export(cursor, export_format):
+        written += len(chunk)
+    return written
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]
+    print(f"{'format':<7} {'rows':>9} {'output':>10} {'rows/s':>10} {'peak memory':>12}")
+    for export_format in ("csv", "ndjson"):
+        for rows in sizes:
+            tracemalloc.start()
+            start = time.perf_counter()
+            written = asyncio.run(run(rows, export_format))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{export_format:<7} {rows:>9,d} {written / 1e6:8.1f}MB {rows / elapsed:10,.0f} {peak / 1e6:10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: language identification accuracy and latency on a mixed-language
+corpus, comparing the configured identifier with the original
+`detect(content[:500])` call.
+
+Run from the backend directory:
+
+    SECRET_KEY=x ELASTICSEARCH_HOST=localhost python -m benchmarks.bench_language
+"""
+import random
+import time
+
+from langdetect import detect
+
+from app.services.language import build_language_identifier
+
+PARAGRAPHS = {
+    "en": [
+        "This agreement is made between the parties named below and sets out the terms on which the services will be provided.",
+        "The supplier shall deliver the goods to the address stated in the order within thirty days of receiving payment.",
+        "Either party may terminate this contract by giving written notice to the other party at least one month in advance.",
+        "We are writing to confirm the arrangements discussed at our meeting last week regarding the transfer of the property.",
+    ],
+    "id": [
+        "Perjanjian ini dibuat oleh dan antara para pihak yang disebutkan di bawah ini dan mengatur syarat pemberian jasa.",
+        "Pemasok wajib mengirimkan barang ke alamat yang tercantum dalam pesanan dalam waktu tiga puluh hari setelah pembayaran diterima.",
+        "Masing-masing pihak dapat mengakhiri kontrak ini dengan memberikan pemberitahuan tertulis kepada pihak lainnya paling lambat satu bulan sebelumnya.",
+        "Dengan surat ini kami menegaskan kembali pengaturan yang telah dibahas dalam pertemuan kita minggu lalu mengenai pengalihan properti tersebut.",
+    ],
+    "nl": [
+        "Deze overeenkomst wordt gesloten tussen de hieronder genoemde partijen en bevat de voorwaarden waaronder de diensten worden verleend.",
+        "De leverancier levert de goederen binnen dertig dagen na ontvangst van de betaling af op het in de bestelling vermelde adres.",
+        "Elk van de partijen kan deze overeenkomst opzeggen door de andere partij ten minste een maand van tevoren schriftelijk op de hoogte te stellen.",
+    ],
+    "fr": [
+        "Le présent contrat est conclu entre les parties désignées ci-dessous et fixe les conditions dans lesquelles les services seront fournis.",
+        "Le fournisseur livrera les marchandises à l'adresse indiquée dans la commande dans un délai de trente jours après réception du paiement.",
+        "Chacune des parties peut résilier le présent contrat en adressant un préavis écrit à l'autre partie au moins un mois à l'avance.",
+    ],
+    "de": [
+        "Dieser Vertrag wird zwischen den unten genannten Parteien geschlossen und regelt die Bedingungen, unter denen die Leistungen erbracht werden.",
+        "Der Lieferant liefert die Waren innerhalb von dreißig Tagen nach Zahlungseingang an die in der Bestellung angegebene Adresse.",
+        "Jede Partei kann diesen Vertrag durch schriftliche Mitteilung an die andere Partei mit einer Frist von einem Monat kündigen.",
+    ],
+    "es": [
+        "El presente contrato se celebra entre las partes que se indican a continuación y establece las condiciones de prestación de los servicios.",
+        "El proveedor entregará las mercancías en la dirección indicada en el pedido dentro de los treinta días siguientes a la recepción del pago.",
+        "Cualquiera de las partes podrá resolver este contrato mediante notificación por escrito a la otra parte con un mes de antelación.",
+    ],
+}
+
+LETTERHEAD = (
+    "SMITH & PARTNERS LAW OFFICES, Level 12, Corporate Tower, Telephone and fax numbers on request, "
+    "registered office address and company registration details available from our website. "
+)
+
+
+def build_corpus(size=600, seed=7):
+    """
+    Returns (expected_language, content) pairs in three shapes:
+    single-language documents of varying length behind an English
+    letterhead; long documents that open with a cover letter in another
+    language; and bilingual documents in which the expected language
+    dominates two to one.
+    """
+    rng = random.Random(seed)
+    languages = sorted(PARAGRAPHS)
+    corpus = []
+    for i in range(size):
+        language = languages[i % len(languages)]
+        other = rng.choice([other for other in languages if other != language])
+        kind = i % 3
+        if kind == 0:
+            paragraphs = [rng.choice(PARAGRAPHS[language]) for _ in range(rng.choice((1, 4, 20, 200)))]
+            body = LETTERHEAD + " ".join(paragraphs)
+        elif kind == 1:
+            cover = [rng.choice(PARAGRAPHS[other]) for _ in range(4)]
+            paragraphs = [rng.choice(PARAGRAPHS[language]) for _ in range(rng.choice((20, 200)))]
+            body = " ".join(cover + paragraphs)
+        else:
+            mixed = []
+            for _ in range(rng.choice((4, 20, 200))):
+                mixed.append(rng.choice(PARAGRAPHS[language]))
+                mixed.append(rng.choice(PARAGRAPHS[language]))
+                mixed.append(rng.choice(PARAGRAPHS[other]))
+            body = " ".join(mixed)
+        corpus.append((language, body))
+    return corpus
+
+
+def legacy_identify(content):
+    try:
+        return detect(content[:500])
+    except Exception:
+        return "unknown"
+
+
+def run(name, identify, corpus):
+    correct = 0
+    answers = []
+    start = time.perf_counter()
+    for expected, content in corpus:
+        answer = identify(content)
+        answers.append(answer)
+        if answer == expected:
+            correct += 1
+    elapsed = time.perf_counter() - start
+    # A second run shows how often the same document gets a different answer.
+    unstable = sum(1 for (_, content), answer in zip(corpus, answers) if identify(content) != answer)
+    print(
+        f"{name:<28} accuracy {correct / len(corpus):6.1%}   {elapsed / len(corpus) * 1000:7.3f} ms/doc"
+        f"   {unstable} unstable"
+    )
+
+
+def main():
+    corpus = build_corpus()
+    identifier = build_language_identifier()
+    start = time.perf_counter()
+    identifier.load()
+    print(f"Profile load: {(time.perf_counter() - start) * 1000:.0f} ms")
+    legacy_identify("warm up langdetect's lazily loaded profiles")
+
+    run("legacy detect[:500]", legacy_identify, corpus)
+    run(type(identifier).__name__, lambda content: identifier.identify(content).language, corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark: latency and precision of the near-duplicate stage, and what
+finding a document's versions costs against a large index.
+
+The first table times computing a document's similarity fields (shingling,
+MinHash signature, band tokens) by document size. The second generates
+families of versions of base documents (each version a copy with a share
+of its words replaced) and unrelated documents written on shared templates,
+which are the hard negatives: they repeat the same boilerplate. Each
+document is looked up through its LSH bands as ingest does, and the pairs
+kept (estimate at or above SIMILARITY_THRESHOLD) are compared with the true
+Jaccard similarity of the shingle sets.
+
+The last table puts those documents among `background` others (1M by
+default) in an in-memory stand-in for the band index, and compares the band
+lookup with comparing signatures against every indexed document.
+
+Run from the backend directory:
+
+    SECRET_KEY=x ELASTICSEARCH_HOST=localhost python -m benchmarks.bench_similarity [background] [families]
+"""
+import base64
+import random
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from app.core.config import settings
+from app.services.similarity import (
+    band_tokens, compute_similarity, estimate_similarity, minhash_signature, shingle_hashes, unpack_signature,
+)
+
+VOCABULARY = [f"word{i}" for i in range(20000)]
+EDIT_RATES = [0.0, 0.005, 0.01, 0.02, 0.05, 0.1]
+VERSIONS_PER_FAMILY = 4
+TEMPLATES = 20
+
+
+def words(rng: random.Random, count: int) -> list:
+    return [rng.choice(VOCABULARY) for _ in range(count)]
+
+
+def edited(rng: random.Random, base: list, rate: float) -> list:
+    version = list(base)
+    for _ in range(int(len(version) * rate)):
+        version[rng.randrange(len(version))] = rng.choice(VOCABULARY)
+    return version
+
+
+def make_corpus(rng: random.Random, families: int) -> list:
+    # (family, text) pairs; a family of None is a lone document.
+    templates = [words(rng, 400) for _ in range(TEMPLATES)]
+    corpus = []
+    for family in range(families):
+        base = rng.choice(templates) + words(rng, rng.randint(300, 1500))
+        for _ in range(VERSIONS_PER_FAMILY):
+            corpus.append((family, " ".join(edited(rng, base, rng.choice(EDIT_RATES)))))
+        # Same boilerplate, different body.
+        corpus.append((None, " ".join(rng.choice(templates) + words(rng, rng.randint(300, 1500)))))
+    return corpus
+
+
+def jaccard(first: set, second: set) -> float:
+    return len(first & second) / len(first | second)
+
+
+def signature_latency():
+    rng = random.Random(1)
+    print(f"{'words':>10} {'signature':>12}")
+    for count in (1000, 10000, 100000):
+        content = " ".join(words(rng, count))
+        runs = max(1, 20000 // count)
+        start = time.perf_counter()
+        for _ in range(runs):
+            compute_similarity(content)
+        print(f"{count:>10} {(time.perf_counter() - start) / runs * 1e3:10.2f}ms")
+
+
+def precision(corpus: list):
+    shingles = [set(shingle_hashes(text, settings.SIMILARITY_SHINGLE_SIZE)) for _, text in corpus]
+    similarities = [compute_similarity(text) for _, text in corpus]
+    buckets = defaultdict(list)
+    for index, similarity in enumerate(similarities):
+        for token in similarity["bands"]:
+            buckets[token].append(index)
+
+    threshold = settings.SIMILARITY_THRESHOLD
+    kept, candidates = set(), 0
+    for index, similarity in enumerate(similarities):
+        matches = {other for token in similarity["bands"] for other in buckets[token] if other != index}
+        candidates += len(matches)
+        for other in matches:
+            if estimate_similarity(similarity, similarities[other]) >= threshold:
+                kept.add((min(index, other), max(index, other)))
+
+    # Pairs outside a family or template group share almost no shingles, so
+    # only those within one are checked for being true near-duplicates.
+    true_pairs = set()
+    for first in range(len(corpus)):
+        for second in range(first + 1, min(len(corpus), first + VERSIONS_PER_FAMILY + 1)):
+            if jaccard(shingles[first], shingles[second]) >= threshold:
+                true_pairs.add((first, second))
+    true_pairs |= {pair for pair in kept if jaccard(shingles[pair[0]], shingles[pair[1]]) >= threshold}
+    hits = len(kept & true_pairs)
+    errors = [abs(estimate_similarity(similarities[a], similarities[b]) - jaccard(shingles[a], shingles[b]))
+              for a, b in kept | true_pairs]
+
+    print(f"{'documents':>10} {'candidates':>11} {'true pairs':>11} {'kept':>6} {'precision':>10} {'recall':>8} {'mean error':>11}")
+    print(f"{len(corpus):>10} {candidates / len(corpus):>11.2f} {len(true_pairs):>11} {len(kept):>6} "
+          f"{hits / max(1, len(kept)):>10.3f} {hits / max(1, len(true_pairs)):>8.3f} {sum(errors) / max(1, len(errors)):>11.3f}")
+    return similarities
+
+
+def background_bands(rng: random.Random, background: int) -> list:
+    # Signatures of synthetic shingle sets, a third drawn from a pool shared
+    # by all documents (common phrases), as sorted token arrays per band.
+    pool = [rng.getrandbits(64) for _ in range(5000)]
+    bands = [array("Q") for _ in range(settings.SIMILARITY_BANDS)]
+    for _ in range(background):
+        hashes = rng.sample(pool, 100) + [rng.getrandbits(64) for _ in range(200)]
+        for band, token in enumerate(band_tokens(minhash_signature(hashes, settings.SIMILARITY_NUM_PERM), settings.SIMILARITY_BANDS)):
+            bands[band].append(int(token[2:], 16))
+    return [array("Q", sorted(band)) for band in bands]
+
+
+def lookup(similarities: list, background: int):
+    rng = random.Random(3)
+    start = time.perf_counter()
+    bands = background_bands(rng, background)
+    print(f"\n(background index of {background} documents built in {time.perf_counter() - start:.0f}s)")
+
+    start = time.perf_counter()
+    collisions = 0
+    for similarity in similarities:
+        for band, token in enumerate(similarity["bands"]):
+            value = int(token[2:], 16)
+            collisions += bisect_right(bands[band], value) - bisect_left(bands[band], value)
+    per_lookup = (time.perf_counter() - start) / len(similarities)
+
+    # The cost of comparing one signature with another, as brute force would
+    # for every indexed document.
+    signature = unpack_signature(similarities[0])
+    stored = [base64.b64encode(struct.pack(f"<{len(signature)}I", *signature)).decode("ascii")] * 1000
+    start = time.perf_counter()
+    for packed in stored:
+        sum(1 for x, y in zip(signature, unpack_signature({"minhash": packed})) if x == y)
+    per_comparison = (time.perf_counter() - start) / len(stored)
+
+    print(f"{'method':<24} {'per document':>14} {'background candidates':>22}")
+    print(f"{'LSH band lookup':<24} {per_lookup * 1e6:12.1f}us {collisions / len(similarities):>22.4f}")
+    print(f"{'brute-force comparison':<24} {per_comparison * background:13.1f}s {background:>22}")
+
+
+def main(background: int, families: int):
+    signature_latency()
+    print()
+    similarities = precision(make_corpus(random.Random(2), families))
+    lookup(similarities, background)
+
+
+if __name__ == "__main__":
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    main(*(arguments + [1000000, 200][len(arguments):]))
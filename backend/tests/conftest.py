@@ -0,0 +1,6 @@
+import os
+
+# Settings are read when app.core.config is imported; these are the ones
+# without defaults. Nothing here connects to Elasticsearch.
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ELASTICSEARCH_HOST", "localhost")
@@ -0,0 +1,146 @@
+import pytest
+
+import app.services.admission as admission_module
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(admission_module, "time", fake)
+    return fake
+
+
+def controller(max_concurrent=100, key_max_concurrent=100, key_rate=0.0, key_burst=1, retry_after=2):
+    return AdmissionController(max_concurrent, key_max_concurrent, key_rate, key_burst, retry_after)
+
+
+def admit(controller, key, times=1):
+    for _ in range(times):
+        controller.admit(key)
+
+
+def test_a_burst_is_admitted_then_the_rate_applies(clock):
+    admission = controller(key_rate=2.0, key_burst=3)
+    admit(admission, "a", 3)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.admit("a")
+    assert rejected.value.retry_after == 1
+    clock.now += 0.5
+    admission.admit("a")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("a")
+
+
+def test_tokens_refill_up_to_the_burst_only(clock):
+    admission = controller(key_rate=1.0, key_burst=2)
+    admit(admission, "a", 2)
+    clock.now += 3600
+    admit(admission, "a", 2)
+    with pytest.raises(AdmissionRejected):
+        admission.admit("a")
+
+
+def test_retry_after_covers_the_wait_for_a_token(clock):
+    admission = controller(key_rate=0.1, key_burst=1)
+    admission.admit("a")
+    clock.now += 2
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.admit("a")
+    assert rejected.value.retry_after == 8
+
+
+def test_each_key_has_its_own_bucket(clock):
+    admission = controller(key_rate=1.0, key_burst=1)
+    admission.admit("a")
+    admission.admit("b")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("a")
+
+
+def test_a_rate_of_zero_disables_the_bucket(clock):
+    admission = controller(key_rate=0, key_burst=1)
+    admit(admission, "a", 50)
+
+
+def test_rejected_requests_do_not_use_tokens(clock):
+    admission = controller(key_rate=1.0, key_burst=2, key_max_concurrent=1)
+    admission.admit("a")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("a")
+    admission.release("a")
+    # The second token is still there.
+    admission.admit("a")
+
+
+def test_per_key_concurrency_cap(clock):
+    admission = controller(key_max_concurrent=2, retry_after=7)
+    admit(admission, "a", 2)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.admit("a")
+    assert rejected.value.retry_after == 7
+    admission.release("a")
+    admission.admit("a")
+    assert admission.in_flight == 2
+
+
+def test_a_quiet_key_gets_in_while_a_busy_one_holds_the_server(clock):
+    admission = controller(max_concurrent=4)
+    admit(admission, "busy", 4)
+    # "quiet" has nothing in flight but still counts as a key wanting its
+    # share: 4 // 2 keys = 2 slots.
+    admit(admission, "quiet", 2)
+    with pytest.raises(AdmissionRejected):
+        admission.admit("quiet")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("busy")
+    assert admission.in_flight == 6
+
+
+def test_fair_share_shrinks_as_more_keys_are_active(clock):
+    admission = controller(max_concurrent=6)
+    admit(admission, "a", 6)
+    admit(admission, "b", 3)
+    # Three active keys: a share of two each.
+    admit(admission, "c", 2)
+    with pytest.raises(AdmissionRejected):
+        admission.admit("c")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("b")
+
+
+def test_below_the_global_cap_no_share_applies(clock):
+    admission = controller(max_concurrent=4)
+    admit(admission, "a", 3)
+    admission.admit("a")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("a")
+
+
+def test_the_fair_share_is_at_least_one(clock):
+    admission = controller(max_concurrent=2)
+    admit(admission, "a", 2)
+    admission.admit("b")
+    admission.admit("c")
+    with pytest.raises(AdmissionRejected):
+        admission.admit("c")
+
+
+def test_release_of_unknown_or_idle_keys_is_ignored(clock):
+    admission = controller(max_concurrent=2)
+    admission.release("never-seen")
+    admission.admit("a")
+    admission.release("a")
+    admission.release("a")
+    assert admission.in_flight == 0
+    admit(admission, "a", 2)
+    with pytest.raises(AdmissionRejected):
+        admission.admit("a")
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+from app.services.change_feed import ChangeFeed, format_event, stream_changes
+
+
+def publish(feed, count, client_project="acme", event_type="indexed"):
+    for number in range(count):
+        feed.publish(event_type, f"doc-{number}", {"client_project_name": client_project, "filename_original": "a.docx"})
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def parse(chunk):
+    lines = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+def collect(feed, last_event_id, count, client_project=None, heartbeat=5.0, while_streaming=None):
+    """
+    Reads `count` chunks from the stream, calling `while_streaming` once the
+    stream has subscribed, then closes it.
+    """
+    async def run():
+        stream = stream_changes(feed, last_event_id, client_project, heartbeat)
+        chunks = []
+        reader = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        if while_streaming:
+            while_streaming()
+        while True:
+            try:
+                chunks.append(await reader)
+            except StopAsyncIteration:
+                break
+            if len(chunks) == count:
+                break
+            reader = asyncio.ensure_future(stream.__anext__())
+        await stream.aclose()
+        return chunks
+    return asyncio.run(run())
+
+
+def test_events_reach_matching_subscribers():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    everything, acme, other = feed.subscribe(), feed.subscribe("acme"), feed.subscribe("other")
+    publish(feed, 2)
+    feed.publish("deleted", "doc-0")
+    assert [event["type"] for event in drain(everything)] == ["indexed", "indexed", "deleted"]
+    assert [event["document_id"] for event in drain(acme)] == ["doc-0", "doc-1", "doc-0"]
+    # Deletes carry no project, so everyone is told.
+    assert [event["type"] for event in drain(other)] == ["deleted"]
+
+
+def test_only_the_feed_metadata_fields_are_published():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    feed.publish("indexed", "doc", {"client_project_name": "acme", "content": "x" * 1000})
+    event = feed.since(f"{feed.epoch}-0")[0]
+    assert "content" not in event["metadata"]
+    assert event["metadata"]["client_project_name"] == "acme"
+
+
+def test_unsubscribed_clients_get_nothing():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    subscription = feed.subscribe()
+    feed.unsubscribe(subscription)
+    publish(feed, 1)
+    assert drain(subscription) == []
+    assert feed.stats()["subscribers"] == 0
+
+
+def test_a_slow_subscriber_is_reset_instead_of_buffering():
+    feed = ChangeFeed(capacity=10, subscriber_queue=3)
+    slow, fast = feed.subscribe(), feed.subscribe()
+    publish(feed, 3)
+    drain(fast)
+    publish(feed, 1)
+    assert drain(slow) == [None]
+    assert [event["seq"] for event in drain(fast)] == [4]
+
+
+def test_replay_after_the_last_seen_id():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    publish(feed, 5)
+    assert [event["seq"] for event in feed.since(f"{feed.epoch}-3")] == [4, 5]
+    assert feed.since(f"{feed.epoch}-5") == []
+    # A new client starts from now.
+    assert feed.since(None) == []
+
+
+def test_replay_is_refused_when_events_were_lost():
+    feed = ChangeFeed(capacity=3, subscriber_queue=10)
+    publish(feed, 5)
+    assert feed.stats()["buffered"] == 3
+    # Event 3 is the oldest kept, so a client that saw 2 can still catch up.
+    assert [event["seq"] for event in feed.since(f"{feed.epoch}-2")] == [3, 4, 5]
+    assert feed.since(f"{feed.epoch}-1") is None
+    # Another process, an id from the future, or garbage.
+    assert feed.since("restarted-5") is None
+    assert feed.since(f"{feed.epoch}-6") is None
+    assert feed.since(f"{feed.epoch}-x") is None
+
+
+def test_replay_from_an_empty_feed():
+    feed = ChangeFeed(capacity=3, subscriber_queue=10)
+    assert feed.since(f"{feed.epoch}-0") == []
+
+
+def test_the_stream_replays_then_goes_live():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    publish(feed, 3)
+    chunks = collect(feed, f"{feed.epoch}-1", 3, while_streaming=lambda: publish(feed, 1))
+    assert [parse(chunk)[1]["id"] for chunk in chunks] == [f"{feed.epoch}-{seq}" for seq in (2, 3, 4)]
+    assert chunks[0] == format_event(feed.since(f"{feed.epoch}-1")[0])
+    assert feed.stats()["subscribers"] == 0
+
+
+def test_the_stream_filters_the_replay_by_project():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    publish(feed, 2, client_project="other")
+    publish(feed, 1, client_project="acme")
+    chunks = collect(feed, f"{feed.epoch}-0", 1, client_project="acme")
+    assert parse(chunks[0])[1]["metadata"]["client_project_name"] == "acme"
+
+
+def test_the_stream_tells_a_client_that_missed_events_to_reset():
+    feed = ChangeFeed(capacity=2, subscriber_queue=10)
+    publish(feed, 5)
+    chunks = collect(feed, "restarted-1", 2, while_streaming=lambda: publish(feed, 1))
+    assert parse(chunks[0])[0] == "reset"
+    assert parse(chunks[1])[1]["id"] == f"{feed.epoch}-6"
+
+
+def test_events_published_during_the_replay_are_sent_once():
+    class PublishingDuringReplay(ChangeFeed):
+        def since(self, last_event_id):
+            publish(self, 1)
+            return super().since(last_event_id)
+
+    feed = PublishingDuringReplay(capacity=10, subscriber_queue=10)
+    publish(feed, 1)
+    chunks = collect(feed, f"{feed.epoch}-0", 3, while_streaming=lambda: publish(feed, 1))
+    ids = [parse(chunk)[1]["id"] for chunk in chunks]
+    assert ids == [f"{feed.epoch}-{seq}" for seq in (1, 2, 3)]
+
+
+def test_the_stream_ends_with_a_reset_when_the_client_falls_behind():
+    feed = ChangeFeed(capacity=10, subscriber_queue=2)
+    chunks = collect(feed, None, 5, while_streaming=lambda: publish(feed, 5))
+    assert [parse(chunk)[0] for chunk in chunks] == ["reset"]
+    assert feed.stats()["subscribers"] == 0
+
+
+def test_the_stream_sends_heartbeats_while_idle():
+    feed = ChangeFeed(capacity=10, subscriber_queue=10)
+    chunks = collect(feed, None, 2, heartbeat=0.01)
+    assert chunks == [b": keep-alive\n\n", b": keep-alive\n\n"]
@@ -0,0 +1,192 @@
+import asyncio
+from collections import namedtuple
+
+import pytest
+from elastic_transport import (
+    ApiResponseMeta, BaseAsyncNode, ConnectionError as TransportConnectionError, ConnectionTimeout, HttpHeaders, NodeConfig,
+)
+
+import app.db.circuit_breaker as circuit_breaker_module
+from app.db.circuit_breaker import CircuitBreaker, CircuitOpenError, breaker_transport
+
+NodeResponse = namedtuple("NodeResponse", ["meta", "body"])
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class StubNode(BaseAsyncNode):
+    """
+    A node that answers with the queued outcomes: a status code, an
+    exception to raise, or an asyncio.Event to wait for before answering 200.
+    """
+
+    outcomes = []
+    calls = 0
+
+    async def perform_request(self, method, target, body=None, headers=None, request_timeout=None):
+        StubNode.calls += 1
+        outcome = StubNode.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if isinstance(outcome, asyncio.Event):
+            await outcome.wait()
+            outcome = 200
+        meta = ApiResponseMeta(
+            status=outcome, http_version="1.1", headers=HttpHeaders({"content-type": "application/json"}),
+            duration=0.0, node=self.config,
+        )
+        return NodeResponse(meta, b"{}")
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(circuit_breaker_module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def breaker(clock):
+    StubNode.outcomes = []
+    StubNode.calls = 0
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+
+def send(breaker, *outcomes, max_retries=0):
+    """
+    Sends one request per `max_retries + 1` outcomes through a breaker
+    transport and returns the status code or the exception class of each.
+    """
+    async def run():
+        transport = breaker_transport(breaker)([NodeConfig("http", "localhost", 9200)], node_class=StubNode, max_retries=max_retries)
+        results = []
+        for _ in range(max(1, len(outcomes) // (max_retries + 1))):
+            try:
+                results.append((await transport.perform_request("GET", "/")).meta.status)
+            except Exception as e:
+                results.append(type(e))
+        await transport.close()
+        return results
+
+    StubNode.outcomes = list(outcomes)
+    return asyncio.run(run())
+
+
+def open_circuit(breaker):
+    error = TransportConnectionError("connection refused")
+    send(breaker, error, error, error)
+    assert breaker.state == "open"
+
+
+def test_the_circuit_stays_closed_below_the_threshold(breaker):
+    error = TransportConnectionError("connection refused")
+    assert send(breaker, error, error, 200) == [TransportConnectionError, TransportConnectionError, 200]
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_consecutive_failures_open_the_circuit(breaker):
+    open_circuit(breaker)
+    assert breaker.times_opened == 1
+    assert send(breaker, 200) == [CircuitOpenError]
+    # The open circuit failed without sending anything.
+    assert StubNode.calls == 3
+    assert not breaker.allows_requests()
+
+
+def test_degraded_statuses_count_as_failures(breaker):
+    assert send(breaker, 503, 502, 504) == [503, 502, 504]
+    assert breaker.state == "open"
+
+
+def test_client_errors_count_as_successes(breaker):
+    error = ConnectionTimeout("timed out")
+    assert send(breaker, error, error, 404) == [ConnectionTimeout, ConnectionTimeout, 404]
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_retries_within_a_request_count_once(breaker):
+    error = TransportConnectionError("connection refused")
+    assert send(breaker, error, error, 200, max_retries=2) == [200]
+    assert StubNode.calls == 3
+    assert breaker.failures == 0
+    assert send(breaker, error, error, error, max_retries=2) == [TransportConnectionError]
+    assert breaker.failures == 1
+
+
+def test_one_trial_is_let_through_after_the_reset_timeout(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 29
+    assert breaker.retry_after() == 1
+    assert send(breaker, 200) == [CircuitOpenError]
+    clock.now += 1
+    assert breaker.allows_requests()
+    assert send(breaker, 200) == [200]
+    assert breaker.state == "closed"
+    assert breaker.stats()["retry_after"] == 0
+
+
+def test_a_failed_trial_opens_the_circuit_again(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 30
+    assert send(breaker, 503) == [503]
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    assert breaker.retry_after() == 30
+    assert send(breaker, 200) == [CircuitOpenError]
+
+
+def test_only_one_trial_runs_at_a_time(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 30
+    answer = asyncio.Event()
+
+    async def run():
+        transport = breaker_transport(breaker)([NodeConfig("http", "localhost", 9200)], node_class=StubNode, max_retries=0)
+        StubNode.outcomes = [answer, 200]
+        trial = asyncio.ensure_future(transport.perform_request("GET", "/"))
+        await asyncio.sleep(0)
+        assert breaker.state == "half-open"
+        with pytest.raises(CircuitOpenError):
+            await transport.perform_request("GET", "/")
+        answer.set()
+        await trial
+        await transport.perform_request("GET", "/")
+        await transport.close()
+
+    asyncio.run(run())
+    assert breaker.state == "closed"
+
+
+def test_a_cancelled_trial_frees_the_next_one(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 30
+
+    async def run():
+        transport = breaker_transport(breaker)([NodeConfig("http", "localhost", 9200)], node_class=StubNode, max_retries=0)
+        StubNode.outcomes = [asyncio.Event(), 200]
+        trial = asyncio.ensure_future(transport.perform_request("GET", "/"))
+        await asyncio.sleep(0)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert breaker.state == "half-open" and breaker.allows_requests()
+        response = await transport.perform_request("GET", "/")
+        await transport.close()
+        return response.meta.status
+
+    assert asyncio.run(run()) == 200
+    assert breaker.state == "closed"
+
+
+def test_the_open_error_is_a_connection_error():
+    assert issubclass(CircuitOpenError, TransportConnectionError)
@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+
+from app.services.classifier import DEFAULT_RULES_PATH, ClassificationRule, ReloadingRulesEngine, RulesEngine
+
+DEFAULTS = {"doc_type": "MISC", "status": "PROCESSED"}
+
+
+@pytest.fixture
+def engine():
+    return RulesEngine.from_file(DEFAULT_RULES_PATH)
+
+
+def legacy_classify(content):
+    # The hardcoded classification the shipped rules replace.
+    content_lower = content.lower()
+    result = {}
+    if "agreement" in content_lower or "contract" in content_lower:
+        result["doc_type"] = "AGMT"
+    elif "letter" in content_lower:
+        result["doc_type"] = "LTR"
+    else:
+        result["doc_type"] = "MISC"
+    if "draft" in content_lower or "for review" in content_lower:
+        result["status"] = "DRAFT"
+    elif "executed" in content_lower or "signed" in content_lower:
+        result["status"] = "EXECUTED"
+    else:
+        result["status"] = "PROCESSED"
+    return result
+
+
+@pytest.mark.parametrize("content", [
+    "",
+    "Nothing to see here.",
+    "A LETTER about the Contract",
+    "Signed letter, draft agreement",
+    "executed and filed",
+    "Sent for\treview",
+])
+def test_shipped_rules_agree_with_the_legacy_classification(engine, content):
+    result = engine.classify(content)
+    legacy = legacy_classify(content)
+    if legacy["doc_type"] == "MISC" and result["doc_type"] == "MEMO":
+        legacy["doc_type"] = "MEMO"
+    if legacy["status"] == "PROCESSED" and result["status"] == "FILED":
+        legacy["status"] = "FILED"
+    assert result == legacy
+
+
+def test_the_best_ranked_rule_wins_wherever_it_appears(engine):
+    content = "letter " * 1000 + "memo " + "Agreement"
+    assert engine.classify(content)["doc_type"] == "AGMT"
+
+
+def test_matching_ignores_case(engine):
+    assert engine.classify("CONTRACT") == {"doc_type": "AGMT", "status": "PROCESSED"}
+    assert engine.classify("Executed") == {"doc_type": "MISC", "status": "EXECUTED"}
+
+
+def test_word_boundaries(engine):
+    assert engine.classify("memorandum")["doc_type"] == "MEMO"
+    assert engine.classify("a memo.")["doc_type"] == "MEMO"
+    assert engine.classify("memos and memorandums")["doc_type"] == "MISC"
+    assert engine.classify("refiled")["status"] == "PROCESSED"
+    assert engine.classify("FILED_")["status"] == "PROCESSED"
+    assert engine.classify("(filed)")["status"] == "FILED"
+
+
+def test_keyword_whitespace_is_normalised():
+    engine = RulesEngine([ClassificationRule("status", "DRAFT", ["  For   Review "])], DEFAULTS)
+    assert engine.classify("sent for review")["status"] == "DRAFT"
+
+
+def test_keywords_shared_by_rules_count_for_each():
+    engine = RulesEngine([
+        ClassificationRule("doc_type", "NDA", ["confidential"], priority=2),
+        ClassificationRule("status", "RESTRICTED", ["confidential"], priority=1),
+    ], DEFAULTS)
+    assert engine.classify("strictly confidential") == {"doc_type": "NDA", "status": "RESTRICTED"}
+
+
+def test_equal_priorities_keep_file_order():
+    engine = RulesEngine([
+        ClassificationRule("doc_type", "FIRST", ["beta"]),
+        ClassificationRule("doc_type", "SECOND", ["alpha"]),
+    ], DEFAULTS)
+    assert engine.classify("alpha beta")["doc_type"] == "FIRST"
+
+
+def test_no_rules_gives_the_defaults():
+    assert RulesEngine([], DEFAULTS).classify("agreement") == DEFAULTS
+
+
+class SmallChunks(RulesEngine):
+    CHUNK_SIZE = 8
+
+
+@pytest.mark.parametrize("offset", range(0, 12))
+def test_matches_across_chunk_edges_are_found_once(offset):
+    rules = [
+        ClassificationRule("doc_type", "AGMT", ["agreement"], priority=2),
+        ClassificationRule("doc_type", "MEMO", ["memo"], priority=1, word_boundary=True),
+    ]
+    engine = SmallChunks(rules, DEFAULTS)
+    padding = "x" * offset
+    assert engine.classify(padding + " agreement ")["doc_type"] == "AGMT"
+    assert engine.classify(padding + " memo ")["doc_type"] == "MEMO"
+    # The word boundary is checked against the neighbouring chunk.
+    assert engine.classify(padding + "memo" + "s" * 20)["doc_type"] == "MISC"
+    assert engine.classify(padding + "xmemo ")["doc_type"] == "MISC"
+
+
+def test_long_content_matches_the_legacy_classification(engine):
+    filler = "The parties acknowledge the terms set out in the schedules hereto. " * 3000
+    for keyword in ("", "Draft Agreement", "Signed letter"):
+        content = filler[:len(filler) // 2] + f" {keyword} " + filler[len(filler) // 2:]
+        result = engine.classify(content)
+        assert result == legacy_classify(content)
+
+
+def test_rules_are_reloaded_when_the_file_changes(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text('{"defaults": {"doc_type": "MISC"}, "rules": [{"field": "doc_type", "value": "A", "keywords": ["alpha"]}]}')
+    engine = ReloadingRulesEngine(str(path), reload_interval=0)
+    assert engine.classify("alpha")["doc_type"] == "A"
+
+    path.write_text('{"defaults": {"doc_type": "MISC"}, "rules": [{"field": "doc_type", "value": "B", "keywords": ["alpha"]}]}')
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert engine.classify("alpha")["doc_type"] == "B"
+
+    # A broken edit keeps the last good rules.
+    path.write_text("{not json")
+    os.utime(path, (time.time() + 20, time.time() + 20))
+    assert engine.classify("alpha")["doc_type"] == "B"
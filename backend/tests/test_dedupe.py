@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import app.services.dedupe as dedupe_module
+from app.services.dedupe import DedupeJob
+from app.services.document_identity import stable_document_id
+
+
+class FakeIndex:
+    """
+    An index of documents by id, with the helpers the dedupe job uses
+    patched to read and write it. Copies to the ids in `failing` fail as
+    a bulk item would (e.g. a rejected or unmappable document).
+    """
+
+    def __init__(self, failing=(), conflicting=()):
+        self.documents = {}
+        self.failing = set(failing)
+        self.conflicting = set(conflicting)
+
+    def add(self, document_id, path, modified, ingested="2024-01-01T00:00:00"):
+        self.documents[document_id] = {
+            "metadata": {"source_hostname": "host", "filename_full_path": path, "modified_date": modified},
+            "ingest_date": ingested,
+        }
+
+    async def scan(self, client, index, query, _source):
+        for document_id, source in list(self.documents.items()):
+            yield {"_id": document_id, "_index": "documents-1", "_source": source}
+
+    async def mget(self, docs):
+        return {"docs": [
+            {"_index": doc["_index"], "_id": doc["_id"], "found": doc["_id"] in self.documents,
+             "_source": dict(self.documents.get(doc["_id"], {}))}
+            for doc in docs
+        ]}
+
+    async def bulk(self, client, actions, **kwargs):
+        async for action in _iterate(actions):
+            op_type = action["_op_type"]
+            document_id = action["_id"]
+            if op_type == "index" and document_id in self.failing:
+                yield False, {"index": {"_id": document_id, "status": 429, "error": "rejected"}}
+            elif op_type == "index" and document_id in self.conflicting:
+                yield False, {"index": {"_id": document_id, "status": 409, "error": "version conflict"}}
+            elif op_type == "index":
+                self.documents[document_id] = action["_source"]
+                yield True, {"index": {"_id": document_id, "status": 201}}
+            else:
+                self.documents.pop(document_id, None)
+                yield True, {"delete": {"_id": document_id, "status": 200}}
+
+
+async def _iterate(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _nothing():
+    pass
+
+
+@pytest.fixture
+def run(monkeypatch):
+    def run(index, dry_run=False):
+        monkeypatch.setattr(dedupe_module, "async_scan", index.scan)
+        monkeypatch.setattr(dedupe_module, "async_streaming_bulk", index.bulk)
+        monkeypatch.setattr(dedupe_module.search_cache, "invalidate", _nothing)
+        return asyncio.run(DedupeJob().run(index, dry_run=dry_run))
+    return run
+
+
+def stable(path):
+    return stable_document_id("host", path)
+
+
+def test_duplicates_collapse_onto_the_latest_version(run):
+    index = FakeIndex()
+    index.add("random-1", "/a.txt", "2024-01-01")
+    index.add("random-2", "/a.txt", "2024-02-01")
+    index.add("random-3", "/b.txt", "2024-01-01")
+    status = run(index)
+    assert status["state"] == "finished"
+    assert sorted(index.documents) == sorted([stable("/a.txt"), stable("/b.txt")])
+    assert index.documents[stable("/a.txt")]["metadata"]["modified_date"] == "2024-02-01"
+    assert (status["copied"], status["deleted"], status["kept"], status["errors"]) == (2, 3, 0, 0)
+
+
+def test_originals_are_kept_when_their_copy_fails(run):
+    index = FakeIndex(failing={stable("/a.txt")})
+    index.add("random-1", "/a.txt", "2024-01-01")
+    index.add("random-2", "/a.txt", "2024-02-01")
+    index.add("random-3", "/b.txt", "2024-01-01")
+    status = run(index)
+    assert "random-1" in index.documents and "random-2" in index.documents
+    assert stable("/a.txt") not in index.documents
+    assert "random-3" not in index.documents and stable("/b.txt") in index.documents
+    assert (status["copied"], status["deleted"], status["kept"], status["errors"]) == (1, 1, 2, 1)
+
+
+def test_a_newer_version_under_the_stable_id_counts_as_stored(run):
+    index = FakeIndex(conflicting={stable("/a.txt")})
+    index.add("random-1", "/a.txt", "2024-01-01")
+    status = run(index)
+    assert "random-1" not in index.documents
+    assert (status["deleted"], status["kept"], status["errors"]) == (1, 0, 0)
+
+
+def test_documents_already_under_their_stable_id_are_not_copied(run):
+    index = FakeIndex()
+    index.add(stable("/a.txt"), "/a.txt", "2024-02-01")
+    index.add("random-1", "/a.txt", "2024-01-01")
+    status = run(index)
+    assert list(index.documents) == [stable("/a.txt")]
+    assert (status["copied"], status["deleted"]) == (0, 1)
+
+
+def test_dry_run_changes_nothing(run):
+    index = FakeIndex(failing={stable("/a.txt")})
+    index.add("random-1", "/a.txt", "2024-01-01")
+    index.add("random-2", "/a.txt", "2024-02-01")
+    status = run(index, dry_run=True)
+    assert sorted(index.documents) == ["random-1", "random-2"]
+    assert (status["copied"], status["deleted"]) == (1, 2)
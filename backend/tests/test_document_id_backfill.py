@@ -0,0 +1,71 @@
+import asyncio
+
+import app.services.index_maintenance as index_maintenance_module
+from app.services.index_maintenance import IndexMaintenance, backfill_document_ids
+from app.services.search_cache import LocalGeneration, SearchCache
+
+
+class FakeClient:
+    """
+    count and update_by_query over a set of ids without document_id.
+    `conflicting` ids are never updated, as if always written concurrently;
+    `failures` is the number of calls that fail before any succeeds.
+    """
+
+    def __init__(self, missing, conflicting=(), failures=0):
+        self.missing = set(missing)
+        self.conflicting = set(conflicting)
+        self.failures = failures
+        self.batches = []
+
+    async def count(self, index, query):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("cluster unavailable")
+        return {"count": len(self.missing)}
+
+    async def update_by_query(self, index, query, script, max_docs, conflicts, refresh):
+        assert script["source"] == "ctx._source.document_id = ctx._id"
+        batch = sorted(self.missing)[:max_docs]
+        updated = [document_id for document_id in batch if document_id not in self.conflicting]
+        self.missing -= set(updated)
+        self.batches.append(len(updated))
+        return {"updated": len(updated), "version_conflicts": len(batch) - len(updated)}
+
+
+def test_nothing_to_backfill():
+    client = FakeClient([])
+    assert asyncio.run(backfill_document_ids(client)) == 0
+    assert client.batches == []
+
+
+def test_documents_are_backfilled_in_batches(monkeypatch):
+    monkeypatch.setattr(index_maintenance_module, "DOCUMENT_ID_BACKFILL_BATCH", 10)
+    client = FakeClient(f"legacy-{number:03d}" for number in range(25))
+    assert asyncio.run(backfill_document_ids(client)) == 0
+    assert client.batches == [10, 10, 5]
+
+
+def test_conflicting_documents_are_left_for_later(monkeypatch):
+    monkeypatch.setattr(index_maintenance_module, "DOCUMENT_ID_BACKFILL_BATCH", 10)
+    client = FakeClient(["a", "b", "c"], conflicting={"a", "b", "c"})
+    assert asyncio.run(backfill_document_ids(client)) == 3
+
+
+def test_cursors_are_enabled_once_every_document_has_an_id(monkeypatch):
+    cache = SearchCache(10, 1000, 500, 60, 0, LocalGeneration())
+    monkeypatch.setattr(index_maintenance_module, "search_cache", cache)
+    maintenance = IndexMaintenance(alias_refresh_interval=0.01, rollover_check_interval=3600)
+    client = FakeClient(["a", "b"], failures=2)
+
+    async def run():
+        _, generation = await cache.get("search")
+        cache.put("search", generation, b"a page without a cursor")
+        assert not maintenance.document_ids_complete
+        await maintenance._backfill(client)
+        return await cache.get("search")
+
+    cached, _ = asyncio.run(run())
+    assert maintenance.document_ids_complete
+    assert client.missing == set()
+    assert cached is None
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+import app.services.ingest_queue as ingest_queue_module
+from app.core.config import settings
+from app.db.session import elasticsearch_startup
+from app.services.ingest_queue import IngestQueue
+
+
+class FakeBulk:
+    """
+    Stands in for async_streaming_bulk: answers each action with the next
+    of the scripted (ok, item) results for its document id.
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def __call__(self, client, actions, **kwargs):
+        self.calls += 1
+        return self._respond(list(actions))
+
+    async def _respond(self, actions):
+        for action in actions:
+            op_type = action.get("_op_type", "index")
+            ok, status, error = self.results[action["_id"]].pop(0)
+            info = {"_id": action["_id"], "status": status}
+            if error:
+                info["error"] = error
+            yield ok, {op_type: info}
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_QUEUE_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(ingest_queue_module.search_cache, "invalidate", _nothing)
+    elasticsearch_startup.ready.set()
+    return IngestQueue(maxsize=10, workers=1, batch_size=10, flush_interval=0.01, status_retention=100)
+
+
+async def _nothing():
+    pass
+
+
+def entry(queue, document_id, op_type="index"):
+    tracking_id = f"t-{document_id}"
+    queue._set_status(tracking_id, "queued", document_id=document_id)
+    return {"tracking_id": tracking_id, "attempts": 0, "action": {"_op_type": op_type, "_id": document_id, "_source": {}}}
+
+
+def test_a_failed_write_is_reported_failed_not_indexed(queue, monkeypatch):
+    bulk = FakeBulk({
+        "ok": [(True, 201, None)],
+        "bad": [(False, 400, "mapper_parsing_exception")],
+    })
+    monkeypatch.setattr(ingest_queue_module, "async_streaming_bulk", bulk)
+    asyncio.run(queue._flush([entry(queue, "ok"), entry(queue, "bad")]))
+    assert queue.get_status("t-ok")["status"] == "indexed"
+    failed = queue.get_status("t-bad")
+    assert failed["status"] == "failed"
+    assert "mapper_parsing_exception" in failed["error"]
+
+
+def test_rejections_are_retried_then_reported_failed(queue, monkeypatch):
+    rejected = (False, 429, "es_rejected_execution_exception")
+    bulk = FakeBulk({
+        "busy": [rejected] * (settings.INGEST_QUEUE_MAX_RETRIES + 1),
+        "late": [rejected, (True, 200, None)],
+    })
+    monkeypatch.setattr(ingest_queue_module, "async_streaming_bulk", bulk)
+    asyncio.run(queue._flush([entry(queue, "busy"), entry(queue, "late")]))
+    assert queue.get_status("t-busy")["status"] == "failed"
+    assert queue.get_status("t-late")["status"] == "indexed"
+    assert bulk.calls == settings.INGEST_QUEUE_MAX_RETRIES + 1
+
+
+def test_a_flush_that_raises_fails_its_whole_batch(queue, monkeypatch):
+    def broken(client, actions, **kwargs):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(ingest_queue_module, "async_streaming_bulk", broken)
+
+    async def run():
+        await queue.start()
+        tracking_ids = [queue.enqueue({"_op_type": "index", "_id": str(n), "_source": {}}) for n in range(3)]
+        await queue.stop(timeout=5)
+        return tracking_ids
+
+    for tracking_id in asyncio.run(run()):
+        entry = queue.get_status(tracking_id)
+        assert entry["status"] == "failed"
+        assert "connection refused" in entry["error"]
+
+
+def test_documents_left_when_the_drain_times_out_are_reported_failed(queue):
+    async def run():
+        # Not started: nothing drains the queue.
+        queue._queue = asyncio.Queue()
+        queue._accepting = True
+        tracking_id = queue.enqueue({"_op_type": "index", "_id": "a", "_source": {}})
+        await queue.stop(timeout=0.01)
+        return tracking_id
+
+    assert queue.get_status(asyncio.run(run()))["status"] == "failed"
+
+
+def test_status_lookup_lists_only_known_tracking_ids():
+    from app.api.v1.endpoints.documents import get_ingest_statuses
+    from app.models.document import IngestStatusRequest
+    from app.services.ingest_queue import ingest_queue
+
+    ingest_queue._set_status("known", "failed", document_id="a", error="mapping")
+    result = asyncio.run(get_ingest_statuses(IngestStatusRequest(tracking_ids=["known", "forgotten"]), api_key="key"))
+    assert [(status.tracking_id, status.status) for status in result.statuses] == [("known", "failed")]
+
+
+def test_enqueue_many_queues_all_or_nothing():
+    from app.services.ingest_queue import IngestQueueFull
+
+    async def run():
+        queue = IngestQueue(maxsize=3, workers=1, batch_size=10, flush_interval=1, status_retention=100)
+        queue._queue = asyncio.Queue(maxsize=3)
+        queue._accepting = True
+        first = queue.enqueue_many([{"_id": "a"}, {"_id": "b"}])
+        with pytest.raises(IngestQueueFull):
+            queue.enqueue_many([{"_id": "c"}, {"_id": "d"}])
+        assert queue.qsize() == 2
+        last = queue.enqueue_many([{"_id": "c"}])
+        return queue, first + last
+
+    queue, tracking_ids = asyncio.run(run())
+    assert [queue.get_status(tracking_id)["document_id"] for tracking_id in tracking_ids] == ["a", "b", "c"]
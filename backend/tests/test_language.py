@@ -0,0 +1,103 @@
+import pytest
+
+from app.services.language import (
+    UNKNOWN_LANGUAGE, LangdetectLanguageIdentifier, NgramLanguageIdentifier, sample_windows,
+)
+
+ENGLISH = "The quarterly report describes the results of the audit and the recommendations of the committee. " * 20
+FRENCH = "Le rapport trimestriel décrit les résultats de l'audit et les recommandations du comité de direction. " * 20
+GERMAN = "Der Bericht beschreibt die Ergebnisse der Prüfung und die Empfehlungen des Ausschusses für das Jahr. " * 20
+
+WINDOW = 400
+
+
+@pytest.fixture(scope="module")
+def identifier():
+    # Loading every profile takes about a second, so it is done once.
+    identifier = NgramLanguageIdentifier([], window_count=4, window_size=WINDOW, secondary_min_share=0.2)
+    identifier.load()
+    return identifier
+
+
+def result(language_result):
+    return language_result.language, language_result.confidence, language_result.secondary
+
+
+def test_windows_are_spread_across_the_content():
+    content = " ".join(f"word{number:04d}" for number in range(2000))
+    windows = sample_windows(content, 4, 100)
+    assert len(windows) == 4
+    starts = [content.index(window) for window in windows]
+    assert starts == sorted(starts)
+    assert starts[0] > 1000 and starts[-1] < len(content) - 1000
+    # Each window starts on a word.
+    assert all(window.startswith("word") for window in windows)
+    assert sample_windows(content, 4, 100) == windows
+
+
+def test_short_content_is_split_into_consecutive_windows():
+    assert sample_windows("abcdefghij", 4, 4) == ["abcd", "efgh", "ij"]
+    assert sample_windows("", 4, 4) == []
+
+
+@pytest.mark.parametrize("content, language", [(ENGLISH, "en"), (FRENCH, "fr"), (GERMAN, "de")])
+def test_languages_are_identified(identifier, content, language):
+    identified = identifier.identify(content)
+    assert identified.language == language
+    assert identified.confidence > 0.9
+    assert identified.secondary == []
+
+
+def test_the_same_text_always_gets_the_same_answer(identifier):
+    mixed = ENGLISH[:1200] + FRENCH[:800]
+    first = result(identifier.identify(mixed))
+    for _ in range(5):
+        identifier.identify(GERMAN)
+        assert result(identifier.identify(mixed)) == first
+    fresh = NgramLanguageIdentifier([], window_count=4, window_size=WINDOW, secondary_min_share=0.2)
+    assert result(fresh.identify(mixed)) == first
+
+
+def test_the_answer_does_not_depend_on_the_order_of_the_windows(identifier):
+    english, french = ENGLISH[:WINDOW], FRENCH[:WINDOW]
+    forwards = result(identifier.identify(english + english + english + french))
+    backwards = result(identifier.identify(french + english + english + english))
+    assert forwards == backwards
+    assert forwards[0] == "en" and forwards[2] == ["fr"]
+
+
+def test_a_header_in_another_language_does_not_decide(identifier):
+    assert identifier.identify(ENGLISH[:300] + FRENCH * 3).language == "fr"
+
+
+def test_an_even_split_halves_the_confidence(identifier):
+    english, french = ENGLISH[:WINDOW], FRENCH[:WINDOW]
+    identified = identifier.identify(english + english + french + french)
+    assert identified.language in ("en", "fr")
+    assert identified.confidence <= 0.55
+    assert identified.secondary == [{"en": "fr", "fr": "en"}[identified.language]]
+
+
+@pytest.mark.parametrize("content", ["", "12345 --- 678", "ACME CORP LTD"])
+def test_text_without_words_is_unknown(identifier, content):
+    identified = identifier.identify(content)
+    assert identified.language == UNKNOWN_LANGUAGE
+    assert identified.confidence == 0.0
+
+
+def test_ideographic_text_is_scored_with_short_ngrams(identifier):
+    assert identifier.identify("東京都の天気は晴れです。明日は雨が降るでしょう。").language == "ja"
+
+
+def test_candidates_restrict_the_answer():
+    restricted = NgramLanguageIdentifier(["en", "de"], window_count=4, window_size=WINDOW, secondary_min_share=0.2)
+    assert restricted.identify(GERMAN).language == "de"
+    assert restricted.identify(FRENCH).language in ("en", "de")
+
+
+def test_langdetect_is_repeatable_with_its_fixed_seed():
+    first = LangdetectLanguageIdentifier(window_count=4, window_size=WINDOW, secondary_min_share=0.2)
+    second = LangdetectLanguageIdentifier(window_count=4, window_size=WINDOW, secondary_min_share=0.2)
+    mixed = ENGLISH[:1200] + FRENCH[:800]
+    assert result(first.identify(mixed)) == result(second.identify(mixed)) == result(first.identify(mixed))
+    assert first.identify(FRENCH).language == "fr"
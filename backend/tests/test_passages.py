@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from app.services.passages import PAGE_BREAK, join_passages, split_passages
+
+
+def make_content(seed: int, words: int = 2000) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(words):
+        parts.append("".join(rng.choice("abcdefghij") for _ in range(rng.randint(1, 12))))
+        parts.append(rng.choice([" "] * 12 + ["\n", PAGE_BREAK]))
+    return "".join(parts).rstrip()
+
+
+def test_short_content_is_one_passage():
+    assert split_passages("a few words", size=100, overlap=20, max_passages=10) == [
+        {"text": "a few words", "page": 1, "offset": 0}
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_passages_are_slices_of_the_content_within_size(seed):
+    content = make_content(seed)
+    passages = split_passages(content, size=300, overlap=50, max_passages=1000)
+    for passage in passages:
+        assert content[passage["offset"]:passage["offset"] + len(passage["text"])] == passage["text"]
+        assert len(passage["text"]) <= 300
+    assert passages[0]["offset"] == 0
+    assert passages[-1]["offset"] + len(passages[-1]["text"]) == len(content)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_passages_overlap_and_start_on_word_boundaries(seed):
+    content = make_content(seed)
+    passages = split_passages(content, size=300, overlap=50, max_passages=1000)
+    for previous, passage in zip(passages, passages[1:]):
+        previous_end = previous["offset"] + len(previous["text"])
+        # No gap, and the next passage repeats part of the previous one.
+        assert previous["offset"] < passage["offset"] < previous_end
+        assert content[passage["offset"] - 1] == " " or passage["offset"] == previous_end - 50
+
+
+def test_passages_end_at_a_break_in_their_second_half():
+    content = "word " * 100
+    for passage in split_passages(content, size=64, overlap=10, max_passages=100)[:-1]:
+        assert passage["text"].endswith(" ")
+        assert len(passage["text"]) > 32
+
+
+def test_text_without_breaks_is_cut_at_size_and_still_advances():
+    content = "x" * 1000
+    passages = split_passages(content, size=100, overlap=30, max_passages=100)
+    assert [passage["offset"] for passage in passages] == list(range(0, 1000 - 30, 70))
+    assert all(len(passage["text"]) == 100 for passage in passages[:-1])
+
+
+def test_overlap_at_least_size_does_not_loop():
+    passages = split_passages("ab " * 20, size=4, overlap=10, max_passages=100)
+    offsets = [passage["offset"] for passage in passages]
+    assert offsets == sorted(set(offsets))
+
+
+def test_pages_follow_page_breaks():
+    content = PAGE_BREAK.join(["first page " * 20, "second page " * 20, "third page " * 20])
+    passages = split_passages(content, size=50, overlap=10, max_passages=100)
+    for passage in passages:
+        assert passage["page"] == content.count(PAGE_BREAK, 0, passage["offset"]) + 1
+    assert {passage["page"] for passage in passages} == {1, 2, 3}
+
+
+def test_long_content_gets_larger_passages_not_more():
+    content = make_content(1, words=20000)
+    passages = split_passages(content, size=100, overlap=20, max_passages=50)
+    assert len(passages) <= 50
+    assert passages[-1]["offset"] + len(passages[-1]["text"]) == len(content)
+
+
+def test_whitespace_only_passages_are_dropped():
+    content = "start" + " " * 500 + "end"
+    passages = split_passages(content, size=100, overlap=10, max_passages=100)
+    assert all(passage["text"].strip() for passage in passages)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_join_rebuilds_the_content(seed):
+    content = make_content(seed)
+    passages = split_passages(content, size=300, overlap=50, max_passages=1000)
+    random.Random(seed).shuffle(passages)
+    assert join_passages(passages) == content
+
+
+def test_join_skips_passages_inside_earlier_ones():
+    passages = [
+        {"text": "hello world", "page": 1, "offset": 0},
+        {"text": "world", "page": 1, "offset": 6},
+        {"text": "world again", "page": 1, "offset": 6},
+    ]
+    assert join_passages(passages) == "hello world again"
+
+
+def test_join_of_nothing_is_empty():
+    assert join_passages([]) == ""
@@ -0,0 +1,162 @@
+import asyncio
+import gzip
+import io
+import os
+import zlib
+
+import pytest
+import zstandard
+
+from app.services.payload import (
+    GZIP, IDENTITY, ZSTD, DecodingReader, InvalidPayload, PayloadTooLarge, UnsupportedEncoding, read_payload,
+    supported_encodings,
+)
+
+MiB = 1024 * 1024
+
+
+class FakeUpload:
+    """
+    The part of UploadFile the reader uses, over bytes or chunks of bytes
+    produced lazily (so a bomb need not be built in memory).
+    """
+
+    def __init__(self, data, filename="upload"):
+        self.filename = filename
+        self._chunks = iter([data]) if isinstance(data, bytes) else iter(data)
+        self._buffer = io.BytesIO()
+        self.bytes_read = 0
+
+    async def read(self, size=-1):
+        data = self._buffer.read(size if size > 0 else -1)
+        while not data or (size > 0 and len(data) < size):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer = io.BytesIO(chunk)
+            data += self._buffer.read(size - len(data) if size > 0 else -1)
+        self.bytes_read += len(data)
+        return data
+
+
+def decode_all(upload, encoding, max_bytes):
+    async def run():
+        reader = DecodingReader(upload, encoding, max_bytes)
+        parts = []
+        while True:
+            data = await reader.read(64 * 1024)
+            if not data:
+                return b"".join(parts), reader
+            parts.append(data)
+    return asyncio.run(run())
+
+
+def zeros_zstd(total, chunk=MiB):
+    # One zstd frame of `total` zero bytes, compressed as it is produced.
+    compressor = zstandard.ZstdCompressor(level=1).compressobj()
+    zero = bytes(chunk)
+    for _ in range(total // chunk):
+        yield compressor.compress(zero)
+    yield compressor.flush()
+
+
+def zeros_gzip(total, chunk=MiB):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    zero = bytes(chunk)
+    for _ in range(total // chunk):
+        yield compressor.compress(zero)
+    yield compressor.flush()
+
+
+DATA = os.urandom(200 * 1024) + b"x" * (3 * MiB)
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    (IDENTITY, lambda data: data),
+    (GZIP, gzip.compress),
+    (ZSTD, lambda data: zstandard.ZstdCompressor().compress(data)),
+])
+def test_valid_uploads_round_trip(encoding, compress):
+    decoded, reader = decode_all(FakeUpload(compress(DATA)), encoding, len(DATA))
+    assert decoded == DATA
+    assert reader.decoded_bytes == len(DATA)
+
+
+def test_zstd_frames_without_a_content_size_round_trip():
+    decoded, _ = decode_all(FakeUpload(zeros_zstd(4 * MiB)), ZSTD, 4 * MiB)
+    assert decoded == bytes(4 * MiB)
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    (IDENTITY, lambda data: data),
+    (GZIP, gzip.compress),
+    (ZSTD, lambda data: zstandard.ZstdCompressor().compress(data)),
+])
+def test_oversized_uploads_are_rejected(encoding, compress):
+    with pytest.raises(PayloadTooLarge):
+        decode_all(FakeUpload(compress(DATA)), encoding, len(DATA) - 1)
+
+
+def test_a_gzip_bomb_is_stopped_after_one_bounded_step():
+    upload = FakeUpload(zeros_gzip(1024 * MiB))
+    with pytest.raises(PayloadTooLarge):
+        decode_all(upload, GZIP, MiB)
+    # About 1 MiB compresses to 1 KiB; far less than the bomb was read.
+    assert upload.bytes_read < 256 * 1024
+
+
+def test_a_zstd_bomb_is_stopped_after_one_bounded_step(monkeypatch):
+    # A single frame of 1 GiB of zeros is about 32 KiB compressed; fed to the
+    # decompressor in one call it would inflate to 1 GiB at once.
+    steps = []
+    original = DecodingReader._decode_step
+
+    def recording_step(reader):
+        data = original(reader)
+        steps.append(len(data))
+        return data
+
+    monkeypatch.setattr(DecodingReader, "_decode_step", recording_step)
+    upload = FakeUpload(zeros_zstd(1024 * MiB))
+    with pytest.raises(PayloadTooLarge):
+        decode_all(upload, ZSTD, MiB)
+    assert max(steps) <= 8 * MiB
+    assert sum(steps) <= MiB + 8 * MiB
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    (GZIP, gzip.compress),
+    (ZSTD, lambda data: zstandard.ZstdCompressor().compress(data)),
+])
+def test_truncated_uploads_are_rejected(encoding, compress):
+    compressed = compress(DATA)
+    with pytest.raises(InvalidPayload, match="truncated"):
+        decode_all(FakeUpload(compressed[:len(compressed) // 2]), encoding, 10 * len(DATA))
+
+
+@pytest.mark.parametrize("encoding", [GZIP, ZSTD])
+def test_corrupt_uploads_are_rejected(encoding):
+    with pytest.raises(InvalidPayload):
+        decode_all(FakeUpload(b"this is not compressed at all" * 100), encoding, MiB)
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    (GZIP, gzip.compress),
+    (ZSTD, lambda data: zstandard.ZstdCompressor().compress(data)),
+])
+def test_data_after_the_end_of_the_stream_is_ignored(encoding, compress):
+    decoded, _ = decode_all(FakeUpload(compress(b"payload") + b"trailing garbage"), encoding, MiB)
+    assert decoded == b"payload"
+
+
+def test_unsupported_encodings_are_rejected():
+    assert supported_encodings() == [ZSTD, GZIP, IDENTITY]
+    with pytest.raises(UnsupportedEncoding):
+        DecodingReader(FakeUpload(b""), "br", MiB)
+
+
+def test_read_payload_decodes_the_whole_upload():
+    payload = b'{"metadata": {}, "content": "' + b"a" * 200000 + b'"}'
+    assert asyncio.run(read_payload(FakeUpload(gzip.compress(payload)), GZIP, MiB)) == payload
+    with pytest.raises(PayloadTooLarge):
+        asyncio.run(read_payload(FakeUpload(gzip.compress(payload)), GZIP, 1000))
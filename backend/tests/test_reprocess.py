@@ -0,0 +1,63 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.services.passages import split_passages
+from app.services.reprocess import _processing_input, slice_ranges
+
+
+def slice_of(document_id: str, ranges: list) -> list:
+    return [
+        number for number, key_range in enumerate(ranges)
+        if ("gte" not in key_range or document_id >= key_range["gte"])
+        and ("lt" not in key_range or document_id < key_range["lt"])
+    ]
+
+
+@pytest.mark.parametrize("slices", [1, 2, 3, 4, 7, 16, 64])
+def test_slices_are_contiguous(slices):
+    ranges = slice_ranges(slices)
+    assert len(ranges) == slices
+    assert "gte" not in ranges[0] and "lt" not in ranges[-1]
+    for previous, key_range in zip(ranges, ranges[1:]):
+        assert previous["lt"] == key_range["gte"]
+        assert previous.get("gte", "") < previous["lt"]
+
+
+@pytest.mark.parametrize("slices", [1, 2, 3, 4, 7, 16, 64])
+def test_every_id_falls_in_exactly_one_slice(slices):
+    ranges = slice_ranges(slices)
+    prefixes = [format(n, "02x") for n in range(256)]
+    ids = [f"{prefix}{suffix}" for prefix in prefixes for suffix in ("000000-0000", "ffffff-ffff")]
+    ids += [str(uuid.UUID(int=0)), str(uuid.UUID(int=2 ** 128 - 1))]
+    ids += [str(uuid.uuid5(uuid.NAMESPACE_URL, str(n))) for n in range(1000)]
+    for document_id in ids:
+        assert len(slice_of(document_id, ranges)) == 1, document_id
+
+
+def test_uuid_slices_are_about_equally_full():
+    ranges = slice_ranges(4)
+    counts = [0] * 4
+    for n in range(4000):
+        counts[slice_of(str(uuid.uuid5(uuid.NAMESPACE_URL, str(n))), ranges)[0]] += 1
+    assert min(counts) > 800
+
+
+def test_processing_input_rebuilds_content_from_passages():
+    content = " ".join(f"word{n}" for n in range(2000))
+    source = {
+        "metadata": {"filename_original": "a.docx", "modified_date": "2024-01-02T03:04:05"},
+        "passages": split_passages(content, size=300, overlap=50, max_passages=100),
+    }
+    metadata, rebuilt, filename = _processing_input(source)
+    assert rebuilt == content
+    assert filename == "a.docx"
+    assert metadata["modified_date"] == datetime(2024, 1, 2, 3, 4, 5).timestamp()
+    # The stored document is left as it was.
+    assert source["metadata"]["modified_date"] == "2024-01-02T03:04:05"
+
+
+def test_processing_input_prefers_stored_content():
+    metadata, content, filename = _processing_input({"content": "whole", "passages": [{"text": "x", "offset": 0}]})
+    assert (metadata, content, filename) == ({}, "whole", "")
@@ -0,0 +1,262 @@
+import asyncio
+
+import pytest
+
+import app.services.ingest_queue as ingest_queue_module
+import app.services.search_cache as search_cache_module
+from app.core.config import settings
+from app.db.session import elasticsearch_startup
+from app.services.ingest_queue import IngestQueue
+from app.services.search_cache import LocalGeneration, RedisGeneration, SearchCache
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeRedis:
+    """
+    The two commands RedisGeneration uses, over one dict shared by every
+    client made from the same URL, as the workers share one server.
+    """
+
+    servers = {}
+
+    def __init__(self, url):
+        self.data = self.servers.setdefault(url, {})
+        self.down = False
+
+    @classmethod
+    def from_url(cls, url):
+        return cls(url)
+
+    async def get(self, key):
+        if self.down:
+            raise ConnectionError("redis is down")
+        value = self.data.get(key)
+        return None if value is None else str(value).encode()
+
+    async def incr(self, key):
+        if self.down:
+            raise ConnectionError("redis is down")
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(search_cache_module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    FakeRedis.servers.clear()
+    monkeypatch.setattr(search_cache_module, "redis_asyncio", FakeRedis)
+    return FakeRedis
+
+
+def make_cache(generation=None, max_entries=10, max_bytes=1000, max_entry_bytes=500, ttl=60, refresh_delay=0):
+    return SearchCache(max_entries, max_bytes, max_entry_bytes, ttl, refresh_delay, generation or LocalGeneration())
+
+
+def lookup(cache, key):
+    return asyncio.run(cache.get(key))
+
+
+def store(cache, key, body):
+    _, generation = lookup(cache, key)
+    cache.put(key, generation, body)
+
+
+def test_hits_until_the_generation_changes(clock):
+    cache = make_cache()
+    store(cache, "a", b"result")
+    assert lookup(cache, "a") == (b"result", 0)
+
+    async def invalidate_and_get():
+        await cache.invalidate()
+        return await cache.get("a")
+
+    assert asyncio.run(invalidate_and_get()) == (None, 1)
+    assert cache.stats()["stale"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidation_bumps_again_after_the_refresh_delay(clock):
+    cache = make_cache(refresh_delay=0.05)
+
+    async def run():
+        await cache.invalidate()
+        # A search before the refresh may still see the old index.
+        _, generation = await cache.get("a")
+        cache.put("a", generation, b"maybe stale")
+        clock.now += 1
+        await cache._pending_bump
+        return await cache.get("a")
+
+    assert asyncio.run(run()) == (None, 2)
+
+
+def test_invalidations_during_the_delay_share_one_delayed_bump(clock):
+    cache = make_cache(refresh_delay=0.05)
+
+    async def run():
+        await cache.invalidate()
+        first = cache._pending_bump
+        await cache.invalidate()
+        assert cache._pending_bump is first
+        clock.now += 1
+        await first
+
+    asyncio.run(run())
+    assert cache.generation.value == 3
+
+
+def test_entries_expire(clock):
+    cache = make_cache(ttl=10)
+    store(cache, "a", b"result")
+    clock.now += 11
+    assert lookup(cache, "a") == (None, 0)
+
+
+def test_the_least_recently_used_entry_is_evicted_by_count(clock):
+    cache = make_cache(max_entries=2)
+    store(cache, "a", b"1")
+    store(cache, "b", b"2")
+    lookup(cache, "a")
+    store(cache, "c", b"3")
+    assert lookup(cache, "b")[0] is None
+    assert lookup(cache, "a")[0] == b"1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_evicted_to_stay_within_max_bytes(clock):
+    cache = make_cache(max_bytes=100)
+    for key in "abcd":
+        store(cache, key, b"x" * 40)
+    assert cache.size == 80
+    assert [lookup(cache, key)[0] is not None for key in "abcd"] == [False, False, True, True]
+
+
+def test_replacing_an_entry_keeps_the_size_right(clock):
+    cache = make_cache()
+    store(cache, "a", b"x" * 100)
+    store(cache, "a", b"x" * 10)
+    assert cache.size == 10
+    cache.clear()
+    assert cache.size == 0 and lookup(cache, "a")[0] is None
+
+
+def test_oversized_responses_are_not_cached(clock):
+    cache = make_cache(max_entry_bytes=10)
+    store(cache, "a", b"x" * 11)
+    assert lookup(cache, "a")[0] is None
+    assert cache.stats()["skipped"] == 1
+
+
+def test_a_disabled_cache_stores_nothing(clock):
+    cache = make_cache(max_entries=0)
+    assert lookup(cache, "a") == (None, None)
+    cache.put("a", None, b"x")
+    assert cache.size == 0
+
+
+def test_keys_do_not_depend_on_parameter_order():
+    assert SearchCache.key("search", {"a": 1, "b": [1, 2]}) == SearchCache.key("search", {"b": [1, 2], "a": 1})
+    assert SearchCache.key("search", {"a": 1}) != SearchCache.key("recent", {"a": 1})
+
+
+def test_the_redis_generation_is_shared_between_workers(clock, fake_redis):
+    first = make_cache(RedisGeneration("redis://cache"))
+    second = make_cache(RedisGeneration("redis://cache"))
+    store(first, "a", b"result")
+    store(second, "a", b"result")
+
+    async def invalidate_in_the_first():
+        await first.invalidate()
+        await first._pending_bump
+
+    asyncio.run(invalidate_in_the_first())
+    # Bumped on ingest and again after the refresh delay.
+    assert lookup(second, "a") == (None, 2)
+    assert second.stats()["shared"]
+
+
+def test_the_cache_is_bypassed_while_redis_is_down(clock, fake_redis):
+    generation = RedisGeneration("redis://cache")
+    cache = make_cache(generation)
+    store(cache, "a", b"result")
+    generation._redis.down = True
+    assert lookup(cache, "a") == (None, None)
+    cache.put("a", None, b"newer")
+
+    async def invalidate():
+        await cache.invalidate()
+        await cache._pending_bump
+
+    asyncio.run(invalidate())
+    # The lookup and both bumps failed.
+    assert cache.stats()["errors"] == 3
+    generation._redis.down = False
+    assert lookup(cache, "a") == (b"result", 0)
+
+
+def test_without_redis_the_counter_is_per_worker(monkeypatch, fake_redis):
+    monkeypatch.setattr(settings, "SEARCH_CACHE_REDIS_URL", None)
+    assert isinstance(search_cache_module._generation_counter(), LocalGeneration)
+    monkeypatch.setattr(settings, "SEARCH_CACHE_REDIS_URL", "redis://cache")
+    assert isinstance(search_cache_module._generation_counter(), RedisGeneration)
+    # The URL is set but the redis package is not installed.
+    monkeypatch.setattr(search_cache_module, "redis_asyncio", None)
+    assert isinstance(search_cache_module._generation_counter(), LocalGeneration)
+
+
+@pytest.mark.parametrize("action, result", [
+    ({"_op_type": "index", "_id": "a", "_source": {}}, (True, {"index": {"_id": "a", "status": 201}})),
+    ({"_op_type": "delete", "_id": "a"}, (True, {"delete": {"_id": "a", "status": 200}})),
+    ({"_op_type": "delete", "_id": "a"}, (False, {"delete": {"_id": "a", "status": 404}})),
+])
+def test_ingest_and_delete_invalidate_the_cache(monkeypatch, action, result):
+    cache = make_cache(refresh_delay=0)
+    monkeypatch.setattr(ingest_queue_module, "search_cache", cache)
+
+    async def bulk(*args, **kwargs):
+        yield result
+
+    monkeypatch.setattr(ingest_queue_module, "async_streaming_bulk", bulk)
+    elasticsearch_startup.ready.set()
+    queue = IngestQueue(maxsize=10, workers=1, batch_size=10, flush_interval=0.01, status_retention=10)
+
+    async def run():
+        _, generation = await cache.get("search")
+        cache.put("search", generation, b"old results")
+        await queue._flush([{"tracking_id": "t", "attempts": 0, "action": action}])
+        return await cache.get("search")
+
+    assert asyncio.run(run())[0] is None
+
+
+def test_failed_writes_leave_the_cache_alone(monkeypatch):
+    cache = make_cache(refresh_delay=0)
+    monkeypatch.setattr(ingest_queue_module, "search_cache", cache)
+
+    async def bulk(*args, **kwargs):
+        yield False, {"index": {"_id": "a", "status": 400, "error": "mapping"}}
+
+    monkeypatch.setattr(ingest_queue_module, "async_streaming_bulk", bulk)
+    elasticsearch_startup.ready.set()
+    queue = IngestQueue(maxsize=10, workers=1, batch_size=10, flush_interval=0.01, status_retention=10)
+
+    async def run():
+        _, generation = await cache.get("search")
+        cache.put("search", generation, b"results")
+        await queue._flush([{"tracking_id": "t", "attempts": 0, "action": {"_op_type": "index", "_id": "a", "_source": {}}}])
+        return await cache.get("search")
+
+    assert asyncio.run(run())[0] == b"results"
@@ -0,0 +1,148 @@
+import random
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.similarity import (
+    RecentSignatures, band_tokens, compute_similarity, estimate_similarity, minhash_signature, shingle_hashes,
+    unpack_signature,
+)
+
+
+def random_hashes(rng: random.Random, count: int) -> set:
+    return {rng.getrandbits(64) for _ in range(count)}
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(f"w{rng.randrange(5000)}" for _ in range(count))
+
+
+def test_shingles_of_short_content_are_empty():
+    assert shingle_hashes("only four words here", 5) == []
+
+
+def test_one_shingle_per_window_ignoring_case_and_punctuation():
+    hashes = shingle_hashes("The quick brown fox jumps over the lazy dog", 5)
+    assert len(hashes) == 9 - 5 + 1
+    assert hashes == shingle_hashes("the QUICK, brown fox; jumps over the lazy dog!", 5)
+    assert len(set(hashes)) == len(hashes)
+
+
+def test_rolling_hash_matches_hashing_each_window():
+    # A window's hash must not depend on what came before it.
+    text = "a b c d e f g h i j k"
+    hashes = shingle_hashes(text, 3)
+    for position in range(len(hashes)):
+        window = " ".join(text.split()[position:position + 3])
+        assert shingle_hashes(window, 3) == [hashes[position]]
+
+
+def test_no_signature_without_shingles():
+    assert minhash_signature([], 128) is None
+    assert compute_similarity("too short") is None
+
+
+def test_signature_does_not_depend_on_shingle_order():
+    hashes = list(random_hashes(random.Random(1), 500))
+    signature = minhash_signature(hashes, 128)
+    random.Random(2).shuffle(hashes)
+    assert minhash_signature(hashes, 128) == signature
+    assert len(signature) == 128
+    assert all(0 <= slot < 2 ** 32 for slot in signature)
+
+
+@pytest.mark.parametrize("count", [1, 3, 40])
+def test_sparse_signatures_are_densified(count):
+    hashes = list(random_hashes(random.Random(count), count))
+    signature = minhash_signature(hashes, 128)
+    # No slot keeps the empty marker, and borrowed slots differ from the
+    # slot they borrowed from.
+    assert 0xFFFFFFFF not in signature
+    assert len(set(signature)) == 128
+
+
+def test_densification_wraps_around():
+    # A single hash routed to the last slot: every other slot borrows
+    # across the end of the signature.
+    value = 127 + 128 * 1000
+    signature = minhash_signature([value], 128)
+    assert signature[127] == 1000
+    assert len(set(signature)) == 128
+
+
+@pytest.mark.parametrize("jaccard", [0.2, 0.5, 0.8, 0.95])
+def test_estimate_tracks_jaccard(jaccard):
+    rng = random.Random(int(jaccard * 100))
+    shared = random_hashes(rng, int(2000 * jaccard))
+    first = shared | random_hashes(rng, (2000 - len(shared)) // 2)
+    second = shared | random_hashes(rng, (2000 - len(shared)) // 2)
+    true = len(first & second) / len(first | second)
+    a = minhash_signature(list(first), 128)
+    b = minhash_signature(list(second), 128)
+    estimate = sum(1 for x, y in zip(a, b) if x == y) / 128
+    assert abs(estimate - true) < 0.15
+
+
+def test_bands_change_only_where_the_signature_does():
+    signature = minhash_signature(list(random_hashes(random.Random(3), 300)), 128)
+    tokens = band_tokens(signature, 16)
+    assert len(tokens) == 16
+    assert [token[:2] for token in tokens] == [format(band, "02x") for band in range(16)]
+    changed = list(signature)
+    changed[8 * 5 + 3] ^= 1
+    other = band_tokens(changed, 16)
+    assert [band for band in range(16) if tokens[band] != other[band]] == [5]
+
+
+def test_same_slots_in_different_bands_give_different_tokens():
+    tokens = band_tokens([7] * 128, 16)
+    assert len(set(tokens)) == 16
+
+
+def test_compute_similarity_round_trips_the_signature():
+    content = words(random.Random(4), 500)
+    similarity = compute_similarity(content)
+    signature = unpack_signature(similarity)
+    assert len(signature) == settings.SIMILARITY_NUM_PERM
+    assert similarity["bands"] == band_tokens(signature, settings.SIMILARITY_BANDS)
+    assert estimate_similarity(similarity, compute_similarity(content)) == 1.0
+
+
+def test_near_duplicates_share_a_band_and_unrelated_documents_do_not():
+    rng = random.Random(5)
+    text = words(rng, 2000).split()
+    edited = list(text)
+    edited[1000:1004] = ["changed"] * 4
+    original, version, unrelated = (compute_similarity(" ".join(t)) for t in (text, edited, words(rng, 2000).split()))
+    assert set(original["bands"]) & set(version["bands"])
+    assert estimate_similarity(original, version) >= settings.SIMILARITY_THRESHOLD
+    assert not set(original["bands"]) & set(unrelated["bands"])
+    assert estimate_similarity(original, unrelated) < 0.1
+
+
+def test_signatures_of_other_schemes_are_not_compared():
+    similarity = compute_similarity(words(random.Random(6), 100))
+    assert estimate_similarity(similarity, dict(similarity, scheme="oph-64-8-3")) is None
+    assert estimate_similarity(similarity, None) is None
+
+
+def test_recent_signatures_find_near_duplicates_until_they_expire():
+    rng = random.Random(7)
+    text = words(rng, 1000)
+    recent = RecentSignatures(retention=0.05, max_documents=10)
+    recent.add("draft", compute_similarity(text), "draft")
+    recent.add("unrelated", compute_similarity(words(rng, 1000)), "unrelated")
+    matches = recent.matches("final", compute_similarity(text + " signed"))
+    assert [(match["id"], match["version_family"]) for match in matches] == [("draft", "draft")]
+    assert recent.matches("draft", compute_similarity(text)) == []
+    time.sleep(0.06)
+    assert recent.matches("final", compute_similarity(text)) == []
+
+
+def test_recent_signatures_keep_at_most_max_documents():
+    recent = RecentSignatures(retention=60, max_documents=2)
+    similarity = compute_similarity(words(random.Random(8), 100))
+    for document_id in ("a", "b", "c"):
+        recent.add(document_id, similarity, "a")
+    assert sorted(match["id"] for match in recent.matches("x", similarity)) == ["b", "c"]
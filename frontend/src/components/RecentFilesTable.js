@@ -2,6 +2,15 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Paper, Typography, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, CircularProgress, Alert } from '@mui/material';
 import api from '../services/api';
+import { subscribeToChanges } from '../services/changeFeed';
+
+const LIMIT = 10;
+
+function applyChange(files, event) {
+  const rest = files.filter((hit) => hit._id !== event.document_id);
+  if (event.type === 'deleted') return rest;
+  return [{ _id: event.document_id, _source: { metadata: event.metadata } }, ...rest].slice(0, LIMIT);
+}
 
 export default function RecentFilesTable() {
   const [files, setFiles] = useState([]);
@@ -10,19 +19,33 @@ export default function RecentFilesTable() {
   const navigate = useNavigate();
 
   useEffect(() => {
+    // Changes that arrive while the list loads are applied on top of it.
+    let pending = [];
     const fetchRecentFiles = async () => {
+      pending = [];
       try {
-        const response = await api.get('/documents/recent?limit=10');
-        setFiles(response.data);
+        const response = await api.get(`/documents/recent?limit=${LIMIT}`);
+        const changes = pending;
+        pending = null;
+        setFiles(changes.reduce(applyChange, response.data));
+        setError('');
       } catch (err) {
+        pending = null;
         setError('Could not load recent files.');
         console.error(err);
       }
       setLoading(false);
     };
+    // Subscribed before loading, so nothing committed in between is missed.
+    const unsubscribe = subscribeToChanges({
+      onDocument: (event) => {
+        if (pending) pending.push(event);
+        else setFiles((previous) => applyChange(previous, event));
+      },
+      onReset: fetchRecentFiles,
+    });
     fetchRecentFiles();
-    const intervalId = setInterval(fetchRecentFiles, 30000);
-    return () => clearInterval(intervalId);
+    return unsubscribe;
   }, []);
 
   if (loading) return <CircularProgress />;
@@ -53,4 +76,4 @@ export default function RecentFilesTable() {
       </TableContainer>
     </Paper>
   );
-}
\ No newline at end of file
+}
@@ -1,8 +1,11 @@
 import React, { useState, useEffect } from 'react';
-import { useParams } from 'react-router-dom';
-import { Typography, Paper, Box, CircularProgress, Alert, Grid, Divider, Chip, Tabs, Tab, Button } from '@mui/material';
+import { useParams, useNavigate } from 'react-router-dom';
+import { Typography, Paper, Box, CircularProgress, Alert, Grid, Divider, Chip, Tabs, Tab, Button, Table, TableBody, TableCell, TableHead, TableRow } from '@mui/material';
 import api from '../services/api';
 
+// Content is loaded a screenful at a time rather than all at once.
+const CONTENT_PAGE = 20000;
+
 function TabPanel(props) {
   const { children, value, index } = props;
   return (<div role="tabpanel" hidden={value !== index}>{value === index && <Box sx={{ p: 3 }}>{children}</Box>}</div>);
@@ -14,13 +17,20 @@ export default function DocumentView() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [tabValue, setTabValue] = useState(0);
+  const [content, setContent] = useState('');
+  const [contentTotal, setContentTotal] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [versions, setVersions] = useState(null);
+  const navigate = useNavigate();
 
   useEffect(() => {
     const fetchDocument = async () => {
       setLoading(true); setError('');
       try {
-        const response = await api.get(`/documents/${id}`);
+        const response = await api.get(`/documents/${id}`, { params: { content_length: CONTENT_PAGE } });
         setDocument(response.data);
+        setContent(response.data._source.content || '');
+        setContentTotal(response.data.content_range ? response.data.content_range.total : 0);
       } catch (err) {
         setError('Failed to fetch document.');
         console.error(err);
@@ -28,13 +38,51 @@ export default function DocumentView() {
       setLoading(false);
     };
     fetchDocument();
+    setVersions(null);
+    setTabValue(0);
   }, [id]);
 
+  useEffect(() => {
+    // Loaded when the tab is first opened.
+    if (tabValue !== 3 || versions !== null) return;
+    api.get(`/documents/${id}/versions`)
+      .then((response) => setVersions(response.data.versions))
+      .catch((err) => { setVersions([]); console.error("Loading related versions failed:", err); });
+  }, [id, tabValue, versions]);
+
+  const loadMoreContent = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await api.get(`/documents/${id}`, { params: { fields: 'content', content_offset: content.length, content_length: CONTENT_PAGE } });
+      setContent((previous) => previous + (response.data._source.content || ''));
+    } catch (err) { console.error("Loading content failed:", err); }
+    setLoadingMore(false);
+  };
+
+  const handleDownload = async () => {
+    try {
+      const response = await api.get(`/documents/${id}/original`, { responseType: 'blob' });
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const link = window.document.createElement('a');
+      link.href = url;
+      link.setAttribute('download', document._source.metadata.filename_original);
+      window.document.body.appendChild(link);
+      link.click();
+      link.parentNode.removeChild(link);
+      window.URL.revokeObjectURL(url);
+    } catch (err) { console.error("Download failed:", err); }
+  };
+
   if (loading) return <CircularProgress />;
   if (error) return <Alert severity="error">{error}</Alert>;
   if (!document) return <Alert severity="info">No document found.</Alert>;
 
   const meta = document._source.metadata;
+  const moreContent = content.length < contentTotal && (
+    <Button variant="outlined" sx={{ mt: 2 }} onClick={loadMoreContent} disabled={loadingMore}>
+      {loadingMore ? '...' : `Load more (${content.length.toLocaleString()} of ${contentTotal.toLocaleString()} characters)`}
+    </Button>
+  );
   return (
     <Paper sx={{ p: 3 }}>
       <Typography variant="h4" gutterBottom>{meta.filename_original}</Typography>
@@ -45,10 +93,28 @@ export default function DocumentView() {
         <Grid item xs={12} sm={6}><Typography variant="subtitle2" color="text.secondary">Status</Typography><Chip label={meta.status || 'N/A'} color="secondary" /></Grid>
       </Grid>
       <Divider sx={{ my: 2 }} />
-      <Box sx={{ borderBottom: 1, borderColor: 'divider' }}><Tabs value={tabValue} onChange={(e,v) => setTabValue(v)}><Tab label="HTML View" /><Tab label="Raw Text" /><Tab label="Download Original" /></Tabs></Box>
-      <TabPanel value={tabValue} index={0}><Box sx={{ whiteSpace: 'pre-wrap', fontFamily: 'monospace', maxHeight: '60vh', overflowY: 'auto' }}>{document._source.content}</Box></TabPanel>
-      <TabPanel value={tabValue} index={1}><Box sx={{ whiteSpace: 'pre-wrap', fontFamily: 'monospace', maxHeight: '60vh', overflowY: 'auto' }}>{document._source.content}</Box></TabPanel>
-      <TabPanel value={tabValue} index={2}><Button variant="contained">Download '{meta.filename_original}'</Button></TabPanel>
+      <Box sx={{ borderBottom: 1, borderColor: 'divider' }}><Tabs value={tabValue} onChange={(e,v) => setTabValue(v)}><Tab label="HTML View" /><Tab label="Raw Text" /><Tab label="Download Original" /><Tab label="Related Versions" /></Tabs></Box>
+      <TabPanel value={tabValue} index={0}><Box sx={{ whiteSpace: 'pre-wrap', fontFamily: 'monospace', maxHeight: '60vh', overflowY: 'auto' }}>{content}</Box>{moreContent}</TabPanel>
+      <TabPanel value={tabValue} index={1}><Box sx={{ whiteSpace: 'pre-wrap', fontFamily: 'monospace', maxHeight: '60vh', overflowY: 'auto' }}>{content}</Box>{moreContent}</TabPanel>
+      <TabPanel value={tabValue} index={2}><Button variant="contained" onClick={handleDownload}>Download '{meta.filename_original}'</Button></TabPanel>
+      <TabPanel value={tabValue} index={3}>
+        {versions === null ? <CircularProgress /> : versions.length === 0 ? <Typography>No other versions found.</Typography> : (
+          <Table size="small">
+            <TableHead><TableRow><TableCell>Filename</TableCell><TableCell>Client/Project</TableCell><TableCell>Status</TableCell><TableCell align="right">Similarity</TableCell><TableCell align="right">Modified Date</TableCell></TableRow></TableHead>
+            <TableBody>
+              {versions.map((version) => (
+                <TableRow key={version.id} hover onClick={() => navigate(`/document/${version.id}`)} sx={{ cursor: 'pointer' }}>
+                  <TableCell>{version.metadata.filename_original}</TableCell>
+                  <TableCell>{version.metadata.client_project_name}</TableCell>
+                  <TableCell>{version.metadata.status}</TableCell>
+                  <TableCell align="right">{version.similarity === null ? '-' : `${Math.round(version.similarity * 100)}%`}</TableCell>
+                  <TableCell align="right">{new Date(version.metadata.modified_date).toLocaleString()}</TableCell>
+                </TableRow>
+              ))}
+            </TableBody>
+          </Table>
+        )}
+      </TabPanel>
     </Paper>
   );
 }
\ No newline at end of file
@@ -1,28 +1,47 @@
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { Box, Typography, Grid, Paper, TextField, Button, Table, TableBody, TableCell, TableContainer, TableHead, TableRow } from '@mui/material';
+import { Box, Typography, Grid, Paper, TextField, Button, Chip, Table, TableBody, TableCell, TableContainer, TableHead, TableRow } from '@mui/material';
 import PrintIcon from '@mui/icons-material/Print';
 import DownloadIcon from '@mui/icons-material/Download';
 import api from '../services/api';
 
+const FACET_LABELS = [['client_project', 'Client/Project'], ['doc_type', 'Doc Type'], ['status', 'Status'], ['language', 'Language']];
+
 export default function Search() {
   const [query, setQuery] = useState('');
   const [results, setResults] = useState([]);
+  const [total, setTotal] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [filters, setFilters] = useState({});
+  const [facets, setFacets] = useState(null);
   const [loading, setLoading] = useState(false);
   const navigate = useNavigate();
 
-  const handleSearch = async () => {
+  const fetchPage = async (cursor, activeFilters = filters) => {
     setLoading(true);
     try {
-      const response = await api.post('/documents/search', { query: query });
-      setResults(response.data.hits);
+      // Facet counts only come with the first page; later pages keep them.
+      const response = await api.post('/documents/search', { query: query, ...activeFilters, cursor: cursor, facets: !cursor });
+      setResults((previous) => (cursor ? [...previous, ...response.data.hits] : response.data.hits));
+      setTotal(response.data.total_relation === 'gte' ? `${response.data.total}+` : response.data.total);
+      setNextCursor(response.data.next_cursor);
+      if (!cursor) setFacets(response.data.facets);
     } catch (error) { console.error("Search failed:", error); }
     setLoading(false);
   };
 
+  const handleSearch = () => fetchPage(null);
+
+  const toggleFilter = (name, value) => {
+    const { [name]: current, ...rest } = filters;
+    const next = current === value ? rest : { ...rest, [name]: value };
+    setFilters(next);
+    fetchPage(null, next);
+  };
+
   const handleDownloadCSV = async () => {
     try {
-      const response = await api.post('/documents/export/csv', { query: query }, { responseType: 'blob' });
+      const response = await api.post('/documents/export/csv', { query: query, ...filters }, { responseType: 'blob' });
       const url = window.URL.createObjectURL(new Blob([response.data]));
       const link = document.createElement('a');
       link.href = url;
@@ -50,6 +69,16 @@ export default function Search() {
           <Grid item xs={10}><TextField fullWidth label="Search..." variant="outlined" value={query} onChange={(e) => setQuery(e.target.value)} onKeyPress={(e) => e.key === 'Enter' && handleSearch()} /></Grid>
           <Grid item xs={2}><Button fullWidth variant="contained" size="large" onClick={handleSearch} disabled={loading}>{loading ? '...' : 'Search'}</Button></Grid>
         </Grid>
+        {facets && FACET_LABELS.map(([name, label]) => facets[name].length > 0 && (
+          <Box key={name} sx={{ mt: 2, display: 'flex', flexWrap: 'wrap', alignItems: 'center', gap: 1 }}>
+            <Typography variant="body2" sx={{ minWidth: 110 }}>{label}</Typography>
+            {facets[name].map((bucket) => (
+              <Chip key={bucket.value} size="small" label={`${bucket.value} (${bucket.count})`}
+                color={filters[name] === bucket.value ? 'primary' : 'default'}
+                onClick={() => toggleFilter(name, bucket.value)} />
+            ))}
+          </Box>
+        ))}
       </Paper>
       <Box sx={{ display: 'flex', justifyContent: 'flex-end', mb: 2, '@media print': { display: 'none' } }}>
         <Button variant="outlined" startIcon={<PrintIcon />} onClick={() => window.print()} sx={{ mr: 2 }} disabled={results.length === 0}>Print Summary</Button>
@@ -62,16 +91,31 @@ export default function Search() {
           </TableHead>
           <TableBody>
             {results.map((hit) => (
-              <TableRow key={hit._id} hover onClick={() => navigate(`/document/${hit._id}`)} sx={{ cursor: 'pointer' }}>
-                <TableCell>{hit._source.metadata.filename_original}</TableCell>
-                <TableCell>{hit._source.metadata.client_project_name}</TableCell>
-                <TableCell>{hit._source.metadata.doc_type}</TableCell>
-                <TableCell align="right">{new Date(hit._source.metadata.modified_date).toLocaleDateString()}</TableCell>
+              <TableRow key={hit.id} hover onClick={() => navigate(`/document/${hit.id}`)} sx={{ cursor: 'pointer' }}>
+                <TableCell>
+                  {hit.metadata.filename_original}
+                  {/* Highlights come back HTML-escaped from the server, with only <mark> tags added. */}
+                  {hit.highlights.map((fragment, i) => (
+                    <Typography key={i} variant="body2" color="text.secondary" dangerouslySetInnerHTML={{ __html: `…${fragment}…` }} />
+                  ))}
+                  {hit.passages.map((passage, i) => passage.highlights.map((fragment, j) => (
+                    <Typography key={`${i}-${j}`} variant="body2" color="text.secondary" dangerouslySetInnerHTML={{ __html: `p. ${passage.page}: …${fragment}…` }} />
+                  )))}
+                </TableCell>
+                <TableCell>{hit.metadata.client_project_name}</TableCell>
+                <TableCell>{hit.metadata.doc_type}</TableCell>
+                <TableCell align="right">{new Date(hit.metadata.modified_date).toLocaleDateString()}</TableCell>
               </TableRow>
             ))}
           </TableBody>
         </Table>
       </TableContainer>
+      {total !== null && (
+        <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mt: 2, '@media print': { display: 'none' } }}>
+          <Typography variant="body2">Showing {results.length} of {total} documents</Typography>
+          {nextCursor && <Button variant="outlined" onClick={() => fetchPage(nextCursor)} disabled={loading}>{loading ? '...' : 'Load more'}</Button>}
+        </Box>
+      )}
     </>
   );
 }
\ No newline at end of file
@@ -0,0 +1,76 @@
+// Listens to GET /documents/changes (Server-Sent Events). EventSource cannot
+// send the Authorization header, so the stream is read with fetch.
+import api from './api';
+
+const RETRY_MIN = 1000;
+const RETRY_MAX = 30000;
+
+export function subscribeToChanges({ clientProject, onDocument, onReset }) {
+  const controller = new AbortController();
+  let lastEventId = null;
+  let retry = RETRY_MIN;
+
+  const dispatch = (block) => {
+    let type = 'message';
+    let id = null;
+    const data = [];
+    block.split('\n').forEach((line) => {
+      if (line.startsWith(':')) return;
+      const colon = line.indexOf(':');
+      const field = colon === -1 ? line : line.slice(0, colon);
+      const value = colon === -1 ? '' : line.slice(colon + 1).replace(/^ /, '');
+      if (field === 'event') type = value;
+      else if (field === 'id') id = value;
+      else if (field === 'data') data.push(value);
+    });
+    if (id !== null) lastEventId = id;
+    if (type === 'reset') {
+      lastEventId = null;
+      onReset();
+    } else if (type === 'document' && data.length) {
+      onDocument(JSON.parse(data.join('\n')));
+    }
+  };
+
+  const connect = async () => {
+    const params = new URLSearchParams();
+    if (clientProject) params.set('client_project', clientProject);
+    const headers = { Accept: 'text/event-stream' };
+    const token = localStorage.getItem('token');
+    if (token) headers['Authorization'] = `Bearer ${token}`;
+    if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+    const response = await fetch(`${api.defaults.baseURL}/documents/changes?${params}`, { headers, signal: controller.signal });
+    if (!response.ok) throw new Error(`Change feed returned ${response.status}`);
+    retry = RETRY_MIN;
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) return;
+      buffer += decoder.decode(value, { stream: true }).replace(/\r\n?/g, '\n');
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        dispatch(buffer.slice(0, end));
+        buffer = buffer.slice(end + 2);
+      }
+    }
+  };
+
+  const run = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        await connect();
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        console.error('Change feed disconnected:', error);
+      }
+      // Reconnect with backoff; the last event id lets the server replay what was missed.
+      await new Promise((resolve) => setTimeout(resolve, retry));
+      retry = Math.min(retry * 2, RETRY_MAX);
+    }
+  };
+
+  run();
+  return () => controller.abort();
+}